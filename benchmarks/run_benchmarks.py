@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Benchmark the configuration generators over synthetic topologies.
+
+Each point of the grid runs nanorc.mdapp_multiru_gen and/or
+newconf.mdapp_multiru_gen in a fresh interpreter and records the wall
+time, the peak RSS, the size of the generated configuration and its
+number of files. By default the moo, appfwk and dunedaq packages come
+from the stubs in benchmarks/stubs, so this runs without the DUNE-DAQ
+software stack; use --no-stubs to benchmark against the real one.
+
+    python benchmarks/run_benchmarks.py --grid quick
+    python benchmarks/run_benchmarks.py --grid quick --compare benchmarks/baselines/quick.json
+    python benchmarks/run_benchmarks.py --grid sweep --output benchmarks/baselines/sweep.json
+"""
+
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import NamedTuple
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+STUBS_DIR = os.path.join(BENCHMARK_DIR, "stubs")
+PYTHON_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), "python")
+
+GENERATORS = {
+    "nanorc": "minidaqapp.nanorc.mdapp_multiru_gen",
+    "newconf": "minidaqapp.newconf.mdapp_multiru_gen",
+}
+
+FRONTENDS = {
+    "fake": [],
+    "felix": ["--use-felix"],
+    "ssp": ["--use-ssp", "--frontend-type", "ssp"],
+    "pacman": ["--frontend-type", "pacman"],
+}
+
+class Point(NamedTuple):
+    """One configuration of the grid"""
+    ru_count: int
+    links: int
+    df_count: int
+    tpg: bool
+    dqm: bool
+    frontend: str
+
+    @property
+    def name(self):
+        return (f"ru={self.ru_count} links={self.links} df={self.df_count} "
+                f"tpg={int(self.tpg)} dqm={int(self.dqm)} fe={self.frontend}")
+
+    def is_valid(self):
+        # Software TPG is only implemented for the (fake or real) WIB readout
+        return not self.tpg or self.frontend in ("fake", "felix")
+
+    def arguments(self):
+        args = ["-n", str(self.links)]
+        for idx in range(self.ru_count):
+            args += ["--host-ru", f"ru{idx:03d}"]
+        for idx in range(self.df_count):
+            args += ["--host-df", f"df{idx:02d}"]
+        if self.tpg:
+            args.append("--enable-software-tpg")
+        if self.dqm:
+            args.append("--enable-dqm")
+        return args + FRONTENDS[self.frontend]
+
+REFERENCE = Point(ru_count=10, links=5, df_count=1, tpg=False, dqm=False, frontend="fake")
+
+SWEEP = dict(
+    ru_count=[1, 10, 50, 150, 300],
+    links=[1, 2, 5, 10],
+    df_count=[1, 2, 4, 8, 16],
+    tpg=[False, True],
+    dqm=[False, True],
+    frontend=list(FRONTENDS),
+)
+
+def sweep_grid():
+    """The reference point, and every value of each axis with the other axes at their reference value"""
+    points = [REFERENCE]
+    for axis, values in SWEEP.items():
+        for value in values:
+            point = REFERENCE._replace(**{axis: value})
+            if point not in points:
+                points.append(point)
+    # The largest systems, where the generators are used in production
+    points.append(Point(ru_count=300, links=10, df_count=16, tpg=False, dqm=False, frontend="felix"))
+    points.append(Point(ru_count=150, links=10, df_count=8, tpg=True, dqm=True, frontend="felix"))
+    return points
+
+def quick_grid():
+    """A handful of small points, for a fast check in CI"""
+    return [
+        Point(1, 1, 1, False, False, "fake"),
+        Point(10, 5, 1, False, False, "fake"),
+        Point(10, 5, 2, True, True, "felix"),
+        Point(5, 2, 1, False, False, "ssp"),
+        Point(5, 2, 1, False, False, "pacman"),
+        Point(50, 10, 4, False, False, "felix"),
+    ]
+
+def product_grid(ru_counts, links, df_counts, tpg, dqm, frontends):
+    return [Point(*values) for values in itertools.product(ru_counts, links, df_counts, tpg, dqm, frontends)]
+
+def directory_size(path):
+    size, count = 0, 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            size += os.path.getsize(os.path.join(root, filename))
+            count += 1
+    return size, count
+
+def run_point(generator, point, env, scratch_dir, extra_args):
+    """Run one generator on one point and return its measurements"""
+    json_dir = os.path.join(scratch_dir, "conf")
+    log_path = os.path.join(scratch_dir, "generator.log")
+    cmd = [sys.executable, "-m", GENERATORS[generator]] + point.arguments() + list(extra_args) + [json_dir]
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives the resource usage of this child alone
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        with open(log_path) as log:
+            tail = log.read()[-2000:]
+        raise RuntimeError(f"{generator} failed on {point.name} with exit code {proc.returncode}:\n{tail}")
+
+    output_bytes, file_count = directory_size(json_dir)
+    shutil.rmtree(json_dir)
+    return dict(
+        wall_s=wall,
+        # ru_maxrss is in kB on Linux
+        peak_rss_mb=rusage.ru_maxrss / 1024.,
+        output_bytes=output_bytes,
+        file_count=file_count,
+    )
+
+def benchmark_env(use_stubs, schema_cache):
+    env = dict(os.environ)
+    paths = ([STUBS_DIR] if use_stubs else []) + [PYTHON_DIR]
+    if env.get("PYTHONPATH"):
+        paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    env["MINIDAQAPP_SCHEMA_CACHE"] = schema_cache
+    return env
+
+def result_key(result):
+    return f"{result['generator']} {result['point']}"
+
+def compare(results, baseline_path, tolerance, min_delta_s):
+    """Print how `results` compare to the baseline; return the list of regressions"""
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+
+    table = Table(title=f"Compared to {baseline_path}")
+    for column in ("generator", "point", "wall", "peak RSS", "output"):
+        table.add_column(column)
+    regressions = []
+    for result in results:
+        reference = baseline.get(result_key(result))
+        if reference is None:
+            table.add_row(result["generator"], result["point"], "new", "new", "new")
+            continue
+        time_ratio = result["wall_s"] / reference["wall_s"]
+        rss_ratio = result["peak_rss_mb"] / reference["peak_rss_mb"]
+        # Sub-second runs are noisy, so a slowdown also has to be significant in absolute terms
+        if time_ratio > tolerance and result["wall_s"] - reference["wall_s"] > min_delta_s:
+            regressions.append(f"{result_key(result)}: wall time x{time_ratio:.2f}")
+        if rss_ratio > tolerance:
+            regressions.append(f"{result_key(result)}: peak RSS x{rss_ratio:.2f}")
+        if (result["output_bytes"], result["file_count"]) == (reference["output_bytes"], reference["file_count"]):
+            output = "same"
+        else:
+            output = (f"{reference['file_count']} -> {result['file_count']} files, "
+                      f"{reference['output_bytes']} -> {result['output_bytes']} bytes")
+        table.add_row(result["generator"], result["point"], f"x{time_ratio:.2f}", f"x{rss_ratio:.2f}", output)
+    console.print(table)
+    return regressions
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--grid', type=click.Choice(['quick', 'sweep', 'product']), default='quick', help="quick: a few small points; sweep: each axis in turn around a 10 RU reference point; product: every combination of the --ru-counts, --links, ... values")
+@click.option('--generator', 'generators', type=click.Choice(list(GENERATORS)), multiple=True, default=list(GENERATORS), help="Generator to benchmark (repeatable, default both)")
+@click.option('--ru-counts', default="1,10", help="product grid: comma-separated numbers of readout units")
+@click.option('--links', default="1,5", help="product grid: comma-separated numbers of links per readout unit")
+@click.option('--df-counts', default="1", help="product grid: comma-separated numbers of dataflow apps")
+@click.option('--tpg', type=click.Choice(['off', 'on', 'both']), default='off', help="product grid: software TPG")
+@click.option('--dqm', type=click.Choice(['off', 'on', 'both']), default='off', help="product grid: DQM")
+@click.option('--frontends', default="fake", help=f"product grid: comma-separated frontends, among {', '.join(FRONTENDS)}")
+@click.option('--repeat', default=1, help="Number of runs per point; the fastest is kept")
+@click.option('--schema-cache', type=click.Choice(['warm', 'off']), default='warm', help="warm: run each generator once before measuring, with a private schema cache; off: evaluate the schemas in every run")
+@click.option('--no-stubs', is_flag=True, help="Use the moo, appfwk and dunedaq packages of the environment instead of the stubs")
+@click.option('--output', type=click.Path(), default=None, help="Write the results to this JSON file (e.g. to update a baseline)")
+@click.option('--compare', 'baseline', type=click.Path(exists=True), default=None, help="Compare the results to this baseline file")
+@click.option('--tolerance', default=1.5, help="With --compare, fail if a point got slower or bigger in memory by more than this factor")
+@click.option('--min-delta-s', default=0.5, help="With --compare, ignore slowdowns smaller than this many seconds")
+@click.argument('generator_args', nargs=-1, type=click.UNPROCESSED)
+def cli(grid, generators, ru_counts, links, df_counts, tpg, dqm, frontends, repeat, schema_cache, no_stubs, output, baseline, tolerance, min_delta_s, generator_args):
+    """
+      GENERATOR_ARGS: extra options passed to every generator run, after a "--"
+    """
+    if repeat < 1:
+        raise click.UsageError("--repeat should be at least 1!")
+
+    if grid == 'quick':
+        points = quick_grid()
+    elif grid == 'sweep':
+        points = sweep_grid()
+    else:
+        def ints(value):
+            return [int(v) for v in value.split(',')]
+        def flags(value):
+            return {'off': [False], 'on': [True], 'both': [False, True]}[value]
+        unknown = set(frontends.split(',')) - set(FRONTENDS)
+        if unknown:
+            raise click.UsageError(f"Unknown frontend(s) {', '.join(sorted(unknown))}, choose among {', '.join(FRONTENDS)}")
+        points = product_grid(ints(ru_counts), ints(links), ints(df_counts), flags(tpg), flags(dqm), frontends.split(','))
+
+    skipped = [point for point in points if not point.is_valid()]
+    points = [point for point in points if point.is_valid()]
+    for point in skipped:
+        console.log(f"Skipping {point.name}: not a valid combination")
+
+    scratch_dir = tempfile.mkdtemp(prefix="mdapp_benchmark_")
+    results = []
+    try:
+        cache_dir = os.path.join(scratch_dir, "schema_cache") if schema_cache == 'warm' else ""
+        env = benchmark_env(not no_stubs, cache_dir)
+        for generator in generators:
+            if schema_cache == 'warm':
+                run_point(generator, quick_grid()[0], env, scratch_dir, generator_args)
+            for point in points:
+                runs = [run_point(generator, point, env, scratch_dir, generator_args) for _ in range(repeat)]
+                result = dict(generator=generator, point=point.name, **point._asdict())
+                result.update(min(runs, key=lambda r: r["wall_s"]))
+                result["peak_rss_mb"] = max(r["peak_rss_mb"] for r in runs)
+                console.log(f"{generator:<8} {point.name:<50} {result['wall_s']:7.2f} s {result['peak_rss_mb']:7.1f} MB "
+                            f"{result['file_count']:6d} files {result['output_bytes']/1e6:8.2f} MB")
+                results.append(result)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(dict(
+                grid=grid,
+                repeat=repeat,
+                schema_cache=schema_cache,
+                stubs=not no_stubs,
+                generator_args=list(generator_args),
+                machine=dict(platform=platform.platform(), python=platform.python_version(), cpu_count=os.cpu_count()),
+                results=results,
+            ), f, indent=4, sort_keys=True)
+        console.log(f"Results written to {output}")
+
+    if baseline:
+        regressions = compare(results, baseline, tolerance, min_delta_s)
+        if regressions:
+            console.log("Regressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    cli()
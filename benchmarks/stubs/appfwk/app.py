@@ -0,0 +1,47 @@
+"""Stand-in for appfwk.app."""
+from collections import namedtuple
+
+Endpoint = namedtuple("Endpoint", ["external_name", "internal_name", "direction"])
+FragmentProducer = namedtuple("FragmentProducer", ["geoid", "requests_in", "fragments_out", "queue_name"])
+
+
+class ModuleGraph(object):
+    def __init__(self, modules=None, endpoints=None, fragment_producers=None):
+        self.modules = list(modules) if modules else []
+        self.endpoints = endpoints if endpoints else {}
+        self.fragment_producers = fragment_producers if fragment_producers else {}
+
+    def get_module(self, name):
+        for mod in self.modules:
+            if mod.name == name:
+                return mod
+        return None
+
+    def module_names(self):
+        return [mod.name for mod in self.modules]
+
+    def add_module(self, name, **kwargs):
+        from appfwk.daqmodule import DAQModule
+        mod = DAQModule(name=name, **kwargs)
+        self.modules.append(mod)
+        return mod
+
+    def add_endpoint(self, external_name, internal_name, inout):
+        self.endpoints[external_name] = Endpoint(external_name, internal_name, inout)
+
+    def add_fragment_producer(self, region, element, system, requests_in, fragments_out):
+        geoid = (system, region, element)
+        self.fragment_producers[geoid] = FragmentProducer(geoid, requests_in, fragments_out, None)
+
+    def export(self, filename):
+        pass
+
+
+class App(object):
+    def __init__(self, modulegraph=None, host="localhost", name="__app"):
+        self.modulegraph = modulegraph if modulegraph else ModuleGraph()
+        self.host = host
+        self.name = name
+
+    def export(self, filename):
+        pass
@@ -0,0 +1,133 @@
+"""
+Stand-in for appfwk.conf_utils.  Enough of the real behaviour is
+reproduced that the generated trees have realistic shape and size.
+"""
+import json
+import os
+from collections import namedtuple
+from enum import Enum
+from os.path import join
+
+import moo.otypes
+from moo.otypes import Record, _pod
+from appfwk.daqmodule import DAQModule
+from appfwk.utils import acmd
+
+
+class Direction(Enum):
+    IN = 1
+    OUT = 2
+
+
+class Connection(object):
+    def __init__(self, to, queue_kind="FollySPSCQueue", queue_capacity=1000, queue_name=None, toposort=True):
+        self.to = to
+        self.queue_kind = queue_kind
+        self.queue_capacity = queue_capacity
+        self.queue_name = queue_name
+        self.toposort = toposort
+
+
+AppConnection = namedtuple("AppConnection", ["nwmgr_connection", "receivers", "topics", "msg_type", "msg_module_name", "use_nwqa"],
+                           defaults=(None, None, True))
+
+
+def data_request_endpoint_name(producer):
+    return f"data_request_{producer.geoid[0]}_{producer.geoid[1]}_{producer.geoid[2]}"
+
+
+def connect_all_fragment_producers(the_system, dataflow_name="dataflow", verbose=False):
+    producers = []
+    for name, app in the_system.apps.items():
+        for geoid, producer in app.modulegraph.fragment_producers.items():
+            producers.append((name, producer))
+    for name, app in the_system.apps.items():
+        if not name.startswith(dataflow_name):
+            continue
+        trb = app.modulegraph.get_module("trb")
+        trb.conf.map = [dict(system=p.geoid[0], region=p.geoid[1], element=p.geoid[2],
+                             connection_name=f"{the_system.partition_name}.data_requests_for_{producer_app}")
+                        for producer_app, p in producers]
+
+
+def set_mlt_links(the_system, mlt_app_name="trigger", verbose=False):
+    links = []
+    for name, app in the_system.apps.items():
+        for geoid in app.modulegraph.fragment_producers:
+            links.append(dict(system=geoid[0], region=geoid[1], element=geoid[2]))
+    the_system.apps[mlt_app_name].modulegraph.get_module("mlt").conf.links = links
+
+
+def add_network(app_name, the_system, verbose=False):
+    app = the_system.apps[app_name]
+    for conn_name, conn in the_system.app_connections.items():
+        from_app, from_endpoint = conn_name.split(".", 1)
+        if from_app == app_name and conn.use_nwqa:
+            app.modulegraph.modules.append(DAQModule(name=f"qton_{from_endpoint}", plugin="QueueToNetwork",
+                                                     conf=Record(msg_type=conn.msg_type, msg_module_name=conn.msg_module_name,
+                                                                 sender_config=dict(name=conn.nwmgr_connection, topic=conn.topics))))
+        for receiver in conn.receivers:
+            to_app, to_endpoint = receiver.split(".", 1)
+            if to_app == app_name and conn.use_nwqa:
+                app.modulegraph.modules.append(DAQModule(name=f"ntoq_{to_endpoint}", plugin="NetworkToQueue",
+                                                         conf=Record(msg_type=conn.msg_type, msg_module_name=conn.msg_module_name,
+                                                                     receiver_config=dict(name=conn.nwmgr_connection, subscriptions=conn.topics))))
+
+
+def make_app_command_data(system, app, verbose=False):
+    modules = app.modulegraph.modules
+    queues = []
+    mod_specs = []
+    for mod in modules:
+        qinfos = []
+        for out_name, conn in mod.connections.items():
+            qname = conn.queue_name if conn.queue_name else f"{mod.name}_{out_name}"
+            queues.append(dict(inst=qname, kind=conn.queue_kind, capacity=conn.queue_capacity))
+            qinfos.append(dict(name=out_name, inst=qname, dir="output"))
+        mod_specs.append(dict(inst=mod.name, plugin=mod.plugin, data=dict(qinfos=qinfos)))
+    nwconnections = [_pod(c) for c in system.network_endpoints]
+    command_data = {}
+    command_data["init"] = Record(modules=mod_specs, queues=sorted(queues, key=lambda q: q["inst"]), nwconnections=nwconnections)
+    command_data["conf"] = acmd([(mod.name, mod.conf) for mod in modules])
+    command_data["start"] = acmd([(mod.name, mod.extra_commands.get("start", dict(run=1))) for mod in modules])
+    command_data["stop"] = acmd([(mod.name, None) for mod in reversed(modules)])
+    for cmd in ("pause", "resume", "scrap", "record"):
+        command_data[cmd] = acmd([("", None)])
+    return command_data
+
+
+def make_system_command_datas(the_system, verbose=False):
+    names = list(the_system.apps.keys())
+    cmds = {}
+    for c in ("init", "conf", "start", "stop", "pause", "resume", "scrap", "record"):
+        cfg = {"apps": {name: f"data/{name}_{c}" for name in names}}
+        if c in ("conf", "start"):
+            cfg["order"] = names
+        elif c == "stop":
+            cfg["order"] = names[::-1]
+        cmds[c] = cfg
+    return cmds
+
+
+def generate_boot(apps, partition_name="${USER}_test", ers_settings=None, info_svc_uri="file://info_${APP_NAME}_${APP_PORT}.json",
+                  disable_trace=False, use_kafka=False, verbose=False):
+    boot = {"env": {"DUNEDAQ_PARTITION": partition_name}, "hosts": {}, "apps": {},
+            "response_listener": {"port": 56789}, "exec": {"daq_application": {"cmd": ["INFO_SVC=" + info_svc_uri]}}}
+    port = 3333
+    for name, app in apps.items():
+        boot["hosts"][f"host_{name}"] = app.host
+        boot["apps"][name] = {"exec": "daq_application", "host": f"host_{name}", "port": port}
+        port += 1
+    return boot
+
+
+def write_json_files(app_command_datas, system_command_datas, json_dir, verbose=False):
+    data_dir = join(json_dir, "data")
+    os.makedirs(data_dir)
+    for app_name, command_data in app_command_datas.items():
+        for c, d in command_data.items():
+            with open(f"{join(data_dir, app_name)}_{c}.json", "w") as f:
+                json.dump(d.pod(), f, indent=4, sort_keys=True)
+    for c, d in system_command_datas.items():
+        with open(join(json_dir, f"{c}.json"), "w") as f:
+            json.dump(d, f, indent=4, sort_keys=True)
@@ -0,0 +1,13 @@
+"""Stand-in for appfwk.daqmodule."""
+
+
+class DAQModule(object):
+    def __init__(self, name, plugin, conf=None, connections=None, extra_commands=None):
+        self.name = name
+        self.plugin = plugin
+        self.conf = conf
+        self.connections = connections if connections is not None else {}
+        self.extra_commands = extra_commands if extra_commands is not None else {}
+
+    def __repr__(self):
+        return f"DAQModule({self.name}, {self.plugin})"
@@ -0,0 +1,18 @@
+"""Stand-in for appfwk.system."""
+
+
+class System(object):
+    def __init__(self, partition_name, apps=None, app_connections=None, network_endpoints=None, first_port=12345):
+        self.partition_name = partition_name
+        self.apps = apps if apps else {}
+        self.app_connections = app_connections if app_connections else {}
+        self.network_endpoints = network_endpoints if network_endpoints else []
+        self.digraph = None
+        self.port = first_port - 1
+
+    def next_unassigned_port(self):
+        self.port += 1
+        return self.port
+
+    def export(self, filename):
+        pass
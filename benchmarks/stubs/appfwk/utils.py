@@ -0,0 +1,22 @@
+"""Stand-in for appfwk.utils."""
+from moo.otypes import Record, _pod
+
+
+class _Cmd(Record):
+    pass
+
+
+def mspec(inst, plugin, qinfos):
+    return _Cmd(inst=inst, plugin=plugin, data=dict(qinfos=qinfos))
+
+
+def acmd(mods):
+    return _Cmd(modules=[dict(match=match, data=data) for match, data in mods])
+
+
+def mcmd(cmdid, mods):
+    return _Cmd(id=cmdid, data=acmd(mods))
+
+
+def mrccmd(cmdid, instate, outstate, mods):
+    return _Cmd(id=cmdid, entry_state=instate, exit_state=outstate, data=acmd(mods))
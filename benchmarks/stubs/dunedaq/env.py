@@ -0,0 +1,5 @@
+import os
+
+
+def get_moo_model_path():
+    return [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schema")]
@@ -0,0 +1,24 @@
+"""
+Stand-in for moo.io: "evaluating" a schema returns one module
+descriptor and burns a little CPU so that schema loading shows up in
+timings the way jsonnet evaluation does.
+"""
+import os
+import time
+
+default_load_path = []
+
+EVAL_COST_S = float(os.environ.get("MDAPP_STUB_SCHEMA_COST_S", "0.002"))
+
+
+def load(filename, fpath=None):
+    if EVAL_COST_S > 0:
+        end = time.perf_counter() + EVAL_COST_S
+        while time.perf_counter() < end:
+            pass
+    path = "dunedaq." + filename.rsplit(".", 1)[0].replace("/", ".")
+    schema = [dict(schema="module", name=path.rsplit(".", 1)[1], path=path)]
+    # The real rcif schema pulls the cmdlib types in with it
+    if filename == "rcif/cmd.jsonnet":
+        schema.insert(0, dict(schema="module", name="cmd", path="dunedaq.cmdlib.cmd"))
+    return schema
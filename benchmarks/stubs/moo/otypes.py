@@ -0,0 +1,80 @@
+"""
+Stand-in for moo.otypes: every type is a generic record that keeps its
+constructor arguments and renders them back with pod().
+"""
+import sys
+import types
+
+import moo.io
+
+
+def _pod(value):
+    if hasattr(value, "pod"):
+        return value.pod()
+    if isinstance(value, dict):
+        return {k: _pod(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_pod(v) for v in value]
+    return value
+
+
+class Record(object):
+    def __init__(self, *args, **kwds):
+        self.__dict__["_args"] = list(args[0]) if args else None
+        self.__dict__["_fields"] = dict(kwds)
+
+    def __getattr__(self, key):
+        try:
+            return self.__dict__["_fields"][key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __setattr__(self, key, value):
+        self._fields[key] = value
+
+    def __getstate__(self):
+        return dict(self.__dict__)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def pod(self):
+        if self._args is not None:
+            return _pod(self._args)
+        return _pod(self._fields)
+
+
+class _TypesModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        klass = type(name, (Record,), dict(__module__=self.__name__, __qualname__=name))
+        setattr(self, name, klass)
+        return klass
+
+
+def _module(path):
+    parts = path.split(".")
+    for idx in range(1, len(parts) + 1):
+        name = ".".join(parts[:idx])
+        if name not in sys.modules:
+            mod = _TypesModule(name)
+            mod.__path__ = []
+            sys.modules[name] = mod
+            if idx > 1:
+                setattr(sys.modules[".".join(parts[:idx - 1])], parts[idx - 1], mod)
+    return sys.modules[path]
+
+
+def make_type(**kwds):
+    path = kwds["path"]
+    if isinstance(path, (list, tuple)):
+        path = ".".join(path)
+    if kwds.get("schema") == "module":
+        return _module(path)
+    mod = _module(path)
+    return getattr(mod, kwds["name"])
+
+
+def load_types(filename, fpath=None):
+    return [make_type(**one) for one in moo.io.load(filename, fpath)]
@@ -0,0 +1,201 @@
+"""
+CPU affinity plans of the readout apps.
+
+With --affinity-plans, the newconf generator writes affinity.json to the
+configuration directory, in the format of the readoutlibs cpupin files:
+
+    {"daq_application": {
+        "--name ruflx0": {"parent": "1",
+                          "threads": {"cardreader-0-0": "2",
+                                      "consumer-0": "3",
+                                      "postprocess-0": "4", ...}},
+        ...},
+     "hosts": {"ruflx0": "np04-srv-021", ...}}
+
+so that each readout app can pin its threads once it is configured, e.g.
+with readoutlibs' readout-affinity.py --pinfile JSON_DIR/affinity.json.
+Each card reader (one per FELIX logical unit), each link's consumer and,
+with software TPG, each link's TP post-processing gets a core of its own
+on the NUMA node of the card that the link comes from; the other threads
+of the app share its "parent" cores. Core 0 of each host is left to the system. The cores
+of each NUMA node come from the "numa_cpus" of the host in --host-inventory,
+or else the cores of the host are split evenly between its NUMA nodes.
+
+A plan can be checked, e.g. after editing it by hand or merging plans:
+
+    python -m minidaqapp.affinity check JSON_DIR [--host-inventory hosts.json]
+
+which reports the cores pinned by more than one app of the same host,
+the cores given to more than one pinned thread, and (with an inventory)
+the cores a host doesn't have.
+"""
+
+import json
+from os.path import isdir, join
+
+import click
+from rich.console import Console
+
+from .inventory import parse_cpu_list
+
+console = Console()
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+AFFINITY_FILE = 'affinity.json'
+
+def format_cpu_list(cores):
+    """The cpu list ("0,3-5") of `cores`"""
+    ranges = []
+    for core in sorted(set(cores)):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+def numa_cores(host, node):
+    """The cores of NUMA node `node` of `host` (an inventory.Host), without core 0"""
+    return [core for core in host.node_cores(node) if core != 0]
+
+def readout_threads(ru, opts):
+    """
+    [(thread name, card id)] of the threads of the RU `ru` (a
+    topology.ReadoutUnit) that get a core of their own, with the id of
+    the FELIX card they serve, or None
+    """
+    if opts.use_fake_data_producers:
+        return []
+    if not opts.use_felix:
+        threads = [("cardreader", None)]
+        for link in ru.links:
+            threads.append((f"consumer-{link}", None))
+            if opts.enable_software_tpg:
+                threads.append((f"postprocess-{link}", None))
+        return threads
+    threads = []
+    for reader in opts.felix_layout().readers(ru):
+        threads.append((f"cardreader-{reader.card_id}-{reader.logical_unit}", reader.card_id))
+        for link in reader.links:
+            threads.append((f"consumer-{link}", reader.card_id))
+            if opts.enable_software_tpg:
+                threads.append((f"postprocess-{link}", reader.card_id))
+    return threads
+
+def plan_affinity(opts, inventory, ru_cards):
+    """
+    Return (plan, warnings): the affinity.json content for the readout
+    apps of `opts` (newconf MDAppOptions) on the hosts of `inventory`,
+    whose FELIX RUs read the cards of `ru_cards` (opts.felix_cards).
+    The threads that serve a FELIX card get the cores of the card's NUMA
+    node; the others are spread over the nodes of their host. Raises
+    ValueError if an RU's host isn't in the inventory
+    """
+    from .topology import build_topology
+    plan = {"daq_application": {}, "hosts": {}}
+    warnings = []
+    # Next free core, by (host, NUMA node)
+    next_core = {}
+    for ru in build_topology(opts.host_ru, opts.region_id, opts.number_of_data_producers):
+        app = f"ruflx{ru.index}" if opts.use_felix else f"ruemu{ru.index}"
+        if ru.host not in inventory:
+            raise ValueError(f"The host of {app}, {ru.host}, is not in the inventory")
+        host = inventory[ru.host]
+        cards = ru_cards.get(ru.index, {})
+
+        def node_of(card_id):
+            if card_id in cards:
+                return cards[card_id].numa_node
+            return (ru.card_id if card_id is None else card_id) % host.numa_nodes
+
+        threads = readout_threads(ru, opts)
+        # The parent core is on the node of the first card reader
+        by_node = {node_of(threads[0][1] if threads else None): ["parent"]}
+        for thread, card_id in threads:
+            by_node.setdefault(node_of(card_id), []).append(thread)
+
+        pins = {}
+        for node, node_threads in by_node.items():
+            cores = numa_cores(host, node)
+            start = next_core.get((host.name, node), 0)
+            if start + len(node_threads) > len(cores):
+                warnings.append(f"{app} needs {len(node_threads)} cores on NUMA node {node} of {host.name}, which only has {max(0, len(cores) - start)} left: some are shared")
+            for i, thread in enumerate(node_threads):
+                pins[thread] = cores[(start + i) % len(cores)]
+            next_core[(host.name, node)] = start + len(node_threads)
+        plan["daq_application"][f"--name {app}"] = {
+            "parent": format_cpu_list([pins.pop("parent")]),
+            "threads": {thread: str(core) for thread, core in pins.items()},
+        }
+        plan["hosts"][app] = host.name
+    return plan, warnings
+
+def check_affinity(plan, inventory=None):
+    """
+    [problem] of the affinity plan `plan`: cores pinned by more than one
+    app on the same host, cores given to more than one pinned thread and,
+    with an `inventory`, cores the host doesn't have
+    """
+    problems = []
+    # {host: {core: [(app, thread)]}}
+    users = {}
+    for process, pins in sorted(plan.get("daq_application", {}).items()):
+        app = process.split()[-1]
+        host = plan.get("hosts", {}).get(app, "?")
+        entries = [(app, "parent", core) for core in parse_cpu_list(pins.get("parent", ""))]
+        entries += [(app, thread, core) for thread, cpus in sorted(pins.get("threads", {}).items()) for core in parse_cpu_list(cpus)]
+        for app_name, thread, core in entries:
+            users.setdefault(host, {}).setdefault(core, []).append((app_name, thread))
+            if inventory is not None and host in inventory and core >= inventory[host].cores:
+                problems.append(f"{host}: {app_name} {thread} is pinned to core {core}, but the host has {inventory[host].cores} cores")
+
+    for host, cores in sorted(users.items()):
+        for core, core_users in sorted(cores.items()):
+            apps = sorted({app for app, _ in core_users})
+            pinned = [f"{app} {thread}" for app, thread in core_users if thread != "parent"]
+            if len(apps) > 1:
+                problems.append(f"{host}: core {core} overlaps between {', '.join(apps)} ({', '.join(f'{app} {thread}' for app, thread in core_users)})")
+            elif len(pinned) > 1 or (pinned and len(core_users) > len(pinned)):
+                problems.append(f"{host}: core {core} is oversubscribed in {apps[0]} ({', '.join(thread for _, thread in core_users)})")
+    return problems
+
+@click.group(context_settings=CONTEXT_SETTINGS)
+def cli():
+    """Check the affinity plans written by the newconf generator with --affinity-plans"""
+
+@cli.command()
+@click.option('--host-inventory', type=click.Path(exists=True, dir_okay=False), default=None, help="Also check the cores against the hosts of this inventory")
+@click.argument('plan', type=click.Path(exists=True))
+def check(host_inventory, plan):
+    """
+    Check PLAN (affinity.json, or a configuration directory) for cores
+    that overlap between the apps of a host or that are oversubscribed
+    """
+    path = join(plan, AFFINITY_FILE) if isdir(plan) else plan
+    try:
+        with open(path) as f:
+            content = json.load(f)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(f"Could not read {path}: {e}")
+    if not isinstance(content, dict) or not isinstance(content.get("daq_application", {}), dict):
+        raise click.ClickException(f"{path} is not an affinity plan: it should be an object with a \"daq_application\" object")
+    inventory = None
+    if host_inventory:
+        from .inventory import HostInventory
+        try:
+            inventory = HostInventory.load(host_inventory)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    problems = check_affinity(content, inventory)
+    for problem in problems:
+        console.print(problem)
+    if problems:
+        raise click.ClickException(f"{len(problems)} problems in {path}")
+    console.log(f"{len(content.get('daq_application', {}))} affinity plans checked in {path}")
+
+if __name__ == '__main__':
+    try:
+        cli(show_default=True, standalone_mode=True)
+    except Exception as e:
+        console.print_exception()
+        raise SystemExit(1)
@@ -0,0 +1,154 @@
+"""
+Single-file configuration bundles.
+
+A bundle holds a whole configuration in one JSON document, so that it
+can be copied and opened as one file rather than as the hundreds of
+small files of a configuration directory:
+
+    {"apps": {app: {command: data}},
+     "boot": data,
+     "bundle_version": 1,
+     "commands": {command: data}}
+
+which stands for the files data/{app}_{command}.json, boot.json and
+{command}.json of a configuration directory. The generators write it as
+bundle.json (or bundle.json.gz) in JSON_DIR with --bundle. To get the
+files back, on all hosts or only for some apps:
+
+    python -m minidaqapp.bundle expand JSON_DIR/bundle.json OUT_DIR [--app ruemu0 ...]
+
+or from Python:
+
+    bundle = Bundle.load("JSON_DIR/bundle.json")
+    bundle.command_data("ruemu0")["conf"]
+    bundle.expand("OUT_DIR")
+
+The expanded files are exactly the ones the generator writes without
+--bundle (including manifest.sha256).
+"""
+
+import gzip
+import json
+from os.path import exists, isdir, join
+
+import click
+from rich.console import Console
+
+console = Console()
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+BUNDLE_FILE = 'bundle.json'
+BUNDLE_VERSION = 1
+
+def assemble_bundle(boot, commands, apps):
+    """
+    Return the bundle document, as bytes, for the rendered JSON files in
+    `boot` (bytes or None), `commands` ({command: bytes}) and `apps`
+    ({app: {command: bytes}}). The rendered files are embedded as they
+    are, so the bundle keeps their formatting.
+    """
+    def section(items):
+        return b'{' + b','.join(json.dumps(key).encode() + b':' + value for key, value in sorted(items.items())) + b'}'
+    document = {b'apps': section({app: section(contents) for app, contents in apps.items()}),
+                b'bundle_version': str(BUNDLE_VERSION).encode(),
+                b'commands': section(commands)}
+    if boot is not None:
+        document[b'boot'] = boot
+    return b'{' + b','.join(b'"' + key + b'":' + value for key, value in sorted(document.items())) + b'}\n'
+
+class Bundle:
+    """The content of a bundle: see the module documentation"""
+    def __init__(self, content):
+        version = content.get('bundle_version')
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version {version} (expected {BUNDLE_VERSION})")
+        self.content = content
+
+    @classmethod
+    def load(cls, path):
+        """Load a bundle file, or the bundle of a configuration directory. Gzipped bundles are recognised by their content"""
+        if isdir(path):
+            path = join(path, BUNDLE_FILE) if exists(join(path, BUNDLE_FILE)) else join(path, BUNDLE_FILE + '.gz')
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if raw[:2] == b'\x1f\x8b':
+            raw = gzip.decompress(raw)
+        return cls(json.loads(raw))
+
+    @property
+    def apps(self):
+        return sorted(self.content['apps'])
+
+    def command_data(self, app):
+        """{command: data} of `app`"""
+        try:
+            return self.content['apps'][app]
+        except KeyError:
+            raise KeyError(f"No app {app} in the bundle (apps: {', '.join(self.apps)})") from None
+
+    def files(self, apps=None):
+        """
+        {path: data} of the files of the configuration directory, with
+        only the data files of `apps` if it is given
+        """
+        files = {}
+        for app in self.apps if apps is None else apps:
+            for cmd, data in self.command_data(app).items():
+                files[f"data/{app}_{cmd}.json"] = data
+        for cmd, data in self.content['commands'].items():
+            files[f"{cmd}.json"] = data
+        if 'boot' in self.content:
+            files['boot.json'] = self.content['boot']
+        return files
+
+    def expand(self, json_dir, apps=None, update=False, json_format=None):
+        """
+        Write the configuration directory of the bundle to `json_dir`,
+        with only the data files of `apps` if it is given. The arguments
+        are those of config_writer.ConfigWriter. Returns a ConfigDelta.
+        """
+        from .config_writer import ConfigWriter, PRETTY
+        writer = ConfigWriter(json_dir, update=update, json_format=json_format or PRETTY)
+        for app in self.apps if apps is None else apps:
+            writer.write_app(app, self.command_data(app))
+        top_level = dict(self.content['commands'])
+        if 'boot' in self.content:
+            top_level['boot'] = self.content['boot']
+        writer.write_system(top_level)
+        return writer.finish()
+
+@click.group(context_settings=CONTEXT_SETTINGS)
+def cli():
+    """Inspect and expand configuration bundles (written by the generators with --bundle)"""
+
+@cli.command('list')
+@click.argument('bundle', type=click.Path(exists=True))
+def list_apps(bundle):
+    """List the apps and commands of BUNDLE (a bundle file or a configuration directory)"""
+    content = Bundle.load(bundle)
+    for app in content.apps:
+        console.print(f"{app}: {' '.join(sorted(content.command_data(app)))}")
+    console.print(f"top-level: {' '.join(sorted(content.files(apps=[])))}")
+
+@cli.command()
+@click.option('--app', 'apps', multiple=True, help="Only write the data files of this app (repeatable). The top-level files are always written")
+@click.option('--update', is_flag=True, default=False, help="Update the configuration in JSON_DIR if it already exists")
+@click.argument('bundle', type=click.Path(exists=True))
+@click.argument('json_dir', type=click.Path())
+def expand(apps, update, bundle, json_dir):
+    """Write the configuration directory of BUNDLE to JSON_DIR"""
+    if exists(json_dir) and not update:
+        raise RuntimeError(f"Directory {json_dir} already exists (use --update to update it)")
+    content = Bundle.load(bundle)
+    try:
+        delta = content.expand(json_dir, apps=list(apps) or None, update=update)
+    except KeyError as e:
+        raise click.UsageError(e.args[0])
+    console.log(f"Expanded {bundle} in {json_dir}: {delta}")
+
+if __name__ == '__main__':
+    try:
+        cli(show_default=True, standalone_mode=True)
+    except Exception as e:
+        console.print_exception()
@@ -0,0 +1,165 @@
+"""
+Template-plus-override encoding of the conf command data.
+
+The conf command of a readout app holds one DataLinkHandler conf per
+link (datahandler_0, datahandler_1, ..., tp_datahandler_0, ...), which
+only differ in the element ids and the output file. With
+--templated-conf, the generators write each such group of modules once,
+as a template, and each module as its differences to it:
+
+    {"modules": [...,
+                 {"match": "datahandler_1",
+                  "data": {"template": "datahandler",
+                           "overrides": {"latencybufferconf": {"element_id": 1}, ...}}},
+                 ...],
+     "templates": {"datahandler": {"latencybufferconf": {"latency_buffer_alignment_size": 4096, ...}, ...}}}
+
+A group is the modules named {prefix}_{number}, when there are at least
+two of them. The template holds the values that all the modules of the
+group share, so a module's conf is the template updated, recursively,
+with its overrides.
+
+The DAQ applications expect the plain conf command data, so a templated
+configuration has to be expanded before it is run, with expand_conf()
+or with
+
+    python -m minidaqapp.conf_templates expand JSON_DIR
+"""
+
+import gzip
+import json
+import re
+from os.path import join
+
+import click
+from rich.console import Console
+
+console = Console()
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+_GROUP_NAME = re.compile(r"(.+)_\d+$")
+
+_MISSING = object()
+
+def _common(values):
+    """What all of `values` have in common, or _MISSING"""
+    if all(isinstance(value, dict) for value in values):
+        common = {}
+        for key in values[0]:
+            if all(key in value for value in values):
+                shared = _common([value[key] for value in values])
+                if shared is not _MISSING:
+                    common[key] = shared
+        return common
+    first = values[0]
+    return first if all(value == first for value in values[1:]) else _MISSING
+
+def _overrides(value, template):
+    """What has to be merged into `template` to get `value` (both dicts)"""
+    overrides = {}
+    for key, item in value.items():
+        base = template.get(key, _MISSING)
+        if isinstance(item, dict) and isinstance(base, dict):
+            nested = _overrides(item, base)
+            if nested:
+                overrides[key] = nested
+        elif base is _MISSING or item != base:
+            overrides[key] = item
+    return overrides
+
+def _merge(template, overrides):
+    merged = dict(template)
+    for key, item in overrides.items():
+        base = merged.get(key)
+        merged[key] = _merge(base, item) if isinstance(item, dict) and isinstance(base, dict) else item
+    return merged
+
+def is_templated(cmd_data):
+    return isinstance(cmd_data, dict) and 'templates' in cmd_data
+
+def make_templated(cmd_data):
+    """
+    Return the templated form of the conf command data `cmd_data` (a
+    moo object or its plain data). Data that is already templated, or
+    has no group of modules, is returned as plain data, unchanged.
+    """
+    if hasattr(cmd_data, "pod"):
+        cmd_data = cmd_data.pod()
+    if is_templated(cmd_data) or not isinstance(cmd_data.get('modules'), list):
+        return cmd_data
+
+    groups = {}
+    for module in cmd_data['modules']:
+        match = _GROUP_NAME.match(module['match'])
+        if match and isinstance(module['data'], dict):
+            groups.setdefault(match.group(1), []).append(module)
+    groups = {name: modules for name, modules in groups.items() if len(modules) > 1}
+    if not groups:
+        return cmd_data
+
+    templates = {name: _common([module['data'] for module in modules]) for name, modules in groups.items()}
+    templated_modules = {id(module): name for name, modules in groups.items() for module in modules}
+    modules = []
+    for module in cmd_data['modules']:
+        name = templated_modules.get(id(module))
+        if name is None:
+            modules.append(module)
+        else:
+            modules.append(dict(module, data={"template": name, "overrides": _overrides(module['data'], templates[name])}))
+    return dict(cmd_data, modules=modules, templates=templates)
+
+def expand_conf(cmd_data):
+    """Return the plain conf command data of `cmd_data`, templated or not"""
+    if not is_templated(cmd_data):
+        return cmd_data
+    templates = cmd_data['templates']
+    modules = []
+    for module in cmd_data['modules']:
+        data = module['data']
+        if isinstance(data, dict) and data.keys() == {"template", "overrides"}:
+            module = dict(module, data=_merge(templates[data['template']], data['overrides']))
+        modules.append(module)
+    expanded = dict(cmd_data, modules=modules)
+    del expanded['templates']
+    return expanded
+
+@click.group(context_settings=CONTEXT_SETTINGS)
+def cli():
+    """Expand configurations generated with --templated-conf"""
+
+@cli.command()
+@click.argument('json_dir', type=click.Path(exists=True, file_okay=False))
+def expand(json_dir):
+    """
+    Expand, in place, the templated conf files of the configuration in
+    JSON_DIR, keeping their formatting and updating its manifest
+    """
+    from .config_writer import MANIFEST_FILE, JsonFormat, read_manifest, rewrite_file, write_manifest
+    manifest = read_manifest(json_dir)
+    if manifest is None:
+        raise click.UsageError(f"{json_dir} has no {MANIFEST_FILE}: is it a configuration directory?")
+    expanded = 0
+    for filename in sorted(manifest):
+        if not re.match(r"data/.+_conf\.json(\.gz)?$", filename):
+            continue
+        path = join(json_dir, filename)
+        with open(path, 'rb') as f:
+            content = f.read()
+        json_format = JsonFormat(gzip=filename.endswith('.gz'))
+        text = gzip.decompress(content) if json_format.gzip else content
+        cmd_data = json.loads(text)
+        if not is_templated(cmd_data):
+            continue
+        json_format = json_format._replace(compact=not text.startswith(b'{\n'))
+        content = json_format.encode(json_format.dumps(expand_conf(cmd_data), filename))
+        rewrite_file(json_dir, filename, content, manifest)
+        expanded += 1
+    write_manifest(json_dir, manifest, atomic=True)
+    console.log(f"Expanded {expanded} conf files in {json_dir}")
+
+if __name__ == '__main__':
+    try:
+        cli(show_default=True, standalone_mode=True)
+    except Exception as e:
+        console.print_exception()
@@ -0,0 +1,258 @@
+"""
+Content-addressed cache of generated configurations.
+
+With --config-cache, the generators look the configuration up in a cache
+directory before generating it. The key is a hash over the effective
+options (the defaults included, and without the options that don't
+change the files, like --jobs or --profile), the generator and the
+generator version: the content of the minidaqapp sources, the moo model
+path, which changes with the release, and the content of the schemas
+the sources load (with what they import). On a hit the cached files
+are copied (or hard-linked, with --config-cache link) to JSON_DIR, and
+nothing is generated; on a miss the configuration is generated as usual
+and then stored in the cache.
+
+Hard-linked files are shared with the cache, so they must not be edited
+in place: replace them, or use the default copies.
+
+The cache lives in $MINIDAQAPP_CONFIG_CACHE if that is set, otherwise in
+$XDG_CACHE_HOME/minidaqapp/configs (~/.cache/... by default). After each
+store, the entries that weren't used for MINIDAQAPP_CONFIG_CACHE_MAX_DAYS
+days (30 by default) are removed, then the least recently used ones until
+the cache is under MINIDAQAPP_CONFIG_CACHE_MAX_MB megabytes (5000 by
+default). To look at the cache or evict entries by hand:
+
+    python -m minidaqapp.config_cache list
+    python -m minidaqapp.config_cache evict --max-size-mb 1000 --max-age-days 7
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from os.path import exists, isdir, join
+
+import click
+from rich.console import Console
+
+console = Console()
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+# Bump this whenever the layout of the cache entries changes
+CACHE_FORMAT_VERSION = 1
+
+CACHE_DIR_ENV = "MINIDAQAPP_CONFIG_CACHE"
+MAX_MB_ENV = "MINIDAQAPP_CONFIG_CACHE_MAX_MB"
+MAX_DAYS_ENV = "MINIDAQAPP_CONFIG_CACHE_MAX_DAYS"
+DEFAULT_MAX_MB = 5000
+DEFAULT_MAX_DAYS = 30
+
+ENTRY_FILE = 'entry.json'
+CONFIG_DIR = 'config'
+
+# Options that don't change the generated files
+IGNORED_OPTIONS = frozenset(['json_dir', 'update', 'jobs', 'verify_json', 'stream', 'config_cache',
+                             'profile', 'profile_stats', 'profile_memory', 'debug'])
+
+# Options that name a file whose content makes part of the configuration
+FILE_OPTIONS = frozenset(['host_inventory'])
+
+def cache_dir():
+    """Return the configuration cache directory, or None if caching is disabled"""
+    if CACHE_DIR_ENV in os.environ:
+        return os.environ[CACHE_DIR_ENV] or None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "minidaqapp", "configs")
+
+def normalise_options(options):
+    """
+    The options that make the configuration, as plain JSON data with
+    sorted keys. The files named by FILE_OPTIONS are replaced by the
+    sha256 of their content
+    """
+    def plain(value):
+        if isinstance(value, (list, tuple)):
+            return [plain(item) for item in value]
+        return value
+    def file_digest(path):
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    return {name: file_digest(value) if name in FILE_OPTIONS and value else plain(value)
+            for name, value in sorted(options.items()) if name not in IGNORED_OPTIONS}
+
+_generator_version = None
+
+# The schema files named in the sources, e.g. 'readoutlibs/readoutconfig.jsonnet'
+_SCHEMA_FILE = re.compile(rb"""['"]([\w./-]+\.jsonnet)['"]""")
+
+def generator_version():
+    """
+    A hash of the minidaqapp sources, of the moo model path and of the
+    schemas the sources load (see schema_cache.schema_key())
+    """
+    global _generator_version
+    if _generator_version is None:
+        from dunedaq.env import get_moo_model_path
+        from .schema_cache import schema_key
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        schemas = set()
+        for root, dirs, files in os.walk(package_dir):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for filename in sorted(files):
+                if filename.endswith('.py'):
+                    path = join(root, filename)
+                    digest.update(os.path.relpath(path, package_dir).encode() + b'\0')
+                    with open(path, 'rb') as f:
+                        content = f.read()
+                    digest.update(content + b'\0')
+                    schemas.update(match.decode() for match in _SCHEMA_FILE.findall(content))
+        model_path = get_moo_model_path()
+        if not isinstance(model_path, str):
+            model_path = ":".join(str(p) for p in model_path)
+        digest.update(model_path.encode())
+        for schema in sorted(schemas):
+            digest.update(f"\0{schema}\0{schema_key(schema) or 'missing'}".encode())
+        _generator_version = digest.hexdigest()
+    return _generator_version
+
+def config_key(generator, options):
+    """The cache key of the configuration `generator` makes with `options` (the click parameters)"""
+    description = {"cache_format": CACHE_FORMAT_VERSION, "generator": generator,
+                   "generator_version": generator_version(), "options": normalise_options(options)}
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # e.g. the cache and JSON_DIR are on different file systems
+        shutil.copy(src, dst)
+
+def _tree_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            size += os.lstat(join(root, filename)).st_size
+    return size
+
+class ConfigCache:
+    """A cache directory of configurations: {key}/config is the configuration, {key}/entry.json describes it"""
+    def __init__(self, path, max_mb=None, max_days=None):
+        self.path = path
+        self.max_mb = max_mb if max_mb is not None else float(os.environ.get(MAX_MB_ENV) or DEFAULT_MAX_MB)
+        self.max_days = max_days if max_days is not None else float(os.environ.get(MAX_DAYS_ENV) or DEFAULT_MAX_DAYS)
+
+    @classmethod
+    def open(cls):
+        """The cache in cache_dir(), or None if caching is disabled"""
+        path = cache_dir()
+        return cls(path) if path else None
+
+    def fetch(self, key, json_dir, link=False):
+        """Copy (or hard-link) the configuration `key` to `json_dir`, which must not exist. Returns whether it was in the cache"""
+        entry = join(self.path, key)
+        if not exists(join(entry, ENTRY_FILE)):
+            return False
+        shutil.copytree(join(entry, CONFIG_DIR), json_dir, copy_function=_link_or_copy if link else shutil.copy)
+        # The entry file's mtime is when the entry was last used, for the eviction
+        os.utime(join(entry, ENTRY_FILE))
+        return True
+
+    def store(self, key, json_dir, generator, options, link=False, exclude=()):
+        """Store the configuration in `json_dir` as `key`, leaving out the files named in `exclude`"""
+        os.makedirs(self.path, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.path)
+        try:
+            shutil.copytree(json_dir, join(tmp_dir, CONFIG_DIR), ignore=shutil.ignore_patterns(*exclude),
+                            copy_function=_link_or_copy if link else shutil.copy)
+            with open(join(tmp_dir, ENTRY_FILE), 'w') as f:
+                json.dump({"generator": generator, "options": normalise_options(options),
+                           "size": _tree_size(join(tmp_dir, CONFIG_DIR))}, f, indent=4, sort_keys=True)
+            try:
+                os.rename(tmp_dir, join(self.path, key))
+            except OSError:
+                # Stored in the meantime by another generator
+                pass
+        finally:
+            if exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """[(key, last used, entry)] of the entries, least recently used first"""
+        entries = []
+        if not isdir(self.path):
+            return entries
+        for key in os.listdir(self.path):
+            entry_file = join(self.path, key, ENTRY_FILE)
+            if key.startswith('.'):
+                continue
+            try:
+                with open(entry_file) as f:
+                    entry = json.load(f)
+                last_used = os.stat(entry_file).st_mtime
+            except (OSError, ValueError):
+                continue
+            entries.append((key, last_used, entry))
+        return sorted(entries, key=lambda item: item[1])
+
+    def evict(self, max_mb=None, max_days=None):
+        """Remove the entries unused for `max_days`, then the least recently used ones until the cache fits in `max_mb`. Returns the removed keys"""
+        max_mb = self.max_mb if max_mb is None else max_mb
+        max_days = self.max_days if max_days is None else max_days
+        now = time.time()
+        entries = self.entries()
+        removed = []
+        total = sum(entry["size"] for _, _, entry in entries)
+        for key, last_used, entry in entries:
+            if now - last_used <= max_days * 86400 and total <= max_mb * 1e6:
+                continue
+            shutil.rmtree(join(self.path, key), ignore_errors=True)
+            total -= entry["size"]
+            removed.append(key)
+        # Left over by generators that were interrupted while storing
+        for name in os.listdir(self.path) if isdir(self.path) else []:
+            path = join(self.path, name)
+            if name.startswith('.tmp-') and now - os.stat(path).st_mtime > 86400:
+                shutil.rmtree(path, ignore_errors=True)
+        return removed
+
+def _open_or_fail():
+    cache = ConfigCache.open()
+    if cache is None:
+        raise click.UsageError(f"The configuration cache is disabled (${CACHE_DIR_ENV} is empty)")
+    return cache
+
+@click.group(context_settings=CONTEXT_SETTINGS)
+def cli():
+    """Inspect the cache of configurations used by the generators with --config-cache"""
+
+@cli.command('list')
+def list_entries():
+    """List the cached configurations, least recently used first"""
+    cache = _open_or_fail()
+    entries = cache.entries()
+    now = time.time()
+    for key, last_used, entry in entries:
+        console.print(f"{key[:16]} {entry['generator']:8} {entry['size']/1e6:8.1f} MB  used {(now - last_used)/86400:5.1f} days ago")
+    console.print(f"{len(entries)} configurations, {sum(entry['size'] for _, _, entry in entries)/1e6:.1f} MB in {cache.path}")
+
+@cli.command()
+@click.option('--max-size-mb', type=float, default=None, help=f"Size to bring the cache under (default: ${MAX_MB_ENV}, or {DEFAULT_MAX_MB})")
+@click.option('--max-age-days', type=float, default=None, help=f"Remove the entries unused for longer than this (default: ${MAX_DAYS_ENV}, or {DEFAULT_MAX_DAYS})")
+def evict(max_size_mb, max_age_days):
+    """Remove old and least recently used configurations from the cache"""
+    cache = _open_or_fail()
+    removed = cache.evict(max_mb=max_size_mb, max_days=max_age_days)
+    console.log(f"Removed {len(removed)} configurations from {cache.path}")
+
+if __name__ == '__main__':
+    try:
+        cli(show_default=True, standalone_mode=True)
+    except Exception as e:
+        console.print_exception()
@@ -0,0 +1,521 @@
+"""
+Rendering and writing of the generated configuration files.
+
+A configuration directory holds one data/{app}_{command}.json file per
+app and command, plus the top-level {command}.json and boot.json. At
+full-detector scale that is thousands of files, so:
+
+* render_command_files() turns the per-app command data into JSON
+  text, optionally in a pool of forked worker processes;
+  iter_command_files() does the same one app at a time, for callers
+  that write each app as soon as it is rendered;
+* ConfigWriter writes the files from a small pool of threads, one batch
+  of files per app, so that the generator doesn't sit idle waiting on a
+  slow (shared) filesystem.
+
+ConfigWriter also records the sha256 of every file it writes in
+manifest.sha256 (in the format of `sha256sum`, so `sha256sum -c
+manifest.sha256` checks a configuration). In update mode it uses the
+manifest of the previous generation to leave untouched the files whose
+content didn't change, so that their modification times are preserved
+and rsync only ships what changed, and to remove the files that are no
+longer generated.
+
+By default the JSON text is exactly what json.dump(..., indent=4,
+sort_keys=True) produces. A JsonFormat can instead ask for compact JSON
+(no indentation, rendered with orjson if it is installed but with the
+floats formatted the way json formats them, so that the bytes don't
+depend on orjson), optionally gzipped, with a msgpack sidecar next to
+each app command data file, and for each compact file or sidecar to be
+checked against the pretty JSON and read back once written. It can
+also ask for a bundle: the whole configuration in a single bundle.json
+(see bundle.py) instead of one file per app and command. The results
+of the workers are put back in order, so the files don't depend on the
+number of processes or threads.
+"""
+
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from os.path import exists, join
+from typing import List, NamedTuple
+
+from rich.console import Console
+
+from .bundle import BUNDLE_FILE, assemble_bundle
+from .sidecar import SIDECAR_SUFFIX
+
+console = Console()
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The strings and numbers of a JSON text
+_JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?')
+
+def _json_float(match):
+    token = match.group()
+    if token[0] == '"' or not any(c in token for c in '.eE'):
+        return token
+    return json.dumps(float(token))
+
+class JsonFormat(NamedTuple):
+    """How the JSON files are rendered and encoded"""
+    # No indentation or spaces
+    compact: bool = False
+    # Write {name}.json.gz rather than {name}.json
+    gzip: bool = False
+    # Check that each compact file and sidecar has the same content as the pretty JSON,
+    # and that each file reads back as written
+    verify: bool = False
+    # Write all the files in one bundle.json (gzipped as a whole with `gzip`)
+    bundle: bool = False
+    # Write the conf command of each app as templates plus overrides (see conf_templates.py)
+    templated_conf: bool = False
+    # Write a msgpack sidecar next to each app command data file (see sidecar.py)
+    sidecar: bool = False
+    # Write identical small app command data files once, as data/shared_{hash}.json
+    share_identical: bool = False
+
+    @property
+    def suffix(self):
+        return ".json.gz" if self.gzip else ".json"
+
+    def dumps(self, data, what="data"):
+        """The JSON text of `data` (a moo object or plain data), `what` being its name for error messages"""
+        if hasattr(data, "pod"):
+            data = data.pod()
+        if not self.compact:
+            return json.dumps(data, indent=4, sort_keys=True)
+
+        text = None
+        if orjson is not None:
+            try:
+                text = orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+            except TypeError:
+                # orjson is stricter than json (e.g. integers beyond 64 bits)
+                pass
+            else:
+                # orjson formats some floats differently (1e-05 vs 0.00001): use json's repr
+                if re.search(r'\d[.eE]', text):
+                    text = _JSON_TOKEN.sub(_json_float, text)
+        if text is None:
+            # Not escaping the non-ASCII characters, like orjson
+            text = json.dumps(data, separators=(',', ':'), sort_keys=True, ensure_ascii=False)
+        if self.verify and json.loads(text) != json.loads(json.dumps(data, indent=4, sort_keys=True)):
+            raise ValueError(f"The compact JSON of {what} doesn't have the same content as the pretty JSON")
+        return text
+
+    def app_command(self, cmd, data):
+        """The data to write for the command `cmd` of an app"""
+        if self.templated_conf and cmd == 'conf':
+            from .conf_templates import make_templated
+            return make_templated(data)
+        return data
+
+    def app_command_files(self, cmd, data, what):
+        """
+        {key: file content} of the command `cmd` of an app: the JSON file
+        under `cmd` and, if requested, its sidecar under cmd + SIDECAR_SUFFIX
+        """
+        data = self.app_command(cmd, data)
+        if hasattr(data, "pod"):
+            data = data.pod()
+        text = self.dumps(data, what)
+        content = self.encode(text)
+        if not self.sidecar:
+            return {cmd: content}
+        from .sidecar import make_sidecar, read_sidecar
+        sidecar = make_sidecar(data, content)
+        if self.verify and read_sidecar(sidecar)[1] != json.loads(text):
+            raise ValueError(f"The msgpack sidecar of {what} doesn't have the same content as the JSON")
+        return {cmd: content, cmd + SIDECAR_SUFFIX: sidecar}
+
+    def encode(self, text):
+        """The content of the file for `text`"""
+        content = text.encode()
+        if self.gzip and not self.bundle:
+            # mtime=0 keeps the output reproducible
+            content = gzip.compress(content, mtime=0)
+        return content
+
+# What appfwk's write_json_files() writes
+PRETTY = JsonFormat()
+
+# What the forked workers render. Set just before the pool is created,
+# so that the workers inherit it instead of having it pickled
+_render_job = None
+
+def _render(name, command_data, json_format):
+    contents = {}
+    for cmd, data in command_data.items():
+        contents.update(json_format.app_command_files(cmd, data, f"{name} {cmd}"))
+    return contents
+
+def _render_chunk(indices):
+    names, get_command_data, json_format = _render_job
+    results = []
+    for idx in indices:
+        results.append((names[idx], _render(names[idx], get_command_data(names[idx]), json_format)))
+    return results
+
+def render_command_files(names, get_command_data, jobs=1, json_format=PRETTY):
+    """
+    Return [(name, {command: file content})] for each name in `names`, in
+    that order. get_command_data(name) returns the command data of one
+    app, as a dict of command name to moo object (or plain dict). The
+    file content is the bytes to write, in `json_format`. Sidecars, if
+    the format has them, are under {command}.msgpack.
+
+    With jobs > 1 this runs in up to `jobs` forked processes, which only
+    send back the file contents. Where that isn't possible, it runs serially.
+    """
+    return list(iter_command_files(names, get_command_data, jobs, json_format))
+
+def iter_command_files(names, get_command_data, jobs=1, json_format=PRETTY):
+    """
+    Like render_command_files(), but yield (name, {command: file content})
+    as each app is rendered, so that the contents of all the apps don't
+    have to be held in memory at once. Run serially, each app's command
+    data is only made when the previous app's contents have been consumed.
+    """
+    global _render_job
+    names = list(names)
+    done = 0
+    if jobs > 1 and len(names) > 1:
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            context = None
+            console.log("fork is not available on this platform, rendering the command data serially")
+
+        if context is not None:
+            workers = min(jobs, len(names))
+            chunksize = max(1, len(names) // (workers * 4))
+            chunks = [range(start, min(start + chunksize, len(names))) for start in range(0, len(names), chunksize)]
+            _render_job = (names, get_command_data, json_format)
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    for chunk in pool.map(_render_chunk, chunks):
+                        for result in chunk:
+                            yield result
+                            done += 1
+                return
+            except (pickle.PicklingError, BrokenProcessPool) as e:
+                console.log(f"Could not render the command data in parallel ({e!r}), rendering the rest serially")
+            finally:
+                _render_job = None
+
+    for name in names[done:]:
+        yield name, _render(name, get_command_data(name), json_format)
+
+MANIFEST_FILE = 'manifest.sha256'
+
+# Largest app command data file that is shared with share_identical. The
+# smaller ones are held until the first top-level file is written
+SHARE_MAX_SIZE = 4096
+
+def _digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+def read_manifest(json_dir):
+    """Return {path relative to json_dir: sha256} from the manifest in json_dir, or None if there is none"""
+    manifest_path = join(json_dir, MANIFEST_FILE)
+    if not exists(manifest_path):
+        return None
+    manifest = {}
+    with open(manifest_path) as f:
+        for line in f:
+            digest, _, filename = line.rstrip('\n').partition('  ')
+            if filename:
+                manifest[filename] = digest
+    return manifest
+
+def config_digest(json_dir):
+    """
+    The content hash of the configuration in json_dir: the sha256 of its
+    manifest, which lists the sha256 of every file. None if it has no manifest
+    """
+    manifest_path = join(json_dir, MANIFEST_FILE)
+    if not exists(manifest_path):
+        return None
+    with open(manifest_path, 'rb') as f:
+        return _digest(f.read())
+
+def write_manifest(json_dir, manifest, atomic):
+    """Write the manifest of json_dir, from {path relative to json_dir: sha256}"""
+    _write_content(join(json_dir, MANIFEST_FILE),
+                   ''.join(f"{manifest[filename]}  {filename}\n" for filename in sorted(manifest)).encode(),
+                   atomic)
+
+def rewrite_file(json_dir, filename, content, manifest):
+    """
+    Atomically replace the file `filename` (relative to json_dir) of a
+    generated configuration with `content`, and record its new sha256 in
+    `manifest`, to be written with write_manifest()
+    """
+    _write_content(join(json_dir, filename), content, atomic=True)
+    manifest[filename] = _digest(content)
+
+def _write_content(path, content, atomic):
+    if atomic:
+        # Readers (and rsync) see either the old or the new file, never a partial one
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    else:
+        with open(path, 'wb') as f:
+            f.write(content)
+
+class ConfigDelta(NamedTuple):
+    """Files of a configuration directory, relative to it, by what happened to them"""
+    added: List[str]
+    changed: List[str]
+    unchanged: List[str]
+    removed: List[str]
+
+    def __str__(self):
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.unchanged)} unchanged, {len(self.removed)} removed"
+
+    def details(self):
+        """One line per file that was added, changed or removed"""
+        return "\n".join(f"{status:<8} {filename}"
+                         for status in ('added', 'changed', 'removed')
+                         for filename in sorted(getattr(self, status)))
+
+class ConfigWriter:
+    """
+    Writes the files of one configuration directory. Unless `update` is
+    set, the directory must not exist yet. Writes happen in the
+    background; call finish() to wait for them, which raises the first
+    error encountered, if any.
+
+    With `update`, the directory may already hold a configuration: only
+    the files whose content changed are rewritten (each one atomically),
+    and finish() removes the files of the previous manifest that weren't
+    written this time.
+
+    The files are written in `json_format`, a JsonFormat; the names given
+    to write_file() are for .json files, and get a .json.gz suffix
+    instead when the format is gzipped. When the format is a bundle,
+    nothing is written before finish(), which writes the bundle; only
+    top-level files can then be written with write_file().
+
+    When the format shares identical files, the app command data files
+    that are identical in several apps are written once, as
+    data/shared_{hash}.json, and the "apps" of the top-level command files
+    point to them. This requires the apps to be written before the
+    top-level files.
+    """
+    def __init__(self, json_dir, threads=8, update=False, json_format=PRETTY):
+        self.json_dir = json_dir
+        self.data_dir = join(json_dir, 'data')
+        self.update = update
+        self.json_format = json_format
+        self.previous_manifest = read_manifest(json_dir) if update else None
+        self._bundle = {'boot': None, 'commands': {}, 'apps': {}} if json_format.bundle else None
+        # {digest: [(app, command, content, sidecar)]} of the files that may be shared, until they're written
+        self._share_candidates = {} if json_format.share_identical and not json_format.bundle else None
+        # {(app, command): path of the shared file, without suffix}
+        self._shared = {}
+        os.makedirs(self.json_dir if json_format.bundle else self.data_dir, exist_ok=update)
+        self._pool = ThreadPoolExecutor(max_workers=threads) if threads > 0 else None
+        self._max_pending = 4 * threads
+        self._pending = []
+        self._results = []
+
+    def _status(self, filename, digest):
+        path = join(self.json_dir, filename)
+        if not self.update or not exists(path):
+            return 'added'
+        previous = (self.previous_manifest or {}).get(filename)
+        if previous is None:
+            # Not in the manifest (or no manifest at all): compare with what is on disk
+            with open(path, 'rb') as f:
+                previous = _digest(f.read())
+        return 'unchanged' if previous == digest else 'changed'
+
+    def _write_batch(self, files):
+        results = []
+        for filename, content in files:
+            digest = _digest(content)
+            status = self._status(filename, digest)
+            if status != 'unchanged':
+                _write_content(join(self.json_dir, filename), content, self.update)
+            if self.json_format.verify:
+                self._verify_file(filename, content)
+            results.append((filename, digest, status))
+        return results
+
+    def _verify_file(self, filename, content):
+        """Check that `filename` holds `content` and that it decodes (gunzipped, if it is gzipped)"""
+        with open(join(self.json_dir, filename), 'rb') as f:
+            written = f.read()
+        if written != content:
+            raise ValueError(f"{filename} doesn't read back as it was written")
+        if filename.endswith('.gz'):
+            written = gzip.decompress(written)
+        if filename.endswith(SIDECAR_SUFFIX):
+            from .sidecar import read_sidecar
+            read_sidecar(written)
+        else:
+            json.loads(written)
+
+    def _submit(self, files):
+        if self._pool is None:
+            self._results += self._write_batch(files)
+        else:
+            # Don't let the batches pile up in memory when the filesystem is slower than the generator
+            while len(self._pending) >= self._max_pending:
+                self._results += self._pending.pop(0).result()
+            self._pending.append(self._pool.submit(self._write_batch, files))
+
+    def _encode(self, data, what):
+        return self.json_format.encode(self.json_format.dumps(data, what))
+
+    def write_app_contents(self, app_name, contents):
+        """Write data/{app_name}_{command}.json for each {command: file content} in `contents`, from render_command_files()"""
+        if self._bundle is not None:
+            self._bundle['apps'][app_name] = contents
+            return
+        if self._share_candidates is not None:
+            contents = self._hold_share_candidates(app_name, contents)
+        suffix = self.json_format.suffix
+        self._submit([(f"data/{app_name}_{cmd}{'' if cmd.endswith(SIDECAR_SUFFIX) else suffix}", content)
+                      for cmd, content in contents.items()])
+
+    def _hold_share_candidates(self, app_name, contents):
+        """Keep the small files of `contents` as candidates for sharing, and return the others"""
+        others = {}
+        for cmd, content in contents.items():
+            if cmd.endswith(SIDECAR_SUFFIX):
+                continue
+            sidecar = contents.get(cmd + SIDECAR_SUFFIX)
+            if len(content) <= SHARE_MAX_SIZE:
+                self._share_candidates.setdefault(_digest(content), []).append((app_name, cmd, content, sidecar))
+            else:
+                others[cmd] = content
+                if sidecar is not None:
+                    others[cmd + SIDECAR_SUFFIX] = sidecar
+        return others
+
+    def _write_share_candidates(self):
+        """Write the candidates for sharing, each one once if it is in several apps"""
+        candidates, self._share_candidates = self._share_candidates, None
+        if not candidates:
+            return
+        suffix = self.json_format.suffix
+        files = []
+        for digest, entries in candidates.items():
+            _, _, content, sidecar = entries[0]
+            if len(entries) > 1:
+                path = f"data/shared_{digest[:16]}"
+                for app_name, cmd, _, _ in entries:
+                    self._shared[(app_name, cmd)] = path
+            else:
+                app_name, cmd, _, _ = entries[0]
+                path = f"data/{app_name}_{cmd}"
+            files.append((path + suffix, content))
+            if sidecar is not None:
+                files.append((path + SIDECAR_SUFFIX, sidecar))
+        self._submit(files)
+
+    def _point_to_shared(self, cmd, data):
+        """`data`, a top-level command, with its apps pointing to the shared files"""
+        if self._share_candidates is not None:
+            self._write_share_candidates()
+        if not self._shared:
+            return data
+        if hasattr(data, "pod"):
+            data = data.pod()
+        apps = data.get('apps') if isinstance(data, dict) else None
+        if not isinstance(apps, dict):
+            return data
+        return dict(data, apps={app_name: self._shared.get((app_name, cmd), path) if path == f"data/{app_name}_{cmd}" else path
+                                for app_name, path in apps.items()})
+
+    def write_app(self, app_name, command_data):
+        """Write data/{app_name}_{command}.json for each {command: data} in `command_data`"""
+        self.write_app_contents(app_name, _render(app_name, command_data, self.json_format))
+
+    def write_file(self, filename, data):
+        """Write `data` as JSON to `filename` (a .json file), relative to the configuration directory"""
+        if self._bundle is not None:
+            name, ext = os.path.splitext(filename)
+            if ext != '.json' or '/' in name:
+                raise ValueError(f"Only top-level .json files can be written to a bundle, not {filename}")
+            self._add_to_bundle(name, self._encode(data, filename))
+            return
+        data = self._point_to_shared(os.path.splitext(filename)[0], data)
+        if self.json_format.gzip:
+            filename += ".gz"
+        self._submit([(filename, self._encode(data, filename))])
+
+    def write_system(self, system_command_datas):
+        """Write the top-level {command}.json files (and boot.json, if it's one of them)"""
+        if self._bundle is not None:
+            for cmd, data in system_command_datas.items():
+                self._add_to_bundle(cmd, self._encode(data, cmd))
+            return
+        suffix = self.json_format.suffix
+        self._submit([(f"{cmd}{suffix}", self._encode(self._point_to_shared(cmd, data), cmd)) for cmd, data in system_command_datas.items()])
+
+    def _add_to_bundle(self, name, content):
+        if name == 'boot':
+            self._bundle['boot'] = content
+        else:
+            self._bundle['commands'][name] = content
+
+    def _write_bundle(self):
+        content = assemble_bundle(self._bundle['boot'], self._bundle['commands'], self._bundle['apps'])
+        filename = BUNDLE_FILE
+        if self.json_format.gzip:
+            content = gzip.compress(content, mtime=0)
+            filename += ".gz"
+        self._results += self._write_batch([(filename, content)])
+
+    def finish(self):
+        """
+        Wait for the writes, write the manifest and, in update mode,
+        remove the stale files. Returns a ConfigDelta.
+        """
+        if self._bundle is not None:
+            self._write_bundle()
+        if self._share_candidates is not None:
+            self._write_share_candidates()
+        pending, self._pending = self._pending, []
+        results, self._results = self._results, []
+        try:
+            for future in pending:
+                results += future.result()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+        manifest = {}
+        delta = ConfigDelta([], [], [], [])
+        for filename, digest, status in results:
+            manifest[filename] = digest
+            getattr(delta, status).append(filename)
+
+        for filename in sorted(set(self.previous_manifest or {}) - set(manifest)):
+            path = join(self.json_dir, filename)
+            if exists(path):
+                os.remove(path)
+            delta.removed.append(filename)
+        if self._bundle is not None and exists(self.data_dir) and not os.listdir(self.data_dir):
+            # Left over from a configuration that wasn't a bundle
+            os.rmdir(self.data_dir)
+
+        write_manifest(self.json_dir, manifest, self.update)
+        return delta
@@ -0,0 +1,173 @@
+"""
+Host inventory: what the hosts available to a partition have to offer.
+
+An inventory is a JSON file, given to the newconf generator with
+--host-inventory:
+
+    {"hosts": {
+        "np04-srv-021": {"cores": 64, "numa_nodes": 2, "memory_gb": 256, "nic_gbps": 100,
+                         "numa_cpus": ["0-15,32-47", "16-31,48-63"],
+                         "disks": ["/data0", "/data1"],
+                         "felix_cards": [{"card_id": 0, "numa_node": 0},
+                                         {"card_id": 1, "numa_node": 1, "dma_memory_gb": 8}]},
+        "np04-srv-001": {"cores": 32, "memory_gb": 128, "nic_gbps": 25}}}
+
+The memory sizes ("memory_gb", "dma_memory_gb") are in GiB (1024**3
+bytes), like the dma_memory_size_gb of the FelixCardReader. Every field
+but "cores" and "memory_gb" is optional: one NUMA node, a
+10 Gb/s NIC, no disks and no FELIX cards by default. "numa_cpus" gives
+the cpu list of each NUMA node, as in /sys/devices/system/node/node*/cpulist
+(or lscpu): without it, the cores are split evenly and in order between
+the nodes. A FELIX card is on NUMA node 0 and has 4 GiB of DMA memory
+unless it says otherwise.
+
+The NUMA node of a card can also be given on the command line, with
+--card-numa-node HOST:CARD_ID:NUMA_NODE, which takes precedence over the
+inventory: see felix_cards().
+"""
+
+import json
+from dataclasses import dataclass, replace
+from typing import Dict, Tuple
+
+# The unit of the memory sizes of the inventory
+GIB = 1024**3
+
+@dataclass(frozen=True)
+class FelixCard:
+    card_id: int
+    numa_node: int = 0
+    dma_memory_gb: int = 4
+
+@dataclass(frozen=True)
+class Host:
+    name: str
+    cores: int
+    memory_gb: float
+    numa_nodes: int = 1
+    nic_gbps: float = 10.
+    disks: Tuple[str, ...] = ()
+    felix_cards: Tuple[FelixCard, ...] = ()
+    # The cpu list ("0-15,32-47") of each NUMA node, if not an even split
+    numa_cpus: Tuple[str, ...] = ()
+
+    def node_cores(self, node):
+        """The cores of NUMA node `node`"""
+        if self.numa_cpus:
+            return parse_cpu_list(self.numa_cpus[node])
+        per_node = self.cores // self.numa_nodes
+        return list(range(node * per_node, (node + 1) * per_node))
+
+    def felix_card(self, card_id):
+        """The FelixCard with the given id, or None"""
+        return next((card for card in self.felix_cards if card.card_id == card_id), None)
+
+def parse_cpu_list(text):
+    """[cores] from a cpu list like "0,3-5" """
+    cores = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cores += range(int(first), int(last or first) + 1)
+    return cores
+
+_HOST_FIELDS = {'cores', 'memory_gb', 'numa_nodes', 'nic_gbps', 'disks', 'felix_cards', 'numa_cpus'}
+_CARD_FIELDS = {'card_id', 'numa_node', 'dma_memory_gb'}
+
+def _host_from_json(name, entry):
+    unknown = set(entry) - _HOST_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown fields for host {name}: {', '.join(sorted(unknown))}")
+    for required in ('cores', 'memory_gb'):
+        if required not in entry:
+            raise ValueError(f"Host {name} has no {required}")
+    cards = []
+    for card in entry.get('felix_cards', []):
+        unknown = set(card) - _CARD_FIELDS
+        if unknown or 'card_id' not in card:
+            raise ValueError(f"Invalid FELIX card {card} for host {name}")
+        cards.append(FelixCard(**card))
+    host = Host(name=name,
+                cores=int(entry['cores']),
+                memory_gb=float(entry['memory_gb']),
+                numa_nodes=int(entry.get('numa_nodes', 1)),
+                nic_gbps=float(entry.get('nic_gbps', 10.)),
+                disks=tuple(entry.get('disks', ())),
+                felix_cards=tuple(cards),
+                numa_cpus=tuple(entry.get('numa_cpus', ())))
+    if host.numa_cpus:
+        if len(host.numa_cpus) != host.numa_nodes:
+            raise ValueError(f"Host {name} has {host.numa_nodes} NUMA nodes but {len(host.numa_cpus)} numa_cpus")
+        seen = set()
+        for node in range(host.numa_nodes):
+            try:
+                cores = host.node_cores(node)
+            except (TypeError, AttributeError, ValueError):
+                raise ValueError(f"Invalid cpu list {host.numa_cpus[node]!r} for NUMA node {node} of host {name}") from None
+            if not cores:
+                raise ValueError(f"NUMA node {node} of host {name} has an empty cpu list")
+            if not all(0 <= core < host.cores for core in cores):
+                raise ValueError(f"The cpu list {host.numa_cpus[node]!r} of NUMA node {node} of host {name} has cores beyond its {host.cores}")
+            if seen & set(cores):
+                raise ValueError(f"The cpu list {host.numa_cpus[node]!r} of NUMA node {node} of host {name} overlaps another node")
+            seen.update(cores)
+    for card in host.felix_cards:
+        if not 0 <= card.numa_node < host.numa_nodes:
+            raise ValueError(f"FELIX card {card.card_id} of host {name} is on NUMA node {card.numa_node}, but the host has {host.numa_nodes} nodes")
+    return host
+
+@dataclass(frozen=True)
+class HostInventory:
+    hosts: Dict[str, Host]
+
+    @classmethod
+    def load(cls, path):
+        """Load an inventory file. Raises ValueError if its content is invalid"""
+        with open(path) as f:
+            try:
+                content = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"{path} is not valid JSON: {e}") from None
+        if not isinstance(content, dict) or not isinstance(content.get('hosts'), dict) or not content['hosts']:
+            raise ValueError(f"{path} should hold a JSON object with a non-empty \"hosts\" object")
+        return cls({name: _host_from_json(name, entry) for name, entry in content['hosts'].items()})
+
+    def __getitem__(self, name):
+        return self.hosts[name]
+
+    def __contains__(self, name):
+        return name in self.hosts
+
+    def __iter__(self):
+        return iter(self.hosts.values())
+
+def parse_card_numa_node(override):
+    """(host, card id, NUMA node) from a "HOST:CARD_ID:NUMA_NODE" string. Raises ValueError if it is malformed"""
+    host, _, rest = override.rpartition(':')
+    host, _, card_id = host.rpartition(':')
+    try:
+        if not host:
+            raise ValueError
+        return host, int(card_id), int(rest)
+    except ValueError:
+        raise ValueError(f"Invalid card NUMA node {override!r}: expected HOST:CARD_ID:NUMA_NODE") from None
+
+def felix_cards(inventory=None, overrides=()):
+    """
+    {(host, card id): FelixCard} for the cards of `inventory` (a
+    HostInventory, or None), with the NUMA nodes of `overrides` ("HOST:CARD_ID:NUMA_NODE"
+    strings) applied. A card that is only in the overrides gets the
+    defaults of FelixCard for the rest
+    """
+    cards = {}
+    if inventory is not None:
+        for host in inventory:
+            for card in host.felix_cards:
+                cards[(host.name, card.card_id)] = card
+    for override in overrides:
+        host, card_id, numa_node = parse_card_numa_node(override)
+        card = cards.get((host, card_id), FelixCard(card_id))
+        cards[(host, card_id)] = replace(card, numa_node=numa_node)
+    return cards
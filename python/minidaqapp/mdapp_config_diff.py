@@ -0,0 +1,275 @@
+"""
+Field-level diff of two generated configurations.
+
+    python -m minidaqapp.mdapp_config_diff OLD NEW
+
+OLD and NEW are configuration directories (or bundles). Apps are matched
+by name, and so are the entries of the lists of named objects (modules,
+queues, connections...), so reordering them isn't a difference. The
+entries of the lists of per-link objects (e.g. the map of the
+request_receiver or the link_confs of the fake sources) are matched by
+their geoid, and the other lists of objects of different lengths are
+compared as multisets. Each difference is printed as
+
+    ruemu0 conf: datahandler_7.latencybufferconf.latency_buffer_size: 499968 -> 1048576
+    ruemu0 conf: + request_receiver.map[system=TPC,region=0,element=2]: {...}
+
+with "+" and "-" for the fields, entries, modules and apps that only
+exist on one side. Like diff, the exit status is 0 if the configurations
+are the same, 1 if they differ and 2 if they couldn't be compared.
+
+Files are only parsed when their content differs (going by the
+manifests, or else by their bytes), which keeps the comparison of two
+full-detector configurations that differ in a few apps well under a
+second. Shared files, gzipped files, templated conf commands and bundles
+are all resolved, so configurations written with different output
+options can be compared.
+"""
+
+import gzip
+import json
+import os
+from collections import Counter
+from os.path import exists, isdir, join
+
+import click
+from rich.console import Console
+
+console = Console()
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+# Keys that identify the entries of a list of objects
+_LIST_KEYS = ("match", "inst", "name", "id")
+
+# What a field that only exists on one side is compared to (None is JSON null)
+_MISSING = object()
+
+class ConfigTree:
+    """The top-level and app command data of a configuration, read on demand"""
+    def __init__(self, path):
+        from .bundle import BUNDLE_FILE, Bundle
+        from .config_writer import read_manifest
+        self.path = path
+        self.bundle = None
+        if not isdir(path) or exists(join(path, BUNDLE_FILE)) or exists(join(path, BUNDLE_FILE + '.gz')):
+            self.bundle = Bundle.load(path)
+            self.manifest = {}
+            self.top_level = dict(self.bundle.content['commands'])
+            if 'boot' in self.bundle.content:
+                self.top_level['boot'] = self.bundle.content['boot']
+            self.app_files = {(app, cmd): None for cmd, data in self.top_level.items() if cmd != 'boot'
+                              for app in data.get('apps', {}) if cmd in self.bundle.content['apps'].get(app, {})}
+            return
+
+        self.manifest = read_manifest(path) or {}
+        self.top_level = {}
+        for filename in sorted(os.listdir(path)):
+            for suffix in ('.json', '.json.gz'):
+                if filename.endswith(suffix):
+                    self.top_level[filename[:-len(suffix)]] = self._load(filename)
+        # {(app, command): file of its command data}, from the top-level command files: the
+        # files of the commands an app isn't sent (e.g. pause for the dataflow apps) aren't compared
+        self.app_files = {}
+        for cmd, data in self.top_level.items():
+            apps = data.get('apps') if isinstance(data, dict) else None
+            if cmd == 'boot' or not isinstance(apps, dict):
+                continue
+            for app, app_path in apps.items():
+                filename = next((app_path + suffix for suffix in ('.json', '.json.gz') if exists(join(path, app_path + suffix))), None)
+                if filename is not None:
+                    self.app_files[(app, cmd)] = filename
+
+    def _load(self, filename):
+        with open(join(self.path, filename), 'rb') as f:
+            content = f.read()
+        return json.loads(gzip.decompress(content) if filename.endswith('.gz') else content)
+
+    @property
+    def apps(self):
+        return sorted({app for app, _ in self.app_files})
+
+    def commands(self, app):
+        return sorted(cmd for a, cmd in self.app_files if a == app)
+
+    def fingerprint(self, app, cmd):
+        """Something equal for two identical files: the sha256 from the manifest, or the bytes of the file"""
+        filename = self.app_files[(app, cmd)]
+        if filename is None:
+            return None
+        if filename in self.manifest:
+            return self.manifest[filename]
+        with open(join(self.path, filename), 'rb') as f:
+            return f.read()
+
+    def command_data(self, app, cmd):
+        from .conf_templates import expand_conf
+        if self.bundle is not None:
+            data = self.bundle.command_data(app)[cmd]
+        else:
+            data = self._load(self.app_files[(app, cmd)])
+        return expand_conf(data)
+
+def _format(value, limit=80):
+    text = json.dumps(value, sort_keys=True)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def _list_key(old, new):
+    """The key identifying the entries of both lists, if they are lists of uniquely named objects"""
+    items = old + new
+    if not items or not all(isinstance(item, dict) for item in items):
+        return None
+    for key in _LIST_KEYS:
+        if all(isinstance(item.get(key), str) for item in items) and \
+           len({item[key] for item in old}) == len(old) and len({item[key] for item in new}) == len(new):
+            return key
+    return None
+
+# Fields of a geoid, in the order they are shown
+_GEOID_FIELDS = ("system", "region", "element")
+
+def _geoid(item):
+    """The geoid of a per-link object, from its "geoid" field or its own region/element fields, or None"""
+    geoid = item.get("geoid", item)
+    if not isinstance(geoid, dict) or "region" not in geoid or "element" not in geoid:
+        return None
+    return tuple((field, geoid[field]) for field in _GEOID_FIELDS if field in geoid)
+
+def _by_geoid(items):
+    """{geoid: item} of `items`, or None if they don't all have distinct geoids"""
+    named = {}
+    for item in items:
+        geoid = _geoid(item)
+        if geoid is None or geoid in named:
+            return None
+        named[geoid] = item
+    return named
+
+def _join(path, name):
+    return f"{path}.{name}" if path else str(name)
+
+def diff_values(old, new, path=""):
+    """Yield (path, old, new) for each difference, with old or new _MISSING when the field is only on one side"""
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(old.keys() | new.keys()):
+            if key not in new:
+                yield _join(path, key), old[key], _MISSING
+            elif key not in old:
+                yield _join(path, key), _MISSING, new[key]
+            else:
+                yield from diff_values(old[key], new[key], _join(path, key))
+    elif isinstance(old, list) and isinstance(new, list):
+        key = _list_key(old, new)
+        if key is None:
+            all_dicts = all(isinstance(item, dict) for item in old + new)
+            old_named, new_named = (_by_geoid(old), _by_geoid(new)) if all_dicts else (None, None)
+            if old_named is not None and new_named is not None:
+                for geoid in sorted(old_named.keys() | new_named.keys(), key=lambda geoid: [(0, value, '') if isinstance(value, int) else (1, 0, str(value)) for _, value in geoid]):
+                    item_path = f"{path}[{','.join(f'{field}={value}' for field, value in geoid)}]"
+                    if geoid not in new_named:
+                        yield item_path, old_named[geoid], _MISSING
+                    elif geoid not in old_named:
+                        yield item_path, _MISSING, new_named[geoid]
+                    else:
+                        yield from diff_values(old_named[geoid], new_named[geoid], item_path)
+                return
+            if all_dicts and len(old) != len(new):
+                # Unnamed entries: show the ones that were removed or added
+                old_counts = Counter(json.dumps(item, sort_keys=True) for item in old)
+                new_counts = Counter(json.dumps(item, sort_keys=True) for item in new)
+                for text in sorted((old_counts - new_counts).elements()):
+                    yield f"{path}[]", json.loads(text), _MISSING
+                for text in sorted((new_counts - old_counts).elements()):
+                    yield f"{path}[]", _MISSING, json.loads(text)
+                return
+            if len(old) != len(new) or not all(isinstance(item, (dict, list)) for item in old + new):
+                yield path, old, new
+                return
+            for idx, (old_item, new_item) in enumerate(zip(old, new)):
+                yield from diff_values(old_item, new_item, f"{path}[{idx}]")
+            return
+        # Named entries: a module {"match": name, "data": {...}} is shown as name.field
+        def by_name(items):
+            named = {}
+            for item in items:
+                rest = {k: v for k, v in item.items() if k != key}
+                named[item[key]] = rest['data'] if rest.keys() == {'data'} else rest
+            return named
+        yield from diff_values(by_name(old), by_name(new), path)
+    else:
+        yield path, old, new
+
+def _normalise_top_level(data):
+    """A top-level command without the paths of the app files, which depend on the output options"""
+    if isinstance(data, dict) and isinstance(data.get('apps'), dict) and all(isinstance(p, str) for p in data['apps'].values()):
+        return dict(data, apps=sorted(data['apps']))
+    return data
+
+def diff_configs(old, new, apps=None, commands=None):
+    """Yield (where, path, old, new) for each difference between the ConfigTrees `old` and `new`, as diff_values() does"""
+    for cmd in sorted(old.top_level.keys() | new.top_level.keys()):
+        if commands and cmd not in commands:
+            continue
+        if cmd not in new.top_level:
+            yield cmd, "", old.top_level[cmd], _MISSING
+        elif cmd not in old.top_level:
+            yield cmd, "", _MISSING, new.top_level[cmd]
+        else:
+            for path, old_value, new_value in diff_values(_normalise_top_level(old.top_level[cmd]), _normalise_top_level(new.top_level[cmd])):
+                yield cmd, path, old_value, new_value
+
+    for app in sorted(set(old.apps) | set(new.apps)):
+        if apps and app not in apps:
+            continue
+        old_commands, new_commands = set(old.commands(app)), set(new.commands(app))
+        for cmd in sorted(old_commands | new_commands):
+            if commands and cmd not in commands:
+                continue
+            where = f"{app} {cmd}"
+            if cmd not in new_commands:
+                yield where, "", old.command_data(app, cmd), _MISSING
+            elif cmd not in old_commands:
+                yield where, "", _MISSING, new.command_data(app, cmd)
+            else:
+                old_fingerprint = old.fingerprint(app, cmd)
+                if old_fingerprint is not None and old_fingerprint == new.fingerprint(app, cmd):
+                    continue
+                for path, old_value, new_value in diff_values(old.command_data(app, cmd), new.command_data(app, cmd)):
+                    # The modules are the bulk of the command data: name them directly
+                    if path.startswith("modules."):
+                        path = path[len("modules."):]
+                    yield where, path, old_value, new_value
+
+def format_difference(where, path, old, new):
+    if new is _MISSING:
+        return f"{where}: - {path or '(all)'}: {_format(old)}"
+    if old is _MISSING:
+        return f"{where}: + {path or '(all)'}: {_format(new)}"
+    return f"{where}: {path}: {_format(old)} -> {_format(new)}"
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('-a', '--app', 'apps', multiple=True, help="Only compare this app (repeatable)")
+@click.option('-c', '--command', 'commands', multiple=True, help="Only compare this command, e.g. conf (repeatable)")
+@click.argument('old', type=click.Path(exists=True))
+@click.argument('new', type=click.Path(exists=True))
+def cli(apps, commands, old, new):
+    """
+    Show the field-level differences between the configurations OLD and
+    NEW (configuration directories or bundles)
+    """
+    count = 0
+    for difference in diff_configs(ConfigTree(old), ConfigTree(new), set(apps), set(commands)):
+        click.echo(format_difference(*difference))
+        count += 1
+    if count:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    try:
+        cli(show_default=True, standalone_mode=True)
+    except Exception as e:
+        console.print_exception()
+        # Not "no differences" (0) nor "differences" (1)
+        raise SystemExit(2)
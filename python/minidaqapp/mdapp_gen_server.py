@@ -0,0 +1,296 @@
+"""
+Long-lived configuration generator, for jobs that generate many
+configurations back to back (parameter scans, CI).
+
+    python -m minidaqapp.mdapp_gen_server serve &
+    python -m minidaqapp.mdapp_gen_server generate -- --host-ru a -n 10 JSON_DIR
+    python -m minidaqapp.mdapp_gen_server generate --generator nanorc -- --host-ru a JSON_DIR
+    python -m minidaqapp.mdapp_gen_server stop
+
+The server imports the generators and loads all their schemas once, at
+start-up, then runs each request in the same process: the generator's
+command line, run from the client's working directory with the client's
+values of the environment variables in FORWARDED_ENV, and with sys.argv
+set to the command line the client would have run. Requests are
+handled one at a time; the client gets back the generator's output, its
+exit code and how long it took.
+
+The protocol is one JSON object per line over a Unix socket that only
+the user running the server can connect to:
+
+    {"op": "generate", "generator": "newconf", "args": [...], "cwd": "...", "env": {...}}
+    {"op": "status"}
+    {"op": "stop"}
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+
+import click
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+# The click commands the server can run, by generator name
+GENERATORS = {
+    'newconf': 'minidaqapp.newconf.mdapp_multiru_gen',
+    'nanorc': 'minidaqapp.nanorc.mdapp_multiru_gen',
+    'global': 'minidaqapp.newconf.global_gen',
+}
+
+# The environment variables that the generators read while generating,
+# which the client sends along with each request
+FORWARDED_ENV = ('DBT_AREA_ROOT', 'USER', 'XDG_CACHE_HOME',
+                 'MINIDAQAPP_CONFIG_CACHE', 'MINIDAQAPP_CONFIG_CACHE_MAX_MB', 'MINIDAQAPP_CONFIG_CACHE_MAX_DAYS')
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, 'mdapp_gen_server.sock')
+    return f"/tmp/mdapp_gen_server-{os.getuid()}.sock"
+
+def request(socket_path, message, timeout=None):
+    """Send `message` (a dict) to the server at `socket_path`, and return its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            reply = f.readline()
+    if not reply:
+        raise RuntimeError(f"The server at {socket_path} closed the connection without replying")
+    return json.loads(reply)
+
+def _set_env(values):
+    for name, value in values.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+def _generate_request(message):
+    """(generator, args, cwd, env) of a generate request. Raises ValueError if it is malformed"""
+    generator = message.get('generator', 'newconf')
+    args = message.get('args', [])
+    cwd = message.get('cwd', os.getcwd())
+    env = message.get('env', {})
+    if not isinstance(generator, str) or not isinstance(cwd, str):
+        raise ValueError("generator and cwd should be strings")
+    if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+        raise ValueError("args should be a list of strings")
+    if not isinstance(env, dict) or not all(isinstance(value, str) for value in env.values()):
+        raise ValueError("env should be an object of strings")
+    return generator, args, cwd, env
+
+class GeneratorServer:
+    """Runs the generators' click commands in this (warm) process"""
+    def __init__(self):
+        self.commands = {}
+        self.started = time.time()
+        self.warmup_seconds = 0.
+        self.served = 0
+        self.busy_seconds = 0.
+
+    def warm_up(self):
+        """Import the generators and load every schema they declare"""
+        import importlib
+        import pkgutil
+        from .schema_registry import registry
+        start = time.perf_counter()
+        for name, module_name in GENERATORS.items():
+            self.commands[name] = importlib.import_module(module_name).cli
+        generator_modules = []
+        for package in ('minidaqapp.nanorc', 'minidaqapp.newconf'):
+            for info in pkgutil.iter_modules(importlib.import_module(package).__path__):
+                if info.name.endswith('_gen') and info.name not in ('mdapp_multiru_gen', 'global_gen'):
+                    generator_modules.append(importlib.import_module(f"{package}.{info.name}").__name__)
+        for module_name in generator_modules:
+            registry.preload(module_name)
+        from .newconf import global_gen, system_builder
+        system_builder.load_system_types()
+        global_gen.load_system_types()
+        self.warmup_seconds = time.perf_counter() - start
+
+    def generate(self, generator, args, cwd, env=None):
+        """
+        Run `generator` with the command line `args` from `cwd`, with the
+        variables of `env` (from FORWARDED_ENV, unset if missing) set;
+        return its reply
+        """
+        import io
+        import traceback
+        from contextlib import redirect_stderr, redirect_stdout
+        command = self.commands.get(generator)
+        if command is None:
+            return {"exit_code": 2, "output": f"Unknown generator {generator} (known: {', '.join(GENERATORS)})\n", "seconds": 0.}
+
+        output = io.StringIO()
+        exit_code = 0
+        previous_cwd = os.getcwd()
+        previous_argv = sys.argv
+        previous_env = {name: os.environ.get(name) for name in FORWARDED_ENV}
+        start = time.perf_counter()
+        try:
+            os.chdir(cwd)
+            # As if the generator had been run with python -m, e.g. for the command line in its .info file
+            sys.argv = [sys.modules[GENERATORS[generator]].__file__] + list(args)
+            _set_env({name: (env or {}).get(name) for name in FORWARDED_ENV})
+            with redirect_stdout(output), redirect_stderr(output):
+                command.main(args=list(args), prog_name=GENERATORS[generator], standalone_mode=False, show_default=True)
+        except click.ClickException as e:
+            e.show(file=output)
+            exit_code = e.exit_code
+        except click.exceptions.Exit as e:
+            exit_code = e.exit_code
+        except click.exceptions.Abort:
+            exit_code = 1
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            output.write(traceback.format_exc())
+            exit_code = 1
+        finally:
+            os.chdir(previous_cwd)
+            sys.argv = previous_argv
+            _set_env(previous_env)
+        seconds = time.perf_counter() - start
+        self.served += 1
+        self.busy_seconds += seconds
+        return {"exit_code": exit_code, "output": output.getvalue(), "seconds": seconds}
+
+    def status(self):
+        return {"pid": os.getpid(), "uptime_seconds": time.time() - self.started, "warmup_seconds": self.warmup_seconds,
+                "requests": self.served, "busy_seconds": self.busy_seconds}
+
+    def handle(self, f, log):
+        """Read one request from the connection file `f` and write the reply. Returns the op"""
+        line = f.readline()
+        if not line:
+            return None
+        try:
+            message = json.loads(line)
+        except ValueError:
+            message = None
+        op = message.get('op') if isinstance(message, dict) else None
+        if op == 'generate':
+            try:
+                generator, args, cwd, env = _generate_request(message)
+            except ValueError as e:
+                reply = {"exit_code": 2, "output": f"Invalid generate request: {e}\n", "seconds": 0.}
+            else:
+                reply = self.generate(generator, args, cwd, env)
+                log(f"{generator} {' '.join(args)}: exit code {reply['exit_code']} in {reply['seconds']*1000:.0f} ms")
+        elif op in ('status', 'stop'):
+            reply = self.status()
+        else:
+            reply = {"error": f"Unknown request {line[:100]!r}"}
+        f.write(json.dumps(reply).encode() + b'\n')
+        f.flush()
+        return op
+
+    def serve(self, socket_path, log):
+        if os.path.exists(socket_path):
+            try:
+                request(socket_path, {"op": "status"}, timeout=5)
+            except (ConnectionRefusedError, FileNotFoundError, socket.timeout):
+                # Left over by a server that didn't exit cleanly
+                os.unlink(socket_path)
+            else:
+                raise click.ClickException(f"A server is already running on {socket_path}")
+
+        previous_umask = os.umask(0o077)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(socket_path)
+        finally:
+            os.umask(previous_umask)
+        listener.listen()
+        log(f"Serving on {socket_path} (pid {os.getpid()}, warmed up in {self.warmup_seconds*1000:.0f} ms)")
+        try:
+            while True:
+                connection, _ = listener.accept()
+                try:
+                    with connection, connection.makefile('rwb') as f:
+                        op = self.handle(f, log)
+                except OSError as e:
+                    # e.g. BrokenPipeError: the client went away before the reply
+                    log(f"Client gone: {e}")
+                    continue
+                except Exception:
+                    # A bad request must not take the server down
+                    import traceback
+                    log(f"Failed to handle a request:\n{traceback.format_exc()}")
+                    continue
+                if op == 'stop':
+                    break
+        finally:
+            listener.close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+        log(f"Stopped after {self.served} requests")
+
+socket_option = click.option('-s', '--socket', 'socket_path', type=click.Path(), default=default_socket_path, show_default="$XDG_RUNTIME_DIR/mdapp_gen_server.sock",
+                             help="Unix socket of the server")
+
+@click.group(context_settings=CONTEXT_SETTINGS)
+def cli():
+    """Serve configuration generation requests from a warm process"""
+
+@cli.command()
+@socket_option
+def serve(socket_path):
+    """Start the server, in the foreground"""
+    from rich.console import Console
+    console = Console()
+    server = GeneratorServer()
+    server.warm_up()
+    try:
+        server.serve(socket_path, console.log)
+    except KeyboardInterrupt:
+        console.log("Interrupted")
+
+@cli.command(context_settings=dict(ignore_unknown_options=True, **CONTEXT_SETTINGS))
+@socket_option
+@click.option('-g', '--generator', type=click.Choice(list(GENERATORS)), default='newconf', help="Which generator to run")
+@click.option('--timing/--no-timing', default=True, help="Print how long the server took")
+@click.argument('args', nargs=-1, type=click.UNPROCESSED)
+def generate(socket_path, generator, timing, args):
+    """
+    Run the generator in the server with the command line ARGS (put
+    them after --), and exit with its exit code
+    """
+    start = time.perf_counter()
+    try:
+        reply = request(socket_path, {"op": "generate", "generator": generator, "args": list(args), "cwd": os.getcwd(),
+                                        "env": {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ}})
+    except (ConnectionRefusedError, FileNotFoundError):
+        raise click.ClickException(f"No server on {socket_path} (start one with: python -m minidaqapp.mdapp_gen_server serve)")
+    sys.stdout.write(reply["output"])
+    if timing:
+        click.echo(f"Generated in {reply['seconds']*1000:.0f} ms by the server, {(time.perf_counter() - start)*1000:.0f} ms in total", err=True)
+    sys.exit(reply["exit_code"])
+
+@cli.command()
+@socket_option
+def status(socket_path):
+    """Show the status of the server"""
+    try:
+        reply = request(socket_path, {"op": "status"}, timeout=10)
+    except (ConnectionRefusedError, FileNotFoundError):
+        raise click.ClickException(f"No server on {socket_path}")
+    click.echo(f"pid {reply['pid']}, up for {reply['uptime_seconds']:.0f} s (warm-up {reply['warmup_seconds']*1000:.0f} ms), "
+               f"{reply['requests']} requests served in {reply['busy_seconds']:.1f} s")
+
+@cli.command()
+@socket_option
+def stop(socket_path):
+    """Stop the server once it is done with the current request"""
+    try:
+        request(socket_path, {"op": "stop"})
+    except (ConnectionRefusedError, FileNotFoundError):
+        raise click.ClickException(f"No server on {socket_path}")
+
+if __name__ == '__main__':
+    cli(show_default=True, standalone_mode=True)
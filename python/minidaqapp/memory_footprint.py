@@ -0,0 +1,137 @@
+"""
+Memory footprint of the apps of a generated system.
+
+The newconf generator walks the System it built and adds up, for each
+app, the memory its modules allocate up front:
+
+  - the latency buffers of the DataLinkHandlers: latency_buffer_size
+    elements of the frontend's element size (of a trigger primitive for
+    the TP handlers)
+  - the preallocated (Folly) queues: capacity x item size, where the
+    items of the queues into the DataLinkHandlers are frontend elements
+    or trigger primitives, and the others are small messages
+  - the DMA memory of the FelixCardReaders
+  - the raw recording stream buffers of the DataLinkHandlers that record
+  - a fixed amount for the daq_application process itself
+
+and then per host, from the host of each app. This is an estimate of
+what a configuration commits the hosts to, not a measurement.
+
+With --host-inventory, the generation fails if the apps of a host need
+more than its "memory_gb" (GiB, like everything in the report). --memory-report prints the per-app and
+per-host report, and writes it to memory_footprint.json.
+"""
+
+from dataclasses import dataclass
+
+from .inventory import GIB
+from .placement import FRONTEND_ELEMENTS
+
+# dunedaq::trigger::TriggerPrimitive
+TP_ELEMENT_BYTES = 48
+# Items of the queues that don't carry detector data: requests, decisions, pointers...
+DEFAULT_QUEUE_ITEM_BYTES = 64
+# Folly queues allocate their whole capacity when they are created
+PREALLOCATED_QUEUE_KINDS = ("FollySPSCQueue", "FollyMPMCQueue")
+# The daq_application process, its plugins and their own small buffers
+PROCESS_BYTES = 200 * 1024**2
+
+MEMORY_FOOTPRINT_FILE = 'memory_footprint.json'
+
+@dataclass
+class AppFootprint:
+    """Memory (bytes) an app allocates, by kind"""
+    name: str
+    host: str
+    latency_buffers: int = 0
+    queues: int = 0
+    felix_dma: int = 0
+    recording_buffers: int = 0
+    process: int = PROCESS_BYTES
+
+    @property
+    def total(self):
+        return self.latency_buffers + self.queues + self.felix_dma + self.recording_buffers + self.process
+
+_KINDS = ('latency_buffers', 'queues', 'felix_dma', 'recording_buffers', 'process')
+
+def _pod(conf):
+    return conf.pod() if hasattr(conf, 'pod') else (conf or {})
+
+def _element_bytes(module_name, frontend_type):
+    if module_name.startswith("tp_datahandler_"):
+        return TP_ELEMENT_BYTES
+    return FRONTEND_ELEMENTS[frontend_type][0]
+
+def estimate_footprint(the_system, frontend_type):
+    """{app name: AppFootprint} of the apps of `the_system`, whose readout uses `frontend_type`"""
+    footprints = {}
+    for app_name, app in the_system.apps.items():
+        footprint = AppFootprint(app_name, app.host)
+        for module in app.modulegraph.modules:
+            conf = _pod(module.conf)
+            if module.plugin == "DataLinkHandler":
+                latency_buffer = conf.get("latencybufferconf", {})
+                footprint.latency_buffers += latency_buffer.get("latency_buffer_size", 0) * _element_bytes(module.name, frontend_type)
+                request_handler = conf.get("requesthandlerconf", {})
+                if request_handler.get("enable_raw_recording"):
+                    footprint.recording_buffers += request_handler.get("stream_buffer_size", 0)
+            elif module.plugin == "FelixCardReader":
+                footprint.felix_dma += conf.get("dma_memory_size_gb", 0) * GIB
+            for connection in module.connections.values():
+                if getattr(connection, "queue_kind", None) not in PREALLOCATED_QUEUE_KINDS:
+                    continue
+                target, _, endpoint = connection.to.partition('.')
+                if endpoint == "raw_input" and (target.startswith("datahandler_") or target.startswith("tp_datahandler_")):
+                    item_bytes = _element_bytes(target, frontend_type)
+                else:
+                    item_bytes = DEFAULT_QUEUE_ITEM_BYTES
+                footprint.queues += connection.queue_capacity * item_bytes
+        footprints[app_name] = footprint
+    return footprints
+
+def host_totals(footprints):
+    """{host: bytes} of the apps of `footprints`, by host"""
+    totals = {}
+    for footprint in footprints.values():
+        totals[footprint.host] = totals.get(footprint.host, 0) + footprint.total
+    return totals
+
+def check_budgets(footprints, inventory):
+    """[problem] for the hosts of `inventory` whose apps need more than the host's memory"""
+    problems = []
+    for host, total in sorted(host_totals(footprints).items()):
+        if host not in inventory:
+            continue
+        budget = inventory[host].memory_gb * GIB
+        if total > budget:
+            apps = ", ".join(f"{footprint.name} {footprint.total/GIB:.1f} GiB" for footprint in footprints.values() if footprint.host == host)
+            problems.append(f"The apps on {host} need {total/GIB:.1f} GiB, more than its {inventory[host].memory_gb:g} GiB ({apps})")
+    return problems
+
+def format_report(footprints, inventory=None):
+    """A table of the footprint of each app and of each host, in GiB"""
+    header = f"{'app':10} {'host':16} {'LB':>7} {'queues':>7} {'DMA':>7} {'record':>7} {'process':>7} {'total':>7}"
+    lines = [header]
+    for footprint in footprints.values():
+        lines.append(f"{footprint.name:10} {footprint.host:16} " + " ".join(f"{getattr(footprint, kind)/GIB:7.2f}" for kind in _KINDS)
+                     + f" {footprint.total/GIB:7.2f}")
+    lines.append("")
+    for host, total in sorted(host_totals(footprints).items()):
+        line = f"{host:27} {total/GIB:7.2f} GiB"
+        if inventory is not None and host in inventory:
+            line += f" of {inventory[host].memory_gb:g} GiB ({total / (inventory[host].memory_gb * GIB):.0%})"
+        lines.append(line)
+    return "\n".join(lines)
+
+def as_dict(footprints, inventory=None):
+    """The report as JSON data (bytes), for memory_footprint.json"""
+    hosts = {}
+    for host, total in host_totals(footprints).items():
+        hosts[host] = {"total": total}
+        if inventory is not None and host in inventory:
+            hosts[host]["budget"] = int(inventory[host].memory_gb * GIB)
+    return {"app_footprints": {name: {**{kind: getattr(footprint, kind) for kind in _KINDS},
+                                      "host": footprint.host, "total": footprint.total}
+                               for name, footprint in footprints.items()},
+            "host_footprints": hosts}
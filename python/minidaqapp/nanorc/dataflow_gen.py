@@ -1,44 +1,17 @@
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('dfmodules/triggerrecordbuilder.jsonnet')
-moo.otypes.load_types('dfmodules/datawriter.jsonnet')
-moo.otypes.load_types('dfmodules/hdf5datastore.jsonnet')
-moo.otypes.load_types('dfmodules/tpsetwriter.jsonnet')
-moo.otypes.load_types('dfmodules/fragmentreceiver.jsonnet')
-moo.otypes.load_types('dfmodules/triggerdecisionreceiver.jsonnet')
-moo.otypes.load_types('nwqueueadapters/queuetonetwork.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networktoqueue.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectreceiver.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectsender.jsonnet')
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
-
-
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.dfmodules.triggerrecordbuilder as trb
-import dunedaq.dfmodules.datawriter as dw
-import dunedaq.dfmodules.hdf5datastore as hdf5ds
-import dunedaq.dfmodules.tpsetwriter as tpsw
-import dunedaq.dfmodules.fragmentreceiver as frcv
-import dunedaq.dfmodules.triggerdecisionreceiver as tdrcv
-import dunedaq.nwqueueadapters.networktoqueue as ntoq
-import dunedaq.nwqueueadapters.queuetonetwork as qton
-import dunedaq.nwqueueadapters.networkobjectreceiver as nor
-import dunedaq.nwqueueadapters.networkobjectsender as nos
-import dunedaq.networkmanager.nwmgr as nwmgr
+from ..schema_registry import schema_types
+
+rccmd = schema_types('rcif/cmd.jsonnet', __name__)
+app = schema_types('appfwk/app.jsonnet', __name__)
+trb = schema_types('dfmodules/triggerrecordbuilder.jsonnet', __name__)
+dw = schema_types('dfmodules/datawriter.jsonnet', __name__)
+hdf5ds = schema_types('dfmodules/hdf5datastore.jsonnet', __name__)
+tpsw = schema_types('dfmodules/tpsetwriter.jsonnet', __name__)
+frcv = schema_types('dfmodules/fragmentreceiver.jsonnet', __name__)
+tdrcv = schema_types('dfmodules/triggerdecisionreceiver.jsonnet', __name__)
+ntoq = schema_types('nwqueueadapters/networktoqueue.jsonnet', __name__)
+nor = schema_types('nwqueueadapters/networkobjectreceiver.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
 
@@ -51,7 +24,7 @@ QUEUE_POP_WAIT_MS = 100
 # CLOCK_SPEED_HZ = 50000000;
 
 def generate(NW_SPECS,
-        RU_CONFIG=[],
+        TOPOLOGY=None,
         HOSTIDX=0,
         RUN_NUMBER=333,
         OUTPUT_PATH=".",
@@ -98,7 +71,7 @@ def generate(NW_SPECS,
         mspec("datawriter", "DataWriter", [ app.QueueInfo(name="trigger_record_input_queue", inst="trigger_record_q", dir="input")]),
 
     ] + ([        
-        mspec(f"tpset_subscriber_{idx}", "NetworkToQueue", [app.QueueInfo(name="output", inst=f"tpsets_from_netq", dir="output")])  for idx in range(len(RU_CONFIG))
+        mspec(f"tpset_subscriber_{idx}", "NetworkToQueue", [app.QueueInfo(name="output", inst=f"tpsets_from_netq", dir="output")])  for idx in range(len(TOPOLOGY))
     ] if TPSET_WRITING_ENABLED else []) + ([
         mspec("tpswriter", "TPSetWriter", [app.QueueInfo(name="tpset_source", inst="tpsets_from_netq", dir="input")])
     ] if TPSET_WRITING_ENABLED else [])
@@ -106,9 +79,7 @@ def generate(NW_SPECS,
 
     cmd_data['init'] = app.Init(queues=queue_specs, modules=mod_specs, nwconnections=NW_SPECS)
 
-    total_link_count = 0
-    for ru in range(len(RU_CONFIG)):
-        total_link_count += RU_CONFIG[ru]["channel_count"]
+    total_link_count = TOPOLOGY.total_link_count
 
     cmd_data['conf'] = acmd([
                 ("trigdec_receiver", tdrcv.ConfParams(general_queue_timeout=QUEUE_POP_WAIT_MS,
@@ -117,11 +88,11 @@ def generate(NW_SPECS,
                 ("trb", trb.ConfParams( general_queue_timeout=QUEUE_POP_WAIT_MS,
                                         reply_connection_name = f"{PARTITION}.frags_{HOSTIDX}",
                                         map=trb.mapgeoidconnections([
-                                                trb.geoidinst(region=RU_CONFIG[ru]["region_id"], element=idx + RU_CONFIG[ru]["start_channel"], system=SYSTEM_TYPE, connection_name=f"{PARTITION}.datareq_{ru}") for ru in range(len(RU_CONFIG)) for idx in range(RU_CONFIG[ru]["channel_count"])
+                                                trb.geoidinst(region=ru.region_id, element=element, system=SYSTEM_TYPE, connection_name=f"{PARTITION}.datareq_{ru.index}") for ru, _, element in TOPOLOGY.links
                                         ] + ([
-                                            trb.geoidinst(region=RU_CONFIG[ru]["region_id"], element=idx + RU_CONFIG[ru]["start_channel"] + total_link_count, system=SYSTEM_TYPE, connection_name=f"{PARTITION}.datareq_{ru}") for ru in range(len(RU_CONFIG)) for idx in range(RU_CONFIG[ru]["channel_count"])
+                                            trb.geoidinst(region=ru.region_id, element=element + total_link_count, system=SYSTEM_TYPE, connection_name=f"{PARTITION}.datareq_{ru.index}") for ru, _, element in TOPOLOGY.links
                                         ] if SOFTWARE_TPG_ENABLED else []) + ([
-                                            trb.geoidinst(region=RU_CONFIG[ru]["region_id"], element=idx + RU_CONFIG[ru]["start_channel"], system="DataSelection", connection_name=f"{PARTITION}.ds_tp_datareq_0") for ru in range(len(RU_CONFIG)) for idx in range(RU_CONFIG[ru]["channel_count"])
+                                            trb.geoidinst(region=ru.region_id, element=element, system="DataSelection", connection_name=f"{PARTITION}.ds_tp_datareq_0") for ru, _, element in TOPOLOGY.links
 
                                         ] if SOFTWARE_TPG_ENABLED else [])
                                                               ) )),
@@ -166,7 +137,7 @@ def generate(NW_SPECS,
                     receiver_config=nor.Conf(name=f'{PARTITION}.tpsets_{idx}',
                                              subscriptions=["TPSets"])
                 ))
-                for idx in range(len(RU_CONFIG))
+                for idx in range(len(TOPOLOGY))
             ] + ([
                 ("tpswriter", tpsw.ConfParams(
                     max_file_size_bytes=1000000000,
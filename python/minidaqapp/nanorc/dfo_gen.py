@@ -1,25 +1,10 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
 import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('dfmodules/datafloworchestrator.jsonnet')
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
-
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
+from ..schema_registry import schema_types
 
-import dunedaq.dfmodules.datafloworchestrator as dfo
-import dunedaq.networkmanager.nwmgr as nwmgr
+rccmd = schema_types('rcif/cmd.jsonnet', __name__)
+app = schema_types('appfwk/app.jsonnet', __name__)
+dfo = schema_types('dfmodules/datafloworchestrator.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
 
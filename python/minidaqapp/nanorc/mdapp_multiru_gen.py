@@ -2,11 +2,11 @@ import json
 import os
 import math
 import sys
-import glob
-import rich.traceback
 from rich.console import Console
 from os.path import exists, join
 
+from ..topology import FelixLayout, build_topology
+from ..config_writer import ConfigWriter, JsonFormat, render_command_files
 
 CLOCK_SPEED_HZ = 50000000
 
@@ -15,17 +15,72 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
 console = Console()
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
+import click
 
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
-import dunedaq.networkmanager.nwmgr as nwmgr
+def load_system_types():
+    """
+    Load the network manager schema.
 
-import click
+    This is deliberately not done at module level, so that option
+    parsing, -h and the consistency checks in cli() don't pay for
+    loading any schemas.
+    """
+    from ..schema_registry import registry
+    nwmgr = registry.load('networkmanager/nwmgr.jsonnet', __name__)
+    return nwmgr
+
+BUILD_INFO_FILE = 'minidaqapp_build_info.txt'
+
+def find_build_info(mdapp_dir):
+    """
+    Return the path of the minidaqapp build info file, or None: it is
+    installed in one of the parent directories of the python package
+    (install/minidaqapp/ in a work area), or else in the minidaqapp
+    install directory of the work area in $DBT_AREA_ROOT
+    """
+    directory = mdapp_dir
+    while True:
+        candidate = join(directory, BUILD_INFO_FILE)
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    work_area = os.environ.get('DBT_AREA_ROOT')
+    if work_area:
+        candidate = join(work_area, 'install', 'minidaqapp', BUILD_INFO_FILE)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+def read_build_info(buildinfo_file):
+    """{key: value} from the "key: value" lines of a build info file"""
+    buildinfo = {}
+    with open(buildinfo_file, 'r') as f:
+        for line in f:
+            line_parse = line.split(':')
+            buildinfo[line_parse[0].strip()] = ':'.join(line_parse[1:]).strip()
+    return buildinfo
+
+def write_metadata_file(json_dir, timer):
+    """
+    Write mdapp_multiru_gen.info to json_dir: the command line, the
+    minidaqapp build info, the content hash of the configuration (the
+    sha256 of its manifest) and the timings of the generation stages
+    """
+    from ..config_writer import config_digest
+    mdapp_dir = os.path.dirname(os.path.abspath(__file__))
+    buildinfo_file = find_build_info(mdapp_dir)
+    mdapp_info = {
+        "command_line": ' '.join(sys.argv),
+        "mdapp_dir": mdapp_dir,
+        "build_info": read_build_info(buildinfo_file) if buildinfo_file else {},
+        "config_sha256": config_digest(json_dir),
+        "generation_timings": timer.summary()
+    }
+    with open(join(json_dir, 'mdapp_multiru_gen.info'), 'w') as f:
+        json.dump(mdapp_info, f, indent=4, sort_keys=True)
 
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.option('-p', '--partition-name', default="${USER}_test", help="Name of the partition to use, for ERS and OPMON")
@@ -95,6 +150,24 @@ import click
 @click.option('--op-env', default='swtest', help="Operational environment - used for raw data filename prefix and HDF5 Attribute inside the files")
 @click.option('--tpc-region-name-prefix', default='APA', help="Prefix to be used for the 'Region' Group name inside the HDF5 file")
 @click.option('--max-file-size', default=4*1024*1024*1024, help="The size threshold when raw data files are closed (in bytes)")
+@click.option('--felix-cards-per-ru', default=1, help="Number of FELIX cards read by each RU (RU n of a host reads cards n*N to n*N+N-1)")
+@click.option('--felix-logical-units', default=2, help="Number of logical units of each FELIX card, each read by its own FelixCardReader")
+@click.option('--felix-links-per-unit', type=int, default=None, help="Maximum number of links of a FELIX logical unit. Without it, the units take 5 links each and the last one takes the links beyond")
+@click.option('--felix-balance-links', is_flag=True, default=False, help="Spread the links of an RU evenly over all the logical units of its FELIX cards, rather than filling each logical unit in turn")
+@click.option('-j', '--jobs', default=1, help="Number of processes used to render the command data of the apps. The default of 1 does it all in this process")
+@click.option('--update', is_flag=True, default=False, help="Update the configuration in JSON_DIR if it already exists: only the files whose content changed are rewritten, and files that are no longer generated are removed")
+@click.option('--compact-json', is_flag=True, default=False, help="Write the JSON files without indentation, which makes them smaller and faster to write and read")
+@click.option('--gzip-json', is_flag=True, default=False, help="Gzip the JSON files (written as .json.gz, which nanorc can't read directly)")
+@click.option('--verify-json', is_flag=True, default=False, help="With --compact-json, --gzip-json or --msgpack-sidecar, check that every file has the same content as the indented JSON would, and read it back once written")
+@click.option('--bundle', is_flag=True, default=False, help="Write the whole configuration in a single bundle.json (gzipped with --gzip-json) rather than one file per app and command; expand it with python -m minidaqapp.bundle")
+@click.option('--share-identical-files', is_flag=True, default=False, help="Write the command data files that are identical in several apps (e.g. the no-op pause, resume, scrap and record) once, as data/shared_{hash}.json, and point the top-level command files to them")
+@click.option('--templated-conf', is_flag=True, default=False, help="Write the conf command of each app as shared templates plus per-module overrides, which is much smaller with many links; expand it with python -m minidaqapp.conf_templates before running it")
+@click.option('--msgpack-sidecar', is_flag=True, default=False, help="Also write the command data of each app as msgpack, in a data/{app}_{command}.msgpack sidecar that minidaqapp.sidecar.load_command_data() loads faster than the JSON (needs the msgpack module)")
+@click.option('--config-cache', type=click.Choice(['off', 'copy', 'link']), default='off', help="Look the configuration up in the configuration cache (see minidaqapp.config_cache) and copy or hard-link it from there if it is cached; otherwise generate it and store it in the cache")
+@click.option('--profile', is_flag=True, default=False, help="Print how long each stage of the generation took")
+@click.option('--profile-stats', type=click.Path(), default=None, help="Also save cProfile statistics of the generation to this file (implies --profile)")
+@click.option('--profile-memory', type=click.Path(), default=None, help="Also save a tracemalloc snapshot taken at the end of the generation to this file (implies --profile)")
+@click.option('--debug', default=False, is_flag=True, help="Switch to get more printout, including the schema loading times")
 @click.argument('json_dir', type=click.Path())
 
 def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowdown_factor, run_number, trigger_rate_hz, trigger_window_before_ticks, trigger_window_after_ticks,
@@ -104,60 +177,114 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
         ttcm_s1, ttcm_s2, trigger_activity_plugin, trigger_activity_config, trigger_candidate_plugin, trigger_candidate_config,
         enable_raw_recording, raw_recording_output_dir, frontend_type, opmon_impl, enable_dqm, ers_impl, dqm_impl, pocket_url, enable_software_tpg, enable_tpset_writing, use_fake_data_producers, dqm_cmap,
         dqm_rawdisplay_params, dqm_meanrms_params, dqm_fourier_params, dqm_fouriersum_params,
-        op_env, tpc_region_name_prefix, max_file_size, json_dir):
+        op_env, tpc_region_name_prefix, max_file_size, felix_cards_per_ru, felix_logical_units, felix_links_per_unit, felix_balance_links, jobs, update, compact_json, gzip_json, verify_json, bundle, share_identical_files, templated_conf, msgpack_sidecar, config_cache, profile, profile_stats, profile_memory, debug, json_dir):
 
     """
       JSON_DIR: Json file output folder
     """
 
-    if exists(json_dir):
-        raise RuntimeError(f"Directory {json_dir} already exists")
+    if exists(json_dir) and not update:
+        raise RuntimeError(f"Directory {json_dir} already exists (use --update to update it)")
 
-    console.log("Loading dataflow config generator")
-    from . import dataflow_gen
-    if enable_dqm:
-        console.log("Loading dqm config generator")
-        from . import dqm_gen
-    console.log("Loading readout config generator")
-    from . import readout_gen
-    console.log("Loading trigger config generator")
-    from . import trigger_gen
-    console.log("Loading dfo config generator")
-    from . import dfo_gen
-    console.log("Loading hsi config generator")
-    from . import hsi_gen
-    console.log("Loading fake hsi config generator")
-    from . import fake_hsi_gen
-    console.log("Loading timing hardware config generator")
-    from . import thi_gen
-    console.log(f"Generating configs for hosts trigger={host_trigger} dataflow={host_df} readout={host_ru} hsi={host_hsi} dqm={host_ru}")
+    if verify_json and not (compact_json or gzip_json or msgpack_sidecar):
+        raise click.UsageError("--verify-json can only be used with --compact-json, --gzip-json or --msgpack-sidecar")
 
-    total_number_of_data_producers = 0
+    if msgpack_sidecar:
+        if bundle:
+            raise click.UsageError("--msgpack-sidecar can't be used with --bundle")
+        from ..sidecar import msgpack
+        if msgpack is None:
+            raise click.UsageError("--msgpack-sidecar needs the msgpack module (pip install msgpack)")
 
-    if use_ssp:
-        total_number_of_data_producers = number_of_data_producers * len(host_ru)
-        console.log(f"Will setup {number_of_data_producers} SSP channels per host, for a total of {total_number_of_data_producers}")
-    else:
-        total_number_of_data_producers = number_of_data_producers * len(host_ru)
-        console.log(f"Will setup {number_of_data_producers} TPC channels per host, for a total of {total_number_of_data_producers}")
+    if config_cache != 'off' and update:
+        raise click.UsageError("--config-cache can't be used with --update")
 
     if enable_software_tpg and frontend_type != 'wib':
-        raise Exception("Software TPG is only available for the wib at the moment!")
+        raise click.UsageError("Software TPG is only available for the wib at the moment!")
 
     if enable_software_tpg and use_fake_data_producers:
-        raise Exception("Fake data producers don't support software tpg")
+        raise click.UsageError("Fake data producers don't support software tpg")
 
     if use_fake_data_producers and enable_dqm:
-        raise Exception("DQM can't be used with fake data producers")
+        raise click.UsageError("DQM can't be used with fake data producers")
 
     if enable_tpset_writing and not enable_software_tpg:
-        raise Exception("TPSet writing can only be used when software TPG is enabled")
+        raise click.UsageError("TPSet writing can only be used when software TPG is enabled")
 
-    if token_count > 0:
-        trigemu_token_count = token_count
+    if jobs < 1:
+        raise click.UsageError("--jobs should be at least 1!")
 
     if (len(region_id) != len(host_ru)) and (len(region_id) != 1):
-        raise Exception("--region-id should be specified either once only or once for each --host-ru!")
+        raise click.UsageError("--region-id should be specified either once only or once for each --host-ru!")
+
+    felix_layout = FelixLayout(cards_per_ru=felix_cards_per_ru, logical_units=felix_logical_units,
+                               links_per_unit=felix_links_per_unit, balance=felix_balance_links)
+    if use_felix:
+        try:
+            felix_layout.check(number_of_data_producers)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+
+    from ..profiling import StageTimer
+    # The stage timings are always collected, for the metadata file
+    profile = profile or bool(profile_stats) or bool(profile_memory)
+    timer = StageTimer(enabled=True, pstats_file=profile_stats, tracemalloc_file=profile_memory)
+    timer.start()
+
+    cache = None
+    if config_cache != 'off':
+        from ..config_cache import ConfigCache, config_key
+        cache = ConfigCache.open()
+        if cache is None:
+            console.log("The configuration cache is disabled, generating without it")
+    if cache is not None:
+        params = click.get_current_context().params
+        with timer.stage("config cache lookup"):
+            cache_key = config_key('nanorc', params)
+            cached = cache.fetch(cache_key, json_dir, link=config_cache == 'link')
+        if cached:
+            console.log(f"Configuration {cache_key[:16]} taken from the cache in {cache.path}")
+            with timer.stage("write metadata file"):
+                write_metadata_file(json_dir, timer)
+            timer.finish()
+            if profile:
+                console.log(f"Generation profile:\n{timer.format_report()}")
+            console.log(f"MDAapp config generated in {json_dir}")
+            return
+
+    nwmgr = timer.timed(load_system_types)()
+
+    with timer.stage("import generators"):
+        console.log("Loading dataflow config generator")
+        from . import dataflow_gen
+        if enable_dqm:
+            console.log("Loading dqm config generator")
+            from . import dqm_gen
+        console.log("Loading readout config generator")
+        from . import readout_gen
+        console.log("Loading trigger config generator")
+        from . import trigger_gen
+        console.log("Loading dfo config generator")
+        from . import dfo_gen
+        console.log("Loading hsi config generator")
+        from . import hsi_gen
+        console.log("Loading fake hsi config generator")
+        from . import fake_hsi_gen
+        console.log("Loading timing hardware config generator")
+        from . import thi_gen
+    console.log(f"Generating configs for hosts trigger={host_trigger} dataflow={host_df} readout={host_ru} hsi={host_hsi} dqm={host_ru}")
+
+    total_number_of_data_producers = 0
+
+    if use_ssp:
+        total_number_of_data_producers = number_of_data_producers * len(host_ru)
+        console.log(f"Will setup {number_of_data_producers} SSP channels per host, for a total of {total_number_of_data_producers}")
+    else:
+        total_number_of_data_producers = number_of_data_producers * len(host_ru)
+        console.log(f"Will setup {number_of_data_producers} TPC channels per host, for a total of {total_number_of_data_producers}")
+
+    if token_count > 0:
+        trigemu_token_count = token_count
 
     if frontend_type == 'wib' or frontend_type == 'wib2':
         system_type = 'TPC'
@@ -216,11 +343,7 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
         nw_specs.append(nwmgr.Connection(name=f"{partition_name}.ds_tp_datareq_0",topics=[],   address="tcp://{host_trigger}:" + f"{port}"))
         port = port + 1
 
-    host_id_dict = {}
-    ru_configs = []
-    ru_channel_counts = {}
-    for region in region_id: ru_channel_counts[region] = 0
-    regionidx = 0
+    topology = build_topology(host_ru, region_id, number_of_data_producers)
 
     for hostidx in range(len(host_ru)):
         if enable_software_tpg:
@@ -240,21 +363,11 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
         nw_specs.append(nwmgr.Connection(name=f"{partition_name}.timesync_{hostidx}", topics=["Timesync"], address= "tcp://{host_ru" + f"{hostidx}" + "}:" + f"{port}"))
         port = port + 1
 
-        cardid = 0
-        if host_ru[hostidx] in host_id_dict:
-            host_id_dict[host_ru[hostidx]] = host_id_dict[host_ru[hostidx]] + 1
-            cardid = host_id_dict[host_ru[hostidx]]
-        else:
-            host_id_dict[host_ru[hostidx]] = 0
-        ru_configs.append( {"host": host_ru[hostidx], "card_id": cardid, "region_id": region_id[regionidx], "start_channel": ru_channel_counts[region_id[regionidx]], "channel_count": number_of_data_producers} )
-        ru_channel_counts[region_id[regionidx]] += number_of_data_producers
-        if len(region_id) != 1: regionidx = regionidx + 1
-    
     if control_timing_hw:
         timing_cmd_network_endpoints = set()
         if use_hsi_hw:
             timing_cmd_network_endpoints.add(partition_name + '.hsicmds')
-        cmd_data_thi = thi_gen.generate(RUN_NUMBER = run_number,
+        cmd_data_thi = timer.timed(thi_gen.generate)(RUN_NUMBER = run_number,
             NW_SPECS=nw_specs,
             TIMING_CMD_NETWORK_ENDPOINTS=timing_cmd_network_endpoints,
             CONNECTIONS_FILE=timing_hw_connections_file,
@@ -263,7 +376,7 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
         console.log("thi cmd data:", cmd_data_thi)
 
     if use_hsi_hw:
-        cmd_data_hsi = hsi_gen.generate(nw_specs,
+        cmd_data_hsi = timer.timed(hsi_gen.generate)(nw_specs,
             RUN_NUMBER = run_number,
             CLOCK_SPEED_HZ = CLOCK_SPEED_HZ,
             TRIGGER_RATE_HZ = trigger_rate_hz,
@@ -279,7 +392,7 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
             HSI_SOURCE=hsi_source,
             PARTITION=partition_name)
     else:
-        cmd_data_hsi = fake_hsi_gen.generate(nw_specs,
+        cmd_data_hsi = timer.timed(fake_hsi_gen.generate)(nw_specs,
             RUN_NUMBER = run_number,
             CLOCK_SPEED_HZ = CLOCK_SPEED_HZ,
             DATA_RATE_SLOWDOWN_FACTOR = data_rate_slowdown_factor,
@@ -292,9 +405,9 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
 
     console.log("hsi cmd data:", cmd_data_hsi)
 
-    cmd_data_trigger = trigger_gen.generate(nw_specs,
+    cmd_data_trigger = timer.timed(trigger_gen.generate)(nw_specs,
         SOFTWARE_TPG_ENABLED = enable_software_tpg,
-        RU_CONFIG = ru_configs,
+        TOPOLOGY = topology,
         ACTIVITY_PLUGIN = trigger_activity_plugin,
         ACTIVITY_CONFIG = eval(trigger_activity_config),
         CANDIDATE_PLUGIN = trigger_candidate_plugin,
@@ -309,7 +422,7 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
     console.log("trigger cmd data:", cmd_data_trigger)
 
 
-    cmd_data_dfo = dfo_gen.generate(nw_specs,
+    cmd_data_dfo = timer.timed(dfo_gen.generate)(nw_specs,
         TOKEN_COUNT=trigemu_token_count,
         DF_COUNT=len(host_df),
         PARTITION=partition_name)
@@ -318,8 +431,8 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
 
 
 
-    cmd_data_dataflow = [ dataflow_gen.generate(nw_specs,
-        RU_CONFIG = ru_configs,
+    cmd_data_dataflow = [ timer.timed(dataflow_gen.generate)(nw_specs,
+        TOPOLOGY = topology,
         HOSTIDX = hostidx,
         RUN_NUMBER = run_number,
         OUTPUT_PATH = output_path,
@@ -332,8 +445,8 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
         MAX_FILE_SIZE = max_file_size) for hostidx in range(len(host_df)) ]
     console.log("dataflow cmd data:", cmd_data_dataflow)
 
-    cmd_data_readout = [ readout_gen.generate(nw_specs,
-            RU_CONFIG = ru_configs,
+    cmd_data_readout = [ timer.timed(readout_gen.generate)(nw_specs,
+            TOPOLOGY = topology,
             EMULATOR_MODE = emulator_mode,
             DATA_RATE_SLOWDOWN_FACTOR = data_rate_slowdown_factor,
             RUN_NUMBER = run_number,
@@ -349,12 +462,13 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
             SOFTWARE_TPG_ENABLED = enable_software_tpg,
             USE_FAKE_DATA_PRODUCERS = use_fake_data_producers,
             PARTITION=partition_name,
-            LATENCY_BUFFER_SIZE=latency_buffer_size) for hostidx in range(len(host_ru))]
+            LATENCY_BUFFER_SIZE=latency_buffer_size,
+            FELIX_LAYOUT=felix_layout) for hostidx in range(len(host_ru))]
     console.log("readout cmd data:", cmd_data_readout)
 
     if enable_dqm:
-        cmd_data_dqm = [ dqm_gen.generate(nw_specs,
-                RU_CONFIG = ru_configs,
+        cmd_data_dqm = [ timer.timed(dqm_gen.generate)(nw_specs,
+                TOPOLOGY = topology,
                 EMULATOR_MODE = emulator_mode,
                 RUN_NUMBER = run_number,
                 DATA_FILE = data_file,
@@ -373,8 +487,9 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
         console.log("dqm cmd data:", cmd_data_dqm)
 
 
-    data_dir = join(json_dir, 'data')
-    os.makedirs(data_dir)
+    json_format = JsonFormat(compact=compact_json, gzip=gzip_json, verify=verify_json, bundle=bundle, share_identical=share_identical_files, templated_conf=templated_conf, sidecar=msgpack_sidecar)
+    writer = ConfigWriter(json_dir, update=update, json_format=json_format)
+    data_dir = writer.data_dir
 
     app_thi="thi"
     app_hsi = "hsi"
@@ -407,11 +522,13 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
         apps.append(app_thi)
         cmds_data.append(cmd_data_thi)
 
-    for app,data in zip(apps, cmds_data):
-        console.log(f"Generating {app} command data json files")
-        for c in cmd_set:
-            with open(f'{join(data_dir, app)}_{c}.json', 'w') as f:
-                json.dump(data[c].pod(), f, indent=4, sort_keys=True)
+    console.log(f"Generating command data json files for {len(apps)} apps")
+    with timer.stage("render_command_files"):
+        app_command_files = render_command_files(range(len(apps)),
+                                                 lambda idx: {c: cmds_data[idx][c] for c in cmd_set},
+                                                 jobs, json_format)
+    for app,(_, command_files) in zip(apps, app_command_files):
+        writer.write_app_contents(app, command_files)
 
 
     console.log(f"Generating top-level command json files")
@@ -423,163 +540,163 @@ def cli(partition_name, number_of_data_producers, emulator_mode, data_rate_slowd
         resume_order = [app_hsi, app_trigger]
 
     for c in cmd_set:
-        with open(join(json_dir,f'{c}.json'), 'w') as f:
-            cfg = {
-                "apps": { app: f'data/{app}_{c}' for app in apps }
-            }
-            if c in ['conf']:
-                conf_order = start_order
-                if control_timing_hw:
-                    conf_order = [app_thi] + conf_order
-                cfg[f'order'] = conf_order
-            elif c == 'start':
-                cfg['order'] = start_order
-                if control_timing_hw:
-                    del cfg['apps'][app_thi]
-            elif c == 'stop':
-                cfg['order'] = start_order[::-1]
-                if control_timing_hw:
-                    del cfg['apps'][app_thi]
-            elif c in ('resume', 'pause'):
-                for dfapp in app_df:
-                    del cfg['apps'][dfapp]
-                if control_timing_hw:
-                    del cfg['apps'][app_thi]
-                elif use_hsi_hw:
-                    del cfg['apps'][app_hsi]
-                for ruapp in app_ru:
-                    del cfg['apps'][ruapp]
-                if enable_dqm:
-                    for dqmapp in app_dqm:
-                        del cfg['apps'][dqmapp]
-                del cfg['apps'][app_dfo]
-                if c == 'resume':
-                    cfg['order'] = resume_order
-                elif c == 'pause':
-                    cfg['order'] = resume_order[::-1]
-
-            json.dump(cfg, f, indent=4, sort_keys=True)
-
-
-    console.log(f"Generating boot json file")
-    with open(join(json_dir,'boot.json'), 'w') as f:
-        daq_app_specs = {
-            "daq_application" : {
-                "comment": "Application profile using  PATH variables (lower start time)",
-                "env":{
-                    "CET_PLUGIN_PATH": "getenv",
-                    "DUNEDAQ_SHARE_PATH": "getenv",
-                    "TIMING_SHARE": "getenv",
-                    "LD_LIBRARY_PATH": "getenv",
-                    "PATH": "getenv",
-                    "DETCHANNELMAPS_SHARE": "getenv"
-                },
-                "cmd": ["CMD_FAC=rest://localhost:${APP_PORT}",
-                    "INFO_SVC=" + info_svc_uri,
-                    "cd ${APP_WD}",
-                    "daq_application --name ${APP_NAME} -c ${CMD_FAC} -i ${INFO_SVC}"]
-            }
+        cfg = {
+            "apps": { app: f'data/{app}_{c}' for app in apps }
         }
+        if c in ['conf']:
+            conf_order = start_order
+            if control_timing_hw:
+                conf_order = [app_thi] + conf_order
+            cfg[f'order'] = conf_order
+        elif c == 'start':
+            cfg['order'] = start_order
+            if control_timing_hw:
+                del cfg['apps'][app_thi]
+        elif c == 'stop':
+            cfg['order'] = start_order[::-1]
+            if control_timing_hw:
+                del cfg['apps'][app_thi]
+        elif c in ('resume', 'pause'):
+            for dfapp in app_df:
+                del cfg['apps'][dfapp]
+            if control_timing_hw:
+                del cfg['apps'][app_thi]
+            elif use_hsi_hw:
+                del cfg['apps'][app_hsi]
+            for ruapp in app_ru:
+                del cfg['apps'][ruapp]
+            if enable_dqm:
+                for dqmapp in app_dqm:
+                    del cfg['apps'][dqmapp]
+            del cfg['apps'][app_dfo]
+            if c == 'resume':
+                cfg['order'] = resume_order
+            elif c == 'pause':
+                cfg['order'] = resume_order[::-1]
+
+        writer.write_file(f'{c}.json', cfg)
 
-        if not disable_trace:
-            daq_app_specs["daq_application"]["env"]["TRACE_FILE"] = "getenv:/tmp/trace_buffer_${HOSTNAME}_${USER}"
 
-        cfg = {
-            "env" : {
-                "DUNEDAQ_ERS_VERBOSITY_LEVEL": "getenv:1",
-                "DUNEDAQ_PARTITION": partition_name,
-                "DUNEDAQ_ERS_INFO": ers_info,
-                "DUNEDAQ_ERS_WARNING": ers_warning,
-                "DUNEDAQ_ERS_ERROR": ers_error,
-                "DUNEDAQ_ERS_FATAL": ers_fatal,
-                "DUNEDAQ_ERS_DEBUG_LEVEL": "getenv:-1",
+    console.log(f"Generating boot json file")
+    daq_app_specs = {
+        "daq_application" : {
+            "comment": "Application profile using  PATH variables (lower start time)",
+            "env":{
+                "CET_PLUGIN_PATH": "getenv",
+                "DUNEDAQ_SHARE_PATH": "getenv",
+                "TIMING_SHARE": "getenv",
+                "LD_LIBRARY_PATH": "getenv",
+                "PATH": "getenv",
+                "DETCHANNELMAPS_SHARE": "getenv"
             },
-            "hosts": {
-                "host_trigger": host_trigger,
-                "host_hsi": host_hsi,
-                "host_dfo": host_dfo,
+            "cmd": ["CMD_FAC=rest://localhost:${APP_PORT}",
+                "INFO_SVC=" + info_svc_uri,
+                "cd ${APP_WD}",
+                "daq_application --name ${APP_NAME} -c ${CMD_FAC} -i ${INFO_SVC}"]
+        }
+    }
+
+    if not disable_trace:
+        daq_app_specs["daq_application"]["env"]["TRACE_FILE"] = "getenv:/tmp/trace_buffer_${HOSTNAME}_${USER}"
+
+    cfg = {
+        "env" : {
+            "DUNEDAQ_ERS_VERBOSITY_LEVEL": "getenv:1",
+            "DUNEDAQ_PARTITION": partition_name,
+            "DUNEDAQ_ERS_INFO": ers_info,
+            "DUNEDAQ_ERS_WARNING": ers_warning,
+            "DUNEDAQ_ERS_ERROR": ers_error,
+            "DUNEDAQ_ERS_FATAL": ers_fatal,
+            "DUNEDAQ_ERS_DEBUG_LEVEL": "getenv:-1",
+        },
+        "hosts": {
+            "host_trigger": host_trigger,
+            "host_hsi": host_hsi,
+            "host_dfo": host_dfo,
+        },
+        "apps" : {
+            app_hsi: {
+                "exec": "daq_application",
+                "host": "host_hsi",
+                "port": 3332
             },
-            "apps" : {
-                app_hsi: {
-                    "exec": "daq_application",
-                    "host": "host_hsi",
-                    "port": 3332
-                },
-                app_trigger : {
-                    "exec": "daq_application",
-                    "host": "host_trigger",
-                    "port": 3333
-                },
-                app_dfo : {
-                    "exec": "daq_application",
-                    "host": "host_dfo",
-                    "port": 3334
-                },
+            app_trigger : {
+                "exec": "daq_application",
+                "host": "host_trigger",
+                "port": 3333
             },
-            "response_listener": {
-                "port": 56789
+            app_dfo : {
+                "exec": "daq_application",
+                "host": "host_dfo",
+                "port": 3334
             },
-            "exec": daq_app_specs
-        }
+        },
+        "response_listener": {
+            "port": 56789
+        },
+        "exec": daq_app_specs
+    }
 
-        if use_kafka:
-            cfg["env"]["DUNEDAQ_ERS_STREAM_LIBS"] = "erskafka"
+    if use_kafka:
+        cfg["env"]["DUNEDAQ_ERS_STREAM_LIBS"] = "erskafka"
 
-        appport = 3335
-        for hostidx in range(len(host_df)):
-            cfg["hosts"][f"host_df{hostidx}"] = host_df[hostidx]
-            cfg["apps"][app_df[hostidx]] = {
-                    "exec": "daq_application",
-                    "host": f"host_df{hostidx}",
-                    "port": appport }
-            appport = appport + 1
+    appport = 3335
+    for hostidx in range(len(host_df)):
+        cfg["hosts"][f"host_df{hostidx}"] = host_df[hostidx]
+        cfg["apps"][app_df[hostidx]] = {
+                "exec": "daq_application",
+                "host": f"host_df{hostidx}",
+                "port": appport }
+        appport = appport + 1
 
+    for hostidx in range(len(host_ru)):
+        cfg["hosts"][f"host_ru{hostidx}"] = host_ru[hostidx]
+        cfg["apps"][app_ru[hostidx]] = {
+                "exec": "daq_application",
+                "host": f"host_ru{hostidx}",
+                "port": appport }
+        appport = appport + 1
+    if enable_dqm:
         for hostidx in range(len(host_ru)):
-            cfg["hosts"][f"host_ru{hostidx}"] = host_ru[hostidx]
-            cfg["apps"][app_ru[hostidx]] = {
+            cfg["hosts"][f"host_dqm{hostidx}"] = host_ru[hostidx]
+            cfg["apps"][app_dqm[hostidx]] = {
                     "exec": "daq_application",
-                    "host": f"host_ru{hostidx}",
+                    "host": f"host_dqm{hostidx}",
                     "port": appport }
             appport = appport + 1
-        if enable_dqm:
-            for hostidx in range(len(host_ru)):
-                cfg["hosts"][f"host_dqm{hostidx}"] = host_ru[hostidx]
-                cfg["apps"][app_dqm[hostidx]] = {
-                        "exec": "daq_application",
-                        "host": f"host_dqm{hostidx}",
-                        "port": appport }
-                appport = appport + 1
-        
-        if control_timing_hw:
-            cfg["hosts"][f"host_timing_hw"] = host_timing_hw
-            cfg["apps"][app_thi] = {
-                    "exec": "daq_application",
-                    "host": "host_timing_hw",
-                    "port": appport + len(host_ru) }
+    
+    if control_timing_hw:
+        cfg["hosts"][f"host_timing_hw"] = host_timing_hw
+        cfg["apps"][app_thi] = {
+                "exec": "daq_application",
+                "host": "host_timing_hw",
+                "port": appport + len(host_ru) }
 
-        json.dump(cfg, f, indent=4, sort_keys=True)
+    writer.write_file('boot.json', cfg)
+
+    with timer.stage("write files"):
+        delta = writer.finish()
+    if update:
+        console.log(f"Updated {json_dir}: {delta}")
+        if debug and (delta.added or delta.changed or delta.removed):
+            console.log(delta.details())
 
     console.log("Generating metadata file")
-    with open(join(json_dir, 'mdapp_multiru_gen.info'), 'w') as f:
-        mdapp_dir = os.path.dirname(os.path.abspath(__file__))
-        buildinfo_files = glob.glob('**/minidaqapp_build_info.txt', recursive=True)
-        buildinfo = {}
-        for buildinfo_file in buildinfo_files:
-            if(os.path.dirname(os.path.abspath(buildinfo_file)) in mdapp_dir):
-                with open(buildinfo_file, 'r') as ff:
-                    line = ff.readline()
-                    while line: 
-                        line_parse = line.split(':')
-                        buildinfo[line_parse[0].strip()]=':'.join(line_parse[1:]).strip()
-                        line = ff.readline()
-                    
-                break
-        mdapp_info = {
-            "command_line": ' '.join(sys.argv),
-            "mdapp_dir": mdapp_dir,
-            "build_info": buildinfo
-        }
-        json.dump(mdapp_info, f, indent=4, sort_keys=True)
+    with timer.stage("write metadata file"):
+        write_metadata_file(json_dir, timer)
+
+    if cache is not None:
+        with timer.stage("config cache store"):
+            cache.store(cache_key, json_dir, 'nanorc', params, link=config_cache == 'link', exclude=['mdapp_multiru_gen.info'])
+
+    timer.finish()
+
+    if debug:
+        from ..schema_registry import registry
+        console.log(f"Schema loading:\n{registry.format_report()}")
+
+    if profile:
+        console.log(f"Generation profile:\n{timer.format_report()}")
 
     console.log(f"MDAapp config generated in {json_dir}")
 
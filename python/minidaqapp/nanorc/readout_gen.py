@@ -1,48 +1,23 @@
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('nwqueueadapters/queuetonetwork.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networktoqueue.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectreceiver.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectsender.jsonnet')
-moo.otypes.load_types('flxlibs/felixcardreader.jsonnet')
-moo.otypes.load_types('readoutlibs/sourceemulatorconfig.jsonnet')
-moo.otypes.load_types('readoutlibs/readoutconfig.jsonnet')
-moo.otypes.load_types('lbrulibs/pacmancardreader.jsonnet')
-moo.otypes.load_types('dfmodules/fakedataprod.jsonnet')
-moo.otypes.load_types('dfmodules/requestreceiver.jsonnet')
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
-
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.nwqueueadapters.networktoqueue as ntoq
-import dunedaq.nwqueueadapters.queuetonetwork as qton
-import dunedaq.nwqueueadapters.networkobjectreceiver as nor
-import dunedaq.nwqueueadapters.networkobjectsender as nos
-import dunedaq.readoutlibs.sourceemulatorconfig as sec
-import dunedaq.flxlibs.felixcardreader as flxcr
-import dunedaq.readoutlibs.readoutconfig as rconf
-import dunedaq.lbrulibs.pacmancardreader as pcr
-import dunedaq.dfmodules.triggerrecordbuilder as trb
-import dunedaq.dfmodules.fakedataprod as fdp
-import dunedaq.dfmodules.requestreceiver as rrcv
-import dunedaq.networkmanager.nwmgr as nwmgr
+from ..schema_registry import schema_types
+
+rccmd = schema_types('rcif/cmd.jsonnet', __name__)
+app = schema_types('appfwk/app.jsonnet', __name__)
+qton = schema_types('nwqueueadapters/queuetonetwork.jsonnet', __name__)
+nos = schema_types('nwqueueadapters/networkobjectsender.jsonnet', __name__)
+sec = schema_types('readoutlibs/sourceemulatorconfig.jsonnet', __name__)
+flxcr = schema_types('flxlibs/felixcardreader.jsonnet', __name__)
+rconf = schema_types('readoutlibs/readoutconfig.jsonnet', __name__)
+pcr = schema_types('lbrulibs/pacmancardreader.jsonnet', __name__)
+fdp = schema_types('dfmodules/fakedataprod.jsonnet', __name__)
+rrcv = schema_types('dfmodules/requestreceiver.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
 from os import path
 
+from ..topology import FelixLayout
+
 import json
 import math
 from pprint import pprint
@@ -53,7 +28,7 @@ QUEUE_POP_WAIT_MS = 100
 
 def generate(
         NW_SPECS,
-        RU_CONFIG=[],
+        TOPOLOGY=None,
         EMULATOR_MODE=False,
         DATA_RATE_SLOWDOWN_FACTOR=1,
         RUN_NUMBER=333,
@@ -69,8 +44,14 @@ def generate(
         SOFTWARE_TPG_ENABLED=False,
         USE_FAKE_DATA_PRODUCERS=False,
         PARTITION="UNKNOWN",
-        LATENCY_BUFFER_SIZE=499968):
-    """Generate the json configuration for the readout and DF process"""
+        LATENCY_BUFFER_SIZE=499968,
+        FELIX_LAYOUT=None):
+    """
+    Generate the json configuration for the readout and DF process.
+
+    FELIX_LAYOUT (a topology.FelixLayout) spreads the links over the card
+    readers
+    """
 
     cmd_data = {}
 
@@ -80,8 +61,10 @@ def generate(
 
     RATE_KHZ = CLOCK_SPEED_HZ / (25 * 12 * DATA_RATE_SLOWDOWN_FACTOR * 1000)
 
-    MIN_LINK = RU_CONFIG[RUIDX]["start_channel"]
-    MAX_LINK = MIN_LINK + RU_CONFIG[RUIDX]["channel_count"]
+    this_ru = TOPOLOGY[RUIDX]
+    MIN_LINK = this_ru.start_channel
+    MAX_LINK = MIN_LINK + this_ru.channel_count
+    felix_readers = (FELIX_LAYOUT or FelixLayout()).readers(this_ru) if FLX_INPUT else []
     # Define modules and queues
     queue_bare_specs = [
             app.QueueSpec(inst=f"data_requests_{idx}", kind='FollySPSCQueue', capacity=100)
@@ -176,16 +159,10 @@ def generate(
 
     if not USE_FAKE_DATA_PRODUCERS:
         if FLX_INPUT:
-            mod_specs.append(mspec("flxcard_0", "FelixCardReader", [
-                            app.QueueInfo(name=f"output_{idx}", inst=f"{FRONTEND_TYPE}_link_{idx}", dir="output")
-                                for idx in range(MIN_LINK, MIN_LINK + min(5, RU_CONFIG[RUIDX]["channel_count"]))
-                            ] + [
-                            app.QueueInfo(name="errored_chunks", inst="errored_chunks_q", dir="output")
-                            ]))
-            if RU_CONFIG[RUIDX]["channel_count"] > 5 :
-                mod_specs.append(mspec("flxcard_1", "FelixCardReader", [
+            for reader in felix_readers:
+                mod_specs.append(mspec(reader.name, "FelixCardReader", [
                                 app.QueueInfo(name=f"output_{idx}", inst=f"{FRONTEND_TYPE}_link_{idx}", dir="output")
-                                    for idx in range(MIN_LINK + 5, MAX_LINK)
+                                    for idx in reader.links
                                 ] + [
                                 app.QueueInfo(name="errored_chunks", inst="errored_chunks_q", dir="output")
                                 ]))
@@ -209,13 +186,11 @@ def generate(
 
     cmd_data['init'] = app.Init(queues=queue_specs, modules=mod_specs, nwconnections=NW_SPECS)
 
-    total_link_count = 0
-    for ru in range(len(RU_CONFIG)):
-        total_link_count += RU_CONFIG[ru]["channel_count"]
+    total_link_count = TOPOLOGY.total_link_count
 
     conf_list = [("fake_source",sec.Conf(
                             link_confs=[sec.LinkConfiguration(
-                            geoid=sec.GeoID(system=SYSTEM_TYPE, region=RU_CONFIG[RUIDX]["region_id"], element=idx),
+                            geoid=sec.GeoID(system=SYSTEM_TYPE, region=this_ru.region_id, element=idx),
                                 slowdown=DATA_RATE_SLOWDOWN_FACTOR,
                                 queue_name=f"output_{idx}",
                                 data_filename = DATA_FILE,
@@ -225,37 +200,31 @@ def generate(
                             queue_timeout_ms = QUEUE_POP_WAIT_MS)),
                 ("pacman_source",pcr.Conf(
                                           link_confs=[pcr.LinkConfiguration(
-                                           geoid=pcr.GeoID(system=SYSTEM_TYPE, region=RU_CONFIG[RUIDX]["region_id"], element=idx),
+                                           geoid=pcr.GeoID(system=SYSTEM_TYPE, region=this_ru.region_id, element=idx),
                                            ) for idx in range(MIN_LINK,MAX_LINK)],
                                            zmq_receiver_timeout = 10000)),
-                ("flxcard_0",flxcr.Conf(card_id=RU_CONFIG[RUIDX]["card_id"],
-                            logical_unit=0,
-                            dma_id=0,
-                            chunk_trailer_size= 32,
-                            dma_block_size_kb= 4,
-                            dma_memory_size_gb= 4,
-                            numa_id=0,
-                            num_links=min(5,RU_CONFIG[RUIDX]["channel_count"]))),
-                ("flxcard_1",flxcr.Conf(card_id=RU_CONFIG[RUIDX]["card_id"],
-                            logical_unit=1,
+            ] + [
+                (reader.name,flxcr.Conf(card_id=reader.card_id,
+                            logical_unit=reader.logical_unit,
                             dma_id=0,
                             chunk_trailer_size= 32,
                             dma_block_size_kb= 4,
                             dma_memory_size_gb= 4,
                             numa_id=0,
-                            num_links=max(0, RU_CONFIG[RUIDX]["channel_count"] - 5))),
-                ("ssp_0",flxcr.Conf(card_id=RU_CONFIG[RUIDX]["card_id"],
+                            num_links=len(reader.links))) for reader in felix_readers
+            ] + [
+                ("ssp_0",flxcr.Conf(card_id=this_ru.card_id,
                             logical_unit=0,
                             dma_id=0,
                             chunk_trailer_size= 32,
                             dma_block_size_kb= 4,
                             dma_memory_size_gb= 4,
                             numa_id=0,
-                            num_links=RU_CONFIG[RUIDX]["channel_count"])),
+                            num_links=this_ru.channel_count)),
             ] + [
                  ("request_receiver", rrcv.ConfParams(
-                            map = [rrcv.geoidinst(region=RU_CONFIG[RUIDX]["region_id"] , element=idx , system=SYSTEM_TYPE , queueinstance=f"data_requests_{idx}") for idx in range(MIN_LINK,MAX_LINK)] +
-                                [rrcv.geoidinst(region=RU_CONFIG[RUIDX]["region_id"] , element=idx + total_link_count, system=SYSTEM_TYPE , queueinstance=f"tp_requests_{idx}") for idx in range(MIN_LINK,MAX_LINK) if SOFTWARE_TPG_ENABLED],
+                            map = [rrcv.geoidinst(region=this_ru.region_id , element=idx , system=SYSTEM_TYPE , queueinstance=f"data_requests_{idx}") for idx in range(MIN_LINK,MAX_LINK)] +
+                                [rrcv.geoidinst(region=this_ru.region_id , element=idx + total_link_count, system=SYSTEM_TYPE , queueinstance=f"tp_requests_{idx}") for idx in range(MIN_LINK,MAX_LINK) if SOFTWARE_TPG_ENABLED],
                             general_queue_timeout = QUEUE_POP_WAIT_MS,
                             connection_name = f"{PARTITION}.datareq_{RUIDX}"
                  )) 
@@ -264,7 +233,7 @@ def generate(
                         readoutmodelconf= rconf.ReadoutModelConf(
                             source_queue_timeout_ms= QUEUE_POP_WAIT_MS,
                             # fake_trigger_flag=0, # default
-                            region_id = RU_CONFIG[RUIDX]["region_id"],
+                            region_id = this_ru.region_id,
                             element_id = idx,
                             timesync_connection_name = f"{PARTITION}.timesync_{RUIDX}",
                             timesync_topic_name = "Timesync",
@@ -272,11 +241,11 @@ def generate(
                         latencybufferconf= rconf.LatencyBufferConf(
                             latency_buffer_alignment_size = 4096,
                             latency_buffer_size = LATENCY_BUFFER_SIZE,
-                            region_id = RU_CONFIG[RUIDX]["region_id"],
+                            region_id = this_ru.region_id,
                             element_id = idx,
                         ),
                         rawdataprocessorconf= rconf.RawDataProcessorConf(
-                            region_id = RU_CONFIG[RUIDX]["region_id"],
+                            region_id = this_ru.region_id,
                             element_id = idx,
                             enable_software_tpg = SOFTWARE_TPG_ENABLED,
                             emulator_mode = EMULATOR_MODE,
@@ -287,7 +256,7 @@ def generate(
                             latency_buffer_size = LATENCY_BUFFER_SIZE,
                             pop_limit_pct = 0.8,
                             pop_size_pct = 0.1,
-                            region_id = RU_CONFIG[RUIDX]["region_id"],
+                            region_id = this_ru.region_id,
                             element_id = idx,
                             output_file = path.join(RAW_RECORDING_OUTPUT_DIR, f"output_{RUIDX}_{idx}.out"),
                             stream_buffer_size = 8388608,
@@ -299,16 +268,16 @@ def generate(
                         readoutmodelconf= rconf.ReadoutModelConf(
                             source_queue_timeout_ms= QUEUE_POP_WAIT_MS,
                             # fake_trigger_flag=0, default
-                            region_id = RU_CONFIG[RUIDX]["region_id"],
+                            region_id = this_ru.region_id,
                             element_id = total_link_count+idx,
                         ),
                         latencybufferconf= rconf.LatencyBufferConf(
                             latency_buffer_size = LATENCY_BUFFER_SIZE,
-                            region_id = RU_CONFIG[RUIDX]["region_id"],
+                            region_id = this_ru.region_id,
                             element_id =  total_link_count+idx,
                         ),
                         rawdataprocessorconf= rconf.RawDataProcessorConf(
-                            region_id = RU_CONFIG[RUIDX]["region_id"],
+                            region_id = this_ru.region_id,
                             element_id =  total_link_count+idx,
                             enable_software_tpg = False,
                         ),
@@ -316,7 +285,7 @@ def generate(
                             latency_buffer_size = LATENCY_BUFFER_SIZE,
                             pop_limit_pct = 0.8,
                             pop_size_pct = 0.1,
-                            region_id = RU_CONFIG[RUIDX]["region_id"],
+                            region_id = this_ru.region_id,
                             element_id = total_link_count+idx,
                             # output_file = f"output_{idx + MIN_LINK}.out",
                             stream_buffer_size = 100 if FRONTEND_TYPE=='pacman' else 8388608,
@@ -339,7 +308,7 @@ def generate(
         conf_list.extend([
             (f"fakedataprod_{idx}", fdp.ConfParams(
                 system_type = SYSTEM_TYPE,
-                apa_number = RU_CONFIG[RUIDX]["region_id"],
+                apa_number = this_ru.region_id,
                 link_number = idx,
                 time_tick_diff = 25,
                 frame_size = 464,
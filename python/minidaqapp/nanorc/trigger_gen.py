@@ -1,52 +1,19 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
 import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('trigger/triggeractivitymaker.jsonnet')
-moo.otypes.load_types('trigger/triggercandidatemaker.jsonnet')
-moo.otypes.load_types('trigger/triggerzipper.jsonnet')
-moo.otypes.load_types('trigger/intervaltccreator.jsonnet')
-moo.otypes.load_types('trigger/moduleleveltrigger.jsonnet')
-moo.otypes.load_types('trigger/fakedataflow.jsonnet')
-moo.otypes.load_types('trigger/timingtriggercandidatemaker.jsonnet')
-moo.otypes.load_types('trigger/tpsetbuffercreator.jsonnet')
-moo.otypes.load_types('trigger/tpsetreceiver.jsonnet')
-
-moo.otypes.load_types('nwqueueadapters/queuetonetwork.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networktoqueue.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectreceiver.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectsender.jsonnet')
-moo.otypes.load_types('dfmodules/requestreceiver.jsonnet')
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
-
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.trigger.intervaltccreator as itcc
-import dunedaq.trigger.triggeractivitymaker as tam
-import dunedaq.trigger.triggercandidatemaker as tcm
-import dunedaq.trigger.triggerzipper as tzip
-import dunedaq.trigger.moduleleveltrigger as mlt
-import dunedaq.trigger.fakedataflow as fdf
-import dunedaq.trigger.timingtriggercandidatemaker as ttcm
-import dunedaq.trigger.tpsetbuffercreator as buf
-import dunedaq.trigger.tpsetreceiver as tpsrcv
-
-import dunedaq.nwqueueadapters.networktoqueue as ntoq
-import dunedaq.nwqueueadapters.queuetonetwork as qton
-import dunedaq.nwqueueadapters.networkobjectreceiver as nor
-import dunedaq.nwqueueadapters.networkobjectsender as nos
-import dunedaq.dfmodules.requestreceiver as rrcv
-import dunedaq.networkmanager.nwmgr as nwmgr
+from ..schema_registry import schema_types
+
+rccmd = schema_types('rcif/cmd.jsonnet', __name__)
+app = schema_types('appfwk/app.jsonnet', __name__)
+tam = schema_types('trigger/triggeractivitymaker.jsonnet', __name__)
+tcm = schema_types('trigger/triggercandidatemaker.jsonnet', __name__)
+tzip = schema_types('trigger/triggerzipper.jsonnet', __name__)
+mlt = schema_types('trigger/moduleleveltrigger.jsonnet', __name__)
+ttcm = schema_types('trigger/timingtriggercandidatemaker.jsonnet', __name__)
+buf = schema_types('trigger/tpsetbuffercreator.jsonnet', __name__)
+tpsrcv = schema_types('trigger/tpsetreceiver.jsonnet', __name__)
+ntoq = schema_types('nwqueueadapters/networktoqueue.jsonnet', __name__)
+nor = schema_types('nwqueueadapters/networkobjectreceiver.jsonnet', __name__)
+rrcv = schema_types('dfmodules/requestreceiver.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
 
@@ -79,7 +46,7 @@ def generate(
         NW_SPECS: list,
         
         SOFTWARE_TPG_ENABLED: bool = False,
-        RU_CONFIG: list = [],
+        TOPOLOGY = None,
 
         ACTIVITY_PLUGIN: str = 'TriggerActivityMakerPrescalePlugin',
         ACTIVITY_CONFIG: dict = dict(prescale=10000),
@@ -113,12 +80,12 @@ def generate(
                 app.QueueSpec(inst=f"fragment_q", kind='FollyMPMCQueue', capacity=1000),
                 app.QueueSpec(inst=f'taset_q', kind='FollyMPMCQueue', capacity=1000),
         ])
-        for ru in range(len(RU_CONFIG)):
+        for ru in range(len(TOPOLOGY)):
             queue_bare_specs.extend([
                 app.QueueSpec(inst=f"tpsets_from_netq_{ru}", kind='FollySPSCQueue', capacity=1000),
                 app.QueueSpec(inst=f'zipped_tpset_q_{ru}', kind='FollySPSCQueue', capacity=1000),
             ])
-            for idx in range(RU_CONFIG[ru]["channel_count"]):
+            for idx in range(TOPOLOGY[ru].channel_count):
                 queue_bare_specs.extend([
                     app.QueueSpec(inst=f"tpset_q_for_buf{ru}_{idx}", kind='FollySPSCQueue', capacity=1000),
                     app.QueueSpec(inst=f"data_request_q{ru}_{idx}", kind='FollySPSCQueue', capacity=1000),
@@ -131,9 +98,9 @@ def generate(
 
     if SOFTWARE_TPG_ENABLED:
         mod_specs.extend([
-            mspec(f"request_receiver", "RequestReceiver", [app.QueueInfo(name="output", inst=f"data_request_q{ru}_{idy}", dir="output") for ru in range(len(RU_CONFIG)) for idy in range(RU_CONFIG[ru]["channel_count"])])
+            mspec(f"request_receiver", "RequestReceiver", [app.QueueInfo(name="output", inst=f"data_request_q{ru.index}_{idy}", dir="output") for ru, idy, element in TOPOLOGY.links])
         ] + [
-            mspec(f"tpset_receiver", "TPSetReceiver", [app.QueueInfo(name="output", inst=f"tpset_q_for_buf{ru}_{idy}", dir="output") for ru in range(len(RU_CONFIG)) for idy in range(RU_CONFIG[ru]["channel_count"])])
+            mspec(f"tpset_receiver", "TPSetReceiver", [app.QueueInfo(name="output", inst=f"tpset_q_for_buf{ru.index}_{idy}", dir="output") for ru, idy, element in TOPOLOGY.links])
         ] + [
             mspec(f"fragment_sender", "FragmentSender", [app.QueueInfo(name="input_queue", inst=f"fragment_q", dir="input")]),
                 mspec(f'tcm', 'TriggerCandidateMaker', [ # TASet -> TC
@@ -141,7 +108,7 @@ def generate(
                     app.QueueInfo(name='output', inst=f'trigger_candidate_q', dir='output'),
                 ])
         ])
-        for ru in range(len(RU_CONFIG)):
+        for ru in range(len(TOPOLOGY)):
             mod_specs.extend([
                 mspec(f"tpset_subscriber_{ru}", "NetworkToQueue", [
                     app.QueueInfo(name="output", inst=f"tpsets_from_netq_{ru}", dir="output")
@@ -159,7 +126,7 @@ def generate(
                 ]),
 
             ])
-            for idy in range(RU_CONFIG[ru]["channel_count"]):
+            for idy in range(TOPOLOGY[ru].channel_count):
                 mod_specs.extend([
                 mspec(f"buf{ru}_{idy}", "TPSetBufferCreator", [
                     app.QueueInfo(name="tpset_source", inst=f"tpset_q_for_buf{ru}_{idy}", dir="input"),
@@ -195,11 +162,11 @@ def generate(
     if SOFTWARE_TPG_ENABLED:
         tp_confs.extend([
             ("request_receiver", rrcv.ConfParams(
-                                                 map = [rrcv.geoidinst(region=RU_CONFIG[ru]["region_id"], element=idy + RU_CONFIG[ru]["start_channel"], system="DataSelection" , queueinstance=f"data_request_q{ru}_{idy}") for ru in range(len(RU_CONFIG)) for idy in range(RU_CONFIG[ru]["channel_count"])],
+                                                 map = [rrcv.geoidinst(region=ru.region_id, element=element, system="DataSelection" , queueinstance=f"data_request_q{ru.index}_{idy}") for ru, idy, element in TOPOLOGY.links],
                                                  general_queue_timeout = 100,
                                                  connection_name = f"{PARTITION}.ds_tp_datareq_0")),
             ("tpset_receiver", tpsrcv.ConfParams(
-                                                 map = [tpsrcv.geoidinst(region=RU_CONFIG[ru]["region_id"] , element=idy + RU_CONFIG[ru]["start_channel"], system=SYSTEM_TYPE , queueinstance=f"tpset_q_for_buf{ru}_{idy}") for ru in range(len(RU_CONFIG)) for idy in range(RU_CONFIG[ru]["channel_count"])],
+                                                 map = [tpsrcv.geoidinst(region=ru.region_id , element=element, system=SYSTEM_TYPE , queueinstance=f"tpset_q_for_buf{ru.index}_{idy}") for ru, idy, element in TOPOLOGY.links],
                                                  general_queue_timeout = 100,
                                                  topic = f"TPSets")),
             (f"fragment_sender", None),
@@ -208,7 +175,7 @@ def generate(
                     candidate_maker_config=temptypes.CandidateConf(**CANDIDATE_CONFIG)
                 )),
         ])
-        for idx in range(len(RU_CONFIG)):
+        for idx in range(len(TOPOLOGY)):
             tp_confs.extend([
                 (f"tpset_subscriber_{idx}", ntoq.Conf(
                     msg_type="dunedaq::trigger::TPSet",
@@ -217,7 +184,7 @@ def generate(
                                              subscriptions=["TPSets"])
                 )),
                 (f"zip_{idx}", tzip.ConfParams(
-                    cardinality=RU_CONFIG[idx]["channel_count"],
+                    cardinality=TOPOLOGY[idx].channel_count,
                     max_latency_ms=1000,
                     region_id=0, # Fake placeholder
                     element_id=0 # Fake placeholder
@@ -235,15 +202,13 @@ def generate(
                 )),
 
             ])
-            for idy in range(RU_CONFIG[idx]["channel_count"]):
+            for idy, element in enumerate(TOPOLOGY[idx].links):
                 tp_confs.extend([
-                    (f"buf{idx}_{idy}", buf.Conf(tpset_buffer_size=10000, region=RU_CONFIG[idx]["region_id"], element=idy + RU_CONFIG[idx]["start_channel"])) 
+                    (f"buf{idx}_{idy}", buf.Conf(tpset_buffer_size=10000, region=TOPOLOGY[idx].region_id, element=element)) 
                 ])
 
 
-    total_link_count = 0
-    for ru in range(len(RU_CONFIG)):
-        total_link_count += RU_CONFIG[ru]["channel_count"]
+    total_link_count = TOPOLOGY.total_link_count
 
     cmd_data['conf'] = acmd(tp_confs + [
 
@@ -265,14 +230,14 @@ def generate(
         ("mlt", mlt.ConfParams(
             # This line requests the raw data from upstream DAQ _and_ the raw TPs from upstream DAQ
             links=[
-                mlt.GeoID(system=SYSTEM_TYPE, region=RU_CONFIG[ru]["region_id"], element=RU_CONFIG[ru]["start_channel"] + idx)
-                    for ru in range(len(RU_CONFIG)) for idx in range(RU_CONFIG[ru]["channel_count"])
+                mlt.GeoID(system=SYSTEM_TYPE, region=ru.region_id, element=element)
+                    for ru, _, element in TOPOLOGY.links
             ] + ([
-                mlt.GeoID(system="DataSelection", region=RU_CONFIG[ru]["region_id"], element=RU_CONFIG[ru]["start_channel"] + idx) 
-                    for ru in range(len(RU_CONFIG)) for idx in range(RU_CONFIG[ru]["channel_count"])
+                mlt.GeoID(system="DataSelection", region=ru.region_id, element=element) 
+                    for ru, _, element in TOPOLOGY.links
             ] if SOFTWARE_TPG_ENABLED else []) + ([
-                mlt.GeoID(system=SYSTEM_TYPE, region=RU_CONFIG[ru]["region_id"], element=RU_CONFIG[ru]["start_channel"] + idx + total_link_count)
-                    for ru in range(len(RU_CONFIG)) for idx in range(RU_CONFIG[ru]["channel_count"])
+                mlt.GeoID(system=SYSTEM_TYPE, region=ru.region_id, element=element + total_link_count)
+                    for ru, _, element in TOPOLOGY.links
             ] if SOFTWARE_TPG_ENABLED else []),
             dfo_connection=f"{PARTITION}.td_mlt_to_dfo",
             dfo_busy_connection=f"{PARTITION}.df_busy_signal",
@@ -0,0 +1,74 @@
+"""
+Build independent Apps in a pool of worker processes.
+
+The readout, dqm and dataflow apps don't know about each other until
+connect_all_fragment_producers() is called, so they can be generated
+in parallel. The workers are forked, so they start with the schemas
+and generator modules that the parent already loaded, and send back
+the finished Apps, which are pickled. The results are returned in the
+order of the specs, so the System gets them in the same order as in a
+serial run and the configuration is identical.
+"""
+
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from rich.console import Console
+
+console = Console()
+
+def _build(spec):
+    name, generator, kwargs = spec
+    return name, generator(**kwargs)
+
+def _pickle(obj, what):
+    """The pickle of `obj`, raising PicklingError for whatever makes it unpicklable"""
+    try:
+        return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise pickle.PicklingError(f"{what} can't be pickled: {e!r}") from e
+
+def _build_pickled(spec):
+    # Pickled here, so that an App that can't be pickled is told apart from a generator error
+    name, app = _build(spec)
+    return name, _pickle(app, f"The app {name}")
+
+def build_apps(specs, jobs=1, timer=None):
+    """
+    Run each (app name, generator function, keyword arguments) in `specs`
+    and return the list of (app name, App), in the order of `specs`.
+
+    With jobs > 1 the generators run in up to `jobs` forked processes.
+    Where that isn't possible (no fork on this platform, or an App that
+    can't be pickled), the apps are built serially instead. When built
+    serially, each generator call is a stage of `timer` (a StageTimer).
+    """
+    if jobs > 1 and len(specs) > 1:
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            context = None
+            console.log("fork is not available on this platform, building the apps serially")
+
+        if context is not None:
+            try:
+                _pickle(specs, "The app specs")
+            except pickle.PicklingError as e:
+                console.log(f"Could not build the apps in parallel ({e}), building them serially")
+                context = None
+
+        if context is not None:
+            workers = min(jobs, len(specs))
+            # A few chunks per worker, to amortise the round trips while still balancing the load
+            chunksize = max(1, len(specs) // (workers * 4))
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    return [(name, pickle.loads(app)) for name, app in pool.map(_build_pickled, specs, chunksize=chunksize)]
+            except (pickle.PicklingError, BrokenProcessPool) as e:
+                console.log(f"Could not build the apps in parallel ({e!r}), building them serially")
+
+    if timer is not None:
+        specs = [(name, timer.timed(generator), kwargs) for name, generator, kwargs in specs]
+    return [_build(spec) for spec in specs]
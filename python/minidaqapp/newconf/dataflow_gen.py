@@ -1,44 +1,12 @@
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('dfmodules/triggerrecordbuilder.jsonnet')
-moo.otypes.load_types('dfmodules/datawriter.jsonnet')
-moo.otypes.load_types('dfmodules/hdf5datastore.jsonnet')
-moo.otypes.load_types('dfmodules/tpsetwriter.jsonnet')
-moo.otypes.load_types('dfmodules/fragmentreceiver.jsonnet')
-moo.otypes.load_types('dfmodules/triggerdecisionreceiver.jsonnet')
-moo.otypes.load_types('nwqueueadapters/queuetonetwork.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networktoqueue.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectreceiver.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectsender.jsonnet')
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
-
+from ..schema_registry import schema_types
 
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.dfmodules.triggerrecordbuilder as trb
-import dunedaq.dfmodules.datawriter as dw
-import dunedaq.dfmodules.hdf5datastore as hdf5ds
-import dunedaq.dfmodules.tpsetwriter as tpsw
-import dunedaq.dfmodules.fragmentreceiver as frcv
-import dunedaq.dfmodules.triggerdecisionreceiver as tdrcv
-import dunedaq.nwqueueadapters.networktoqueue as ntoq
-import dunedaq.nwqueueadapters.queuetonetwork as qton
-import dunedaq.nwqueueadapters.networkobjectreceiver as nor
-import dunedaq.nwqueueadapters.networkobjectsender as nos
-import dunedaq.networkmanager.nwmgr as nwmgr
+trb = schema_types('dfmodules/triggerrecordbuilder.jsonnet', __name__)
+dw = schema_types('dfmodules/datawriter.jsonnet', __name__)
+hdf5ds = schema_types('dfmodules/hdf5datastore.jsonnet', __name__)
+tpsw = schema_types('dfmodules/tpsetwriter.jsonnet', __name__)
+nor = schema_types('nwqueueadapters/networkobjectreceiver.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
 from appfwk.app import App, ModuleGraph
@@ -48,7 +16,7 @@ from appfwk.conf_utils import Direction, Connection, data_request_endpoint_name
 # Time to wait on pop()
 QUEUE_POP_WAIT_MS = 100
 
-def get_dataflow_app(RU_CONFIG=[],
+def get_dataflow_app(TOPOLOGY=None,
                      HOSTIDX=0,
                      RUN_NUMBER=333,
                      OUTPUT_PATH=".",
@@ -65,9 +33,7 @@ def get_dataflow_app(RU_CONFIG=[],
     """Generate the json configuration for the readout and DF process"""
 
     modules = []
-    total_link_count = 0
-    for ru in range(len(RU_CONFIG)):
-        total_link_count += RU_CONFIG[ru]["channel_count"]
+    total_link_count = TOPOLOGY.total_link_count
 
     modules += [DAQModule(name = 'trb',
                           plugin = 'TriggerRecordBuilder',
@@ -112,7 +78,7 @@ def get_dataflow_app(RU_CONFIG=[],
                                                           element_name_prefix="Link")])))))]
 
     if TPSET_WRITING_ENABLED:
-        for idx in range(len(RU_CONFIG)):
+        for idx in range(len(TOPOLOGY)):
             modules += [DAQModule(name = f'tpset_subscriber_{idx}',
                                plugin = "NetworkToQueue",
                                connections = {'output':Connection(f"tpswriter.tpsets_from_netq")},
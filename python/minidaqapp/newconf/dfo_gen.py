@@ -1,15 +1,8 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
 import moo.otypes
+from ..schema_registry import schema_types
 
-moo.otypes.load_types('dfmodules/datafloworchestrator.jsonnet')
-
-# Import new types
-import dunedaq.dfmodules.datafloworchestrator as dfo
+dfo = schema_types('dfmodules/datafloworchestrator.jsonnet', __name__)
 
 from appfwk.app import App, ModuleGraph
 from appfwk.daqmodule import DAQModule
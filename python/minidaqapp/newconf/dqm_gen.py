@@ -1,25 +1,9 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-moo.otypes.load_types('dfmodules/triggerrecordbuilder.jsonnet')
-moo.otypes.load_types('dfmodules/fragmentreceiver.jsonnet')
-moo.otypes.load_types('dqm/dqmprocessor.jsonnet')
-
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.dfmodules.triggerrecordbuilder as trb
-import dunedaq.dfmodules.fragmentreceiver as frcv
-import dunedaq.dqm.dqmprocessor as dqmprocessor
+from ..schema_registry import schema_types
+
+trb = schema_types('dfmodules/triggerrecordbuilder.jsonnet', __name__)
+frcv = schema_types('dfmodules/fragmentreceiver.jsonnet', __name__)
+dqmprocessor = schema_types('dqm/dqmprocessor.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
 
@@ -32,7 +16,7 @@ QUEUE_POP_WAIT_MS = 100
 # local clock speed Hz
 # CLOCK_SPEED_HZ = 50000000;
 
-def get_dqm_app(RU_CONFIG=[],
+def get_dqm_app(TOPOLOGY=None,
                 RU_NAME='',
                 EMULATOR_MODE=False,
                 DATA_RATE_SLOWDOWN_FACTOR=1,
@@ -54,8 +38,9 @@ def get_dqm_app(RU_CONFIG=[],
 
     cmd_data = {}
 
-    MIN_LINK = RU_CONFIG[RUIDX]["start_channel"]
-    MAX_LINK = MIN_LINK + RU_CONFIG[RUIDX]["channel_count"]
+    this_ru = TOPOLOGY[RUIDX]
+    MIN_LINK = this_ru.start_channel
+    MAX_LINK = MIN_LINK + this_ru.channel_count
 
     modules = []
 
@@ -89,7 +74,7 @@ def get_dqm_app(RU_CONFIG=[],
                                general_queue_timeout=QUEUE_POP_WAIT_MS,
                                reply_connection_name=f"{PARTITION}.fragx_dqm_{RUIDX}",
                                map=trb.mapgeoidconnections([
-                                   trb.geoidinst(region=RU_CONFIG[RUIDX]["region_id"],
+                                   trb.geoidinst(region=this_ru.region_id,
                                                  element=idx,
                                                  system=SYSTEM_TYPE,
                                                  connection_name=f"{PARTITION}.data_requests_for_{RU_NAME}") for idx in range(MIN_LINK, MAX_LINK)
@@ -108,7 +93,7 @@ def get_dqm_app(RU_CONFIG=[],
                           plugin='DQMProcessor',
                           connections=connections,
                           conf=dqmprocessor.Conf(
-                              region=RU_CONFIG[RUIDX]["region_id"],
+                              region=this_ru.region_id,
                               channel_map=DQM_CMAP, # 'HD' for horizontal drift or 'VD' for vertical drift
                               sdqm_hist=dqmprocessor.StandardDQM(**{'how_often' : DQM_RAWDISPLAY_PARAMS[0], 'unavailable_time' : DQM_RAWDISPLAY_PARAMS[1], 'num_frames' : DQM_RAWDISPLAY_PARAMS[2]}),
                               sdqm_mean_rms=dqmprocessor.StandardDQM(**{'how_often' : DQM_MEANRMS_PARAMS[0], 'unavailable_time' : DQM_MEANRMS_PARAMS[1], 'num_frames' : DQM_MEANRMS_PARAMS[2]}),
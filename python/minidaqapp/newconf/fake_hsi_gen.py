@@ -12,25 +12,11 @@
 # fragments are provided by the FakeDataProd module from dfmodules
 
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('timinglibs/fakehsieventgenerator.jsonnet')
+from ..schema_registry import schema_types
 
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.timinglibs.fakehsieventgenerator as fhsig
+rccmd = schema_types('rcif/cmd.jsonnet', __name__)
+fhsig = schema_types('timinglibs/fakehsieventgenerator.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
     
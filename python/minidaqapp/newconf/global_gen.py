@@ -3,11 +3,8 @@ import os
 import math
 import sys
 import glob
-import rich.traceback
 from rich.console import Console
 from os.path import exists, join
-from appfwk.system import System
-from appfwk.conf_utils import AppConnection, add_network, make_app_command_data
 
 CLOCK_SPEED_HZ = 50000000
 
@@ -16,17 +13,21 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
 console = Console()
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
+import click
 
-# Load configuration types
-import moo.otypes
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
-import dunedaq.networkmanager.nwmgr as nwmgr
+def load_system_types():
+    """
+    Load the schemas and appfwk classes needed to assemble the System.
 
-import click
+    This is deliberately not done at module level, so that -h and
+    option parsing don't pay for loading any schemas.
+    """
+    from ..schema_registry import registry
+    nwmgr = registry.load('networkmanager/nwmgr.jsonnet', __name__)
+
+    from appfwk.system import System
+    from appfwk.conf_utils import AppConnection, add_network, make_app_command_data
+    return nwmgr, System, AppConnection, add_network, make_app_command_data
 
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.option('-p', '--partition-name', default="global", help="Name of the partition to use, for ERS and OPMON")
@@ -40,19 +41,42 @@ import click
 @click.option('--pocket-url', default='127.0.0.1', help="URL for connecting to Pocket services")
 @click.option('--hsi-device-name', default="", help='Real HSI hardware only: device name of HSI hw')
 @click.option('--master-device-name', default="", help='Device name of timing master hw')
+@click.option('--update', is_flag=True, default=False, help="Update the configuration in JSON_DIR if it already exists: only the files whose content changed are rewritten, and files that are no longer generated are removed")
+@click.option('--compact-json', is_flag=True, default=False, help="Write the JSON files without indentation, which makes them smaller and faster to write and read")
+@click.option('--gzip-json', is_flag=True, default=False, help="Gzip the JSON files (written as .json.gz, which nanorc can't read directly)")
+@click.option('--verify-json', is_flag=True, default=False, help="With --compact-json or --gzip-json, check that every file has the same content as the indented JSON would, and read it back once written")
+@click.option('--bundle', is_flag=True, default=False, help="Write the whole configuration in a single bundle.json (gzipped with --gzip-json) rather than one file per app and command; expand it with python -m minidaqapp.bundle")
+@click.option('--share-identical-files', is_flag=True, default=False, help="Write the command data files that are identical in several apps (e.g. the no-op pause, resume, scrap and record) once, as data/shared_{hash}.json, and point the top-level command files to them")
+@click.option('--profile', is_flag=True, default=False, help="Print how long each stage of the generation took")
+@click.option('--profile-stats', type=click.Path(), default=None, help="Also save cProfile statistics of the generation to this file (implies --profile)")
+@click.option('--profile-memory', type=click.Path(), default=None, help="Also save a tracemalloc snapshot taken at the end of the generation to this file (implies --profile)")
 @click.option('--debug', default=False, is_flag=True, help="Switch to get a lot of printout and dot files")
 @click.argument('json_dir', type=click.Path())
 
-def cli(partition_name, disable_trace, host_thi, port_thi, host_tmc, timing_hw_connections_file, opmon_impl, ers_impl, pocket_url, hsi_device_name, master_device_name, debug, json_dir):
+def cli(partition_name, disable_trace, host_thi, port_thi, host_tmc, timing_hw_connections_file, opmon_impl, ers_impl, pocket_url, hsi_device_name, master_device_name, update, compact_json, gzip_json, verify_json, bundle, share_identical_files, profile, profile_stats, profile_memory, debug, json_dir):
+
+    if exists(json_dir) and not update:
+        raise RuntimeError(f"Directory {json_dir} already exists (use --update to update it)")
+
+    if verify_json and not (compact_json or gzip_json):
+        raise click.UsageError("--verify-json can only be used with --compact-json or --gzip-json")
 
-    if exists(json_dir):
-        raise RuntimeError(f"Directory {json_dir} already exists")
+    from ..profiling import StageTimer
+    timer = StageTimer(enabled=profile, pstats_file=profile_stats, tracemalloc_file=profile_memory)
+    timer.start()
 
-    console.log("Loading timing hardware config generator")
-    from .thi_gen import get_thi_app
+    nwmgr, System, AppConnection, add_network, make_app_command_data = timer.timed(load_system_types)()
+    add_network = timer.timed(add_network)
+    make_app_command_data = timer.timed(make_app_command_data)
 
-    console.log("Loading timing master controller generator")
-    from .tmc_gen import get_tmc_app
+    with timer.stage("import generators"):
+        console.log("Loading timing hardware config generator")
+        from .thi_gen import get_thi_app
+
+        console.log("Loading timing master controller generator")
+        from .tmc_gen import get_tmc_app
+    get_thi_app = timer.timed(get_thi_app)
+    get_tmc_app = timer.timed(get_tmc_app)
 
     console.log(f"Generating configs for global thi host {host_thi}")
 
@@ -124,14 +148,16 @@ def cli(partition_name, disable_trace, host_thi, port_thi, host_tmc, timing_hw_c
     # Application command data generation
     ####################################################################
 
-    # Arrange per-app command data into the format used by util.write_json_files()
+    # Per-app command data, by app name
     app_command_datas = {
         name : make_app_command_data(the_system, app, verbose=debug)
         for name,app in the_system.apps.items()
     }
 
     # Make boot.json config
-    from appfwk.conf_utils import make_system_command_datas,generate_boot, write_json_files
+    from appfwk.conf_utils import make_system_command_datas,generate_boot
+    make_system_command_datas = timer.timed(make_system_command_datas)
+    generate_boot = timer.timed(generate_boot)
     system_command_datas = make_system_command_datas(the_system, verbose=debug)
     # Override the default boot.json with the one from minidaqapp
     boot = generate_boot(the_system.apps, partition_name=partition_name, ers_settings=ers_settings, info_svc_uri=info_svc_uri,
@@ -139,7 +165,26 @@ def cli(partition_name, disable_trace, host_thi, port_thi, host_tmc, timing_hw_c
 
     system_command_datas['boot'] = boot
 
-    write_json_files(app_command_datas, system_command_datas, json_dir)
+    from ..config_writer import ConfigWriter, JsonFormat
+    with timer.stage("write files"):
+        writer = ConfigWriter(json_dir, update=update, json_format=JsonFormat(compact=compact_json, gzip=gzip_json, verify=verify_json, bundle=bundle, share_identical=share_identical_files))
+        for name, command_data in app_command_datas.items():
+            writer.write_app(name, command_data)
+        writer.write_system(system_command_datas)
+        delta = writer.finish()
+    if update:
+        console.log(f"Updated {json_dir}: {delta}")
+        if debug and (delta.added or delta.changed or delta.removed):
+            console.log(delta.details())
+
+    timer.finish()
+
+    if debug:
+        from ..schema_registry import registry
+        console.log(f"Schema loading:\n{registry.format_report()}")
+
+    if timer.enabled:
+        console.log(f"Generation profile:\n{timer.format_report()}")
 
     console.log(f"Global aapp config generated in {json_dir}")
 
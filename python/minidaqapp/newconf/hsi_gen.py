@@ -15,37 +15,12 @@ import math
 from rich.console import Console
 console = Console()
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('timinglibs/hsireadout.jsonnet')
-moo.otypes.load_types('timinglibs/hsicontroller.jsonnet')
-moo.otypes.load_types('nwqueueadapters/queuetonetwork.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networktoqueue.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectreceiver.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectsender.jsonnet')
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
+from ..schema_registry import schema_types
 
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd, 
-import dunedaq.rcif.cmd as rccmd # AddressedCmd, 
-import dunedaq.appfwk.cmd as cmd # AddressedCmd, 
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.timinglibs.hsireadout as hsi
-import dunedaq.timinglibs.hsicontroller as hsic
-import dunedaq.nwqueueadapters.networktoqueue as ntoq
-import dunedaq.nwqueueadapters.queuetonetwork as qton
-import dunedaq.nwqueueadapters.networkobjectreceiver as nor
-import dunedaq.nwqueueadapters.networkobjectsender as nos
-import dunedaq.networkmanager.nwmgr as nwmgr
+rccmd = schema_types('rcif/cmd.jsonnet', __name__)
+hsi = schema_types('timinglibs/hsireadout.jsonnet', __name__)
+hsic = schema_types('timinglibs/hsicontroller.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
 from appfwk.app import App, ModuleGraph
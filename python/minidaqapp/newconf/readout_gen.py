@@ -1,47 +1,17 @@
 
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
-import moo.otypes
-moo.otypes.load_types('rcif/cmd.jsonnet')
-moo.otypes.load_types('appfwk/cmd.jsonnet')
-moo.otypes.load_types('appfwk/app.jsonnet')
-
-moo.otypes.load_types('nwqueueadapters/queuetonetwork.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networktoqueue.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectreceiver.jsonnet')
-moo.otypes.load_types('nwqueueadapters/networkobjectsender.jsonnet')
-moo.otypes.load_types('flxlibs/felixcardreader.jsonnet')
-moo.otypes.load_types('readoutlibs/sourceemulatorconfig.jsonnet')
-moo.otypes.load_types('readoutlibs/readoutconfig.jsonnet')
-moo.otypes.load_types('lbrulibs/pacmancardreader.jsonnet')
-moo.otypes.load_types('dfmodules/fakedataprod.jsonnet')
-moo.otypes.load_types('networkmanager/nwmgr.jsonnet')
+from ..schema_registry import schema_types
 
-# Import new types
-import dunedaq.cmdlib.cmd as basecmd # AddressedCmd,
-import dunedaq.rcif.cmd as rccmd # AddressedCmd,
-import dunedaq.appfwk.cmd as cmd # AddressedCmd,
-import dunedaq.appfwk.app as app # AddressedCmd,
-import dunedaq.nwqueueadapters.networktoqueue as ntoq
-import dunedaq.nwqueueadapters.queuetonetwork as qton
-import dunedaq.nwqueueadapters.networkobjectreceiver as nor
-import dunedaq.nwqueueadapters.networkobjectsender as nos
-import dunedaq.readoutlibs.sourceemulatorconfig as sec
-import dunedaq.flxlibs.felixcardreader as flxcr
-import dunedaq.readoutlibs.readoutconfig as rconf
-import dunedaq.lbrulibs.pacmancardreader as pcr
-# import dunedaq.dfmodules.triggerrecordbuilder as trb
-import dunedaq.dfmodules.fakedataprod as fdp
-import dunedaq.networkmanager.nwmgr as nwmgr
+sec = schema_types('readoutlibs/sourceemulatorconfig.jsonnet', __name__)
+flxcr = schema_types('flxlibs/felixcardreader.jsonnet', __name__)
+rconf = schema_types('readoutlibs/readoutconfig.jsonnet', __name__)
+pcr = schema_types('lbrulibs/pacmancardreader.jsonnet', __name__)
 
 from appfwk.utils import acmd, mcmd, mrccmd, mspec
 from os import path
 
 import json
+from ..topology import FelixLayout
 from appfwk.conf_utils import Direction, Connection
 from appfwk.daqmodule import DAQModule
 from appfwk.app import App,ModuleGraph
@@ -50,7 +20,7 @@ QUEUE_POP_WAIT_MS = 100
 # local clock speed Hz
 # CLOCK_SPEED_HZ = 50000000;
 
-def get_readout_app(RU_CONFIG=[],
+def get_readout_app(TOPOLOGY=None,
                     EMULATOR_MODE=False,
                     DATA_RATE_SLOWDOWN_FACTOR=1,
                     RUN_NUMBER=333, 
@@ -68,10 +38,19 @@ def get_readout_app(RU_CONFIG=[],
                     USE_FAKE_DATA_PRODUCERS=False,
                     PARTITION="UNKNOWN",
                     LATENCY_BUFFER_SIZE=499968,
+                    FELIX_LAYOUT=None,
+                    FELIX_CARDS=None,
                     HOST="localhost",
                     DEBUG=False):
-    """Generate the json configuration for the readout and DF process"""
-    NUMBER_OF_DATA_PRODUCERS = len(RU_CONFIG)
+    """
+    Generate the json configuration for the readout and DF process.
+
+    FELIX_LAYOUT (a topology.FelixLayout) spreads the links over the card
+    readers. FELIX_CARDS ({card id: inventory.FelixCard}) gives the NUMA
+    node and DMA memory of the cards: their readers and the latency
+    buffers of their links are set up on that node
+    """
+    NUMBER_OF_DATA_PRODUCERS = len(TOPOLOGY)
     cmd_data = {}
     
     required_eps = {f'{PARTITION}.timesync_{RUIDX}'}
@@ -80,16 +59,21 @@ def get_readout_app(RU_CONFIG=[],
     
     RATE_KHZ = CLOCK_SPEED_HZ / (25 * 12 * DATA_RATE_SLOWDOWN_FACTOR * 1000)
     
-    MIN_LINK = RU_CONFIG[RUIDX]["start_channel"]
-    MAX_LINK = MIN_LINK + RU_CONFIG[RUIDX]["channel_count"]
+    this_ru = TOPOLOGY[RUIDX]
+    MIN_LINK = this_ru.start_channel
+    MAX_LINK = MIN_LINK + this_ru.channel_count
     
     if DEBUG: print(f"ReadoutApp.__init__ with RUIDX={RUIDX}, MIN_LINK={MIN_LINK}, MAX_LINK={MAX_LINK}")
     modules = []
 
-    total_link_count = 0
-    for ru in range(len(RU_CONFIG)):
-        if RU_CONFIG[ru]['region_id'] == RU_CONFIG[RUIDX]['region_id']:
-            total_link_count += RU_CONFIG[ru]["channel_count"]
+    total_link_count = TOPOLOGY.region_link_count(this_ru.region_id)
+
+    FELIX_CARDS = FELIX_CARDS or {}
+    felix_readers = (FELIX_LAYOUT or FelixLayout()).readers(this_ru) if FLX_INPUT else []
+    # Keep the latency buffers on the NUMA node of the card that fills them
+    numa_confs = {idx: dict(latency_buffer_numa_aware = True,
+                            latency_buffer_numa_node = FELIX_CARDS[reader.card_id].numa_node)
+                  for reader in felix_readers if reader.card_id in FELIX_CARDS for idx in reader.links}
 
     if SOFTWARE_TPG_ENABLED:
         connections = {}
@@ -106,19 +90,20 @@ def get_readout_app(RU_CONFIG=[],
                                plugin = "DataLinkHandler",
                                connections =  {}, #{'fragment_queue': Connection('fragment_sender.input_queue')},
                                conf = rconf.Conf(readoutmodelconf = rconf.ReadoutModelConf(source_queue_timeout_ms = QUEUE_POP_WAIT_MS,
-                                                                                         region_id = RU_CONFIG[RUIDX]["region_id"],
+                                                                                         region_id = this_ru.region_id,
                                                                                          element_id = total_link_count+idx),
                                                  latencybufferconf = rconf.LatencyBufferConf(latency_buffer_size = LATENCY_BUFFER_SIZE,
-                                                                                            region_id = RU_CONFIG[RUIDX]["region_id"],
-                                                                                            element_id = total_link_count + idx),
-                                                 rawdataprocessorconf = rconf.RawDataProcessorConf(region_id = RU_CONFIG[RUIDX]["region_id"],
+                                                                                            region_id = this_ru.region_id,
+                                                                                            element_id = total_link_count + idx,
+                                                                                            **numa_confs.get(idx, {})),
+                                                 rawdataprocessorconf = rconf.RawDataProcessorConf(region_id = this_ru.region_id,
                                                                                                    element_id = total_link_count + idx,
                                                                                                    enable_software_tpg = False,
                                                                                                    channel_map_name=TPG_CHANNEL_MAP),
                                                  requesthandlerconf= rconf.RequestHandlerConf(latency_buffer_size = LATENCY_BUFFER_SIZE,
                                                                                               pop_limit_pct = 0.8,
                                                                                               pop_size_pct = 0.1,
-                                                                                              region_id = RU_CONFIG[RUIDX]["region_id"],
+                                                                                              region_id = this_ru.region_id,
                                                                                               element_id =total_link_count + idx,
                                                                                               # output_file = f"output_{idx + MIN_LINK}.out",
                                                                                               stream_buffer_size = 100 if FRONTEND_TYPE=='pacman' else 8388608,
@@ -166,7 +151,7 @@ def get_readout_app(RU_CONFIG=[],
                                       readoutmodelconf= rconf.ReadoutModelConf(
                                           source_queue_timeout_ms= QUEUE_POP_WAIT_MS,
                                           # fake_trigger_flag=0, # default
-                                          region_id = RU_CONFIG[RUIDX]["region_id"],
+                                          region_id = this_ru.region_id,
                                           element_id = idx,
                                           timesync_connection_name = f"{PARTITION}.timesync_{RUIDX}",
                                           timesync_topic_name = "Timesync",
@@ -174,11 +159,12 @@ def get_readout_app(RU_CONFIG=[],
                                       latencybufferconf= rconf.LatencyBufferConf(
                                           latency_buffer_alignment_size = 4096,
                                           latency_buffer_size = LATENCY_BUFFER_SIZE,
-                                          region_id = RU_CONFIG[RUIDX]["region_id"],
+                                          region_id = this_ru.region_id,
                                           element_id = idx,
+                                          **numa_confs.get(idx, {}),
                                       ),
                                       rawdataprocessorconf= rconf.RawDataProcessorConf(
-                                          region_id = RU_CONFIG[RUIDX]["region_id"],
+                                          region_id = this_ru.region_id,
                                           element_id = idx,
                                           enable_software_tpg = SOFTWARE_TPG_ENABLED,
                                           channel_map_name = TPG_CHANNEL_MAP,
@@ -190,7 +176,7 @@ def get_readout_app(RU_CONFIG=[],
                                           latency_buffer_size = LATENCY_BUFFER_SIZE,
                                           pop_limit_pct = 0.8,
                                           pop_size_pct = 0.1,
-                                          region_id = RU_CONFIG[RUIDX]["region_id"],
+                                          region_id = this_ru.region_id,
                                           element_id = idx,
                                           output_file = path.join(RAW_RECORDING_OUTPUT_DIR, f"output_{RUIDX}_{idx}.out"),
                                           stream_buffer_size = 8388608,
@@ -200,45 +186,24 @@ def get_readout_app(RU_CONFIG=[],
                     
     if not USE_FAKE_DATA_PRODUCERS:
         if FLX_INPUT:
-            connections = {}
-            for idx in range(MIN_LINK, MIN_LINK + min(5, RU_CONFIG[RUIDX]["channel_count"])):
-                connections[f'output_{idx}'] = Connection(f"datahandler_{idx}.raw_input",
-                                                          queue_name = f'{FRONTEND_TYPE}_link_{idx}',
-                                                          queue_kind = "FollySPSCQueue",
-                                                          queue_capacity = 100000)
-            
-            modules += [DAQModule(name = 'flxcard_0',
-                               plugin = 'FelixCardReader',
-                               connections = connections,
-                               conf = flxcr.Conf(card_id = RU_CONFIG[RUIDX]["card_id"],
-                                                 logical_unit = 0,
-                                                 dma_id = 0,
-                                                 chunk_trailer_size = 32,
-                                                 dma_block_size_kb = 4,
-                                                 dma_memory_size_gb = 4,
-                                                 numa_id = 0,
-                                                 num_links = min(5,RU_CONFIG[RUIDX]["channel_count"])))]
-            
-            if RU_CONFIG[RUIDX]["channel_count"] > 5 :
-                connections = {}
-                for idx in range(MIN_LINK+5, MAX_LINK):
-                    connections[f'output_{idx}'] = Connection(f"datahandler_{idx}.raw_input",
-                                                              queue_name = f'{FRONTEND_TYPE}_link_{idx}',
-                                                              queue_kind = "FollySPSCQueue",
-                                                              queue_capacity = 100000)
-                    
-                modules += [DAQModule(name = "flxcard_1",
-                                   plugin = "FelixCardReader",
-                                   connections = connections,
-                                   conf = flxcr.Conf(card_id = RU_CONFIG[RUIDX]["card_id"],
-                                                     logical_unit = 1,
+            for reader in felix_readers:
+                card = FELIX_CARDS.get(reader.card_id)
+                modules += [DAQModule(name = reader.name,
+                                   plugin = 'FelixCardReader',
+                                   connections = {f'output_{idx}': Connection(f"datahandler_{idx}.raw_input",
+                                                                              queue_name = f'{FRONTEND_TYPE}_link_{idx}',
+                                                                              queue_kind = "FollySPSCQueue",
+                                                                              queue_capacity = 100000)
+                                                  for idx in reader.links},
+                                   conf = flxcr.Conf(card_id = reader.card_id,
+                                                     logical_unit = reader.logical_unit,
                                                      dma_id = 0,
                                                      chunk_trailer_size = 32,
                                                      dma_block_size_kb = 4,
-                                                     dma_memory_size_gb = 4,
-                                                     numa_id = 0,
-                                                     num_links = max(0, RU_CONFIG[RUIDX]["channel_count"] - 5)))]
-                
+                                                     dma_memory_size_gb = card.dma_memory_gb if card else 4,
+                                                     numa_id = card.numa_node if card else 0,
+                                                     num_links = len(reader.links)))]
+
         elif SSP_INPUT:
             modules += [DAQModule(name = "ssp_0",
                                plugin = "SSPCardReader",
@@ -246,20 +211,20 @@ def get_readout_app(RU_CONFIG=[],
                                                                           queue_name = f'{FRONTEND_TYPE}_link_{idx}',
                                                                           queue_kind = "FollySPSCQueue",
                                                                           queue_capacity = 100000)},
-                               conf = flxcr.Conf(card_id = RU_CONFIG[RUIDX]["card_id"],
+                               conf = flxcr.Conf(card_id = this_ru.card_id,
                                                  logical_unit = 0,
                                                  dma_id = 0,
                                                  chunk_trailer_size = 32,
                                                  dma_block_size_kb = 4,
                                                  dma_memory_size_gb = 4,
                                                  numa_id = 0,
-                                                 num_links = RU_CONFIG[RUIDX]["channel_count"]))]
+                                                 num_links = this_ru.channel_count))]
     
         else:
             fake_source = "fake_source"
             card_reader = "FakeCardReader"
             conf = sec.Conf(link_confs = [sec.LinkConfiguration(geoid=sec.GeoID(system=SYSTEM_TYPE,
-                                                                                region=RU_CONFIG[RUIDX]["region_id"],
+                                                                                region=this_ru.region_id,
                                                                                 element=idx),
                                                                 slowdown=DATA_RATE_SLOWDOWN_FACTOR,
                                                                 queue_name=f"output_{idx}",
@@ -272,7 +237,7 @@ def get_readout_app(RU_CONFIG=[],
                 fake_source = "pacman_source"
                 card_reader = "PacmanCardReader"
                 conf = pcr.Conf(link_confs = [pcr.LinkConfiguration(geoid = pcr.GeoID(system = SYSTEM_TYPE,
-                                                                                      region = RU_CONFIG[RUIDX]["region_id"],
+                                                                                      region = this_ru.region_id,
                                                                                       element = idx))
                                               for idx in range(MIN_LINK,MAX_LINK)],
                                 zmq_receiver_timeout = 10000)
@@ -302,16 +267,16 @@ def get_readout_app(RU_CONFIG=[],
         # mgraph.add_endpoint(f"timesync_{idx}", f"datahandler_{idx}.timesync",    Direction.OUT)
         if SOFTWARE_TPG_ENABLED:
             mgraph.add_endpoint(f"tpsets_ru{RUIDX}_link{idx}", f"datahandler_{idx}.tpset_out",    Direction.OUT)
-            mgraph.add_endpoint(f"timesync_{idx+RU_CONFIG[RUIDX]['channel_count']}", f"tp_datahandler_{idx}.timesync",    Direction.OUT)
+            mgraph.add_endpoint(f"timesync_{idx+this_ru.channel_count}", f"tp_datahandler_{idx}.timesync",    Direction.OUT)
 
         # Add fragment producers for raw data
-        mgraph.add_fragment_producer(region = RU_CONFIG[RUIDX]["region_id"], element = idx, system = SYSTEM_TYPE,
+        mgraph.add_fragment_producer(region = this_ru.region_id, element = idx, system = SYSTEM_TYPE,
                                      requests_in   = f"datahandler_{idx}.data_requests_0",
                                      fragments_out = f"datahandler_{idx}.fragment_queue")
 
         # Add fragment producers for TPC TPs. Make sure the element index doesn't overlap with the ones for raw data
         if SOFTWARE_TPG_ENABLED:
-            mgraph.add_fragment_producer(region = RU_CONFIG[RUIDX]["region_id"], element = idx + total_link_count, system = SYSTEM_TYPE,
+            mgraph.add_fragment_producer(region = this_ru.region_id, element = idx + total_link_count, system = SYSTEM_TYPE,
                                          requests_in   = f"tp_datahandler_{idx}.data_requests_0",
                                          fragments_out = f"tp_datahandler_{idx}.fragment_queue")
 
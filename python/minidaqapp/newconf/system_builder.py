@@ -0,0 +1,663 @@
+"""
+Generation of the "newconf" MiniDAQ system, without the command line.
+
+    from minidaqapp.newconf.system_builder import MDAppOptions, build_system, write_config
+
+    opts = MDAppOptions(host_ru=('np04-srv-021', 'np04-srv-022'), enable_dqm=True)
+    the_system = build_system(opts)
+    write_config(the_system, opts, 'mdapp_config')
+
+MDAppOptions has one field per option of newconf.mdapp_multiru_gen, with
+the same defaults; the command line is a thin wrapper around these
+functions. The options are frozen: use dataclasses.replace(opts, ...) to
+derive variants. Nothing is printed unless a `log` function (e.g. a rich
+console's log) is given. The schemas and generator modules are loaded
+once per process, so generating many variants from one script only
+pays for that once.
+"""
+
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Optional, Tuple
+
+from ..topology import FelixLayout, build_topology
+
+CLOCK_SPEED_HZ = 50000000
+
+@lru_cache(maxsize=None)
+def _load_inventory(path):
+    # Shared by the options derived with replace(), e.g. by the placement
+    from ..inventory import HostInventory
+    return HostInventory.load(path)
+
+@dataclass(frozen=True)
+class MDAppOptions:
+    """Options of a MiniDAQ system, as given to newconf.mdapp_multiru_gen"""
+    global_partition_name: str = 'global'
+    host_global: str = 'np04-srv-012.cern.ch'
+    port_global: int = 12345
+    partition_name: str = '${USER}_test'
+    number_of_data_producers: int = 2
+    emulator_mode: bool = False
+    data_rate_slowdown_factor: int = 1
+    run_number: int = 333
+    trigger_rate_hz: float = 1.0
+    trigger_window_before_ticks: int = 1000
+    trigger_window_after_ticks: int = 1000
+    token_count: int = 10
+    data_file: str = './frames.bin'
+    output_path: str = '.'
+    disable_trace: bool = False
+    use_felix: bool = False
+    use_ssp: bool = False
+    host_df: Tuple[str, ...] = ('localhost',)
+    host_dfo: str = 'localhost'
+    host_ru: Tuple[str, ...] = ('localhost',)
+    host_trigger: str = 'localhost'
+    host_hsi: str = 'localhost'
+    host_tprtc: str = 'localhost'
+    region_id: Tuple[int, ...] = (0,)
+    latency_buffer_size: int = 499968
+    # hsi readout options
+    hsi_hw_connections_file: str = '${TIMING_SHARE}/config/etc/connections.xml'
+    hsi_device_name: str = ''
+    hsi_readout_period: float = 1e3
+    # hw hsi options
+    control_hsi_hw: bool = False
+    hsi_endpoint_address: int = 1
+    hsi_endpoint_partition: int = 0
+    hsi_re_mask: int = 0x0
+    hsi_fe_mask: int = 0x0
+    hsi_inv_mask: int = 0x0
+    hsi_source: int = 0x1
+    # fake hsi options
+    use_hsi_hw: bool = False
+    hsi_device_id: int = 0
+    mean_hsi_signal_multiplicity: int = 1
+    hsi_signal_emulation_mode: int = 0
+    enabled_hsi_signals: int = 0b00000001
+    # trigger options
+    ttcm_s1: int = 1
+    ttcm_s2: int = 2
+    trigger_activity_plugin: str = 'TriggerActivityMakerPrescalePlugin'
+    trigger_activity_config: str = 'dict(prescale=100)'
+    trigger_candidate_plugin: str = 'TriggerCandidateMakerPrescalePlugin'
+    trigger_candidate_config: str = 'dict(prescale=100)'
+    # timing hw partition options
+    control_timing_partition: bool = False
+    timing_partition_master_device_name: str = ''
+    timing_partition_id: int = 0
+    timing_partition_trigger_mask: int = 0xff
+    timing_partition_rate_control_enabled: bool = False
+    timing_partition_spill_gate_enabled: bool = False
+
+    enable_raw_recording: bool = False
+    raw_recording_output_dir: str = '.'
+    frontend_type: str = 'wib'
+    enable_dqm: bool = False
+    opmon_impl: str = 'json'
+    ers_impl: str = 'local'
+    dqm_impl: str = 'local'
+    pocket_url: str = '127.0.0.1'
+    enable_software_tpg: bool = False
+    tpg_channel_map: str = 'ProtoDUNESP1ChannelMap'
+    enable_tpset_writing: bool = False
+    use_fake_data_producers: bool = False
+    dqm_cmap: str = 'HD'
+    dqm_rawdisplay_params: Tuple[int, int, int] = (60, 10, 50)
+    dqm_meanrms_params: Tuple[int, int, int] = (10, 1, 100)
+    dqm_fourier_params: Tuple[int, int, int] = (600, 60, 100)
+    dqm_fouriersum_params: Tuple[int, int, int] = (600, 60, 1000)
+    op_env: str = 'swtest'
+    tpc_region_name_prefix: str = 'APA'
+    max_file_size: int = 4*1024*1024*1024
+    # Host inventory file (see minidaqapp.inventory)
+    host_inventory: Optional[str] = None
+    # "HOST:CARD_ID:NUMA_NODE" overrides of the NUMA nodes of the FELIX cards
+    card_numa_node: Tuple[str, ...] = ()
+    # Layout of the FELIX links (see topology.FelixLayout)
+    felix_cards_per_ru: int = 1
+    felix_logical_units: int = 2
+    felix_links_per_unit: Optional[int] = None
+    felix_balance_links: bool = False
+    # Number of processes used to build the apps and render their command data
+    jobs: int = 1
+    debug: bool = False
+
+    def check(self):
+        """Raise ValueError if the options are inconsistent"""
+        if self.enable_software_tpg and self.frontend_type != 'wib':
+            raise ValueError("Software TPG is only available for the wib at the moment!")
+
+        if self.enable_software_tpg and self.use_fake_data_producers:
+            raise ValueError("Fake data producers don't support software tpg")
+
+        if self.use_fake_data_producers and self.enable_dqm:
+            raise ValueError("DQM can't be used with fake data producers")
+
+        if self.enable_tpset_writing and not self.enable_software_tpg:
+            raise ValueError("TPSet writing can only be used when software TPG is enabled")
+
+        if self.jobs < 1:
+            raise ValueError("--jobs should be at least 1!")
+
+        if (len(self.region_id) != len(self.host_ru)) and (len(self.region_id) != 1):
+            raise ValueError("--region-id should be specified either once only or once for each --host-ru!")
+
+        if self.use_felix:
+            self.felix_layout().check(self.number_of_data_producers)
+            self.felix_cards
+
+    def felix_layout(self):
+        """The topology.FelixLayout of the FELIX links"""
+        return FelixLayout(cards_per_ru=self.felix_cards_per_ru,
+                           logical_units=self.felix_logical_units,
+                           links_per_unit=self.felix_links_per_unit,
+                           balance=self.felix_balance_links)
+
+    @property
+    def inventory(self):
+        """The inventory.HostInventory of --host-inventory, or None; read once"""
+        if not self.host_inventory:
+            return None
+        return _load_inventory(self.host_inventory)
+
+    @cached_property
+    def felix_cards(self):
+        """
+        {RU index: {card id: inventory.FelixCard}} of the FELIX cards read
+        by each RU, for the RUs whose host is in --host-inventory or
+        --card-numa-node. Raises ValueError if such a host doesn't list
+        one of the RU's cards
+        """
+        from ..inventory import felix_cards
+        if not self.host_inventory and not self.card_numa_node:
+            return {}
+        inventory = self.inventory
+        cards = felix_cards(inventory, self.card_numa_node)
+        described_hosts = {host for host, _ in cards} | (set(inventory.hosts) if inventory else set())
+        layout = self.felix_layout()
+        ru_cards = {}
+        for ru in build_topology(self.host_ru, self.region_id, self.number_of_data_producers):
+            if ru.host not in described_hosts:
+                continue
+            ru_cards[ru.index] = {}
+            for card_id in layout.card_ids(ru):
+                card = cards.get((ru.host, card_id))
+                if card is None:
+                    raise ValueError(f"RU {ru.index} reads FELIX card {card_id} of {ru.host}, which has no such card in the inventory")
+                ru_cards[ru.index][card_id] = card
+        return ru_cards
+
+def _no_log(*args, **kwargs):
+    pass
+
+def load_system_types():
+    """
+    Load the schemas and appfwk classes needed to assemble the System.
+
+    This is deliberately not done at module level, so that option
+    parsing, -h and the consistency checks don't pay for loading any
+    schemas.
+    """
+    from ..schema_registry import registry
+    nwmgr = registry.load('networkmanager/nwmgr.jsonnet', __name__)
+
+    from appfwk.system import System
+    from appfwk.conf_utils import AppConnection
+    return nwmgr, System, AppConnection
+
+def boot_settings(opts):
+    """Return the opmon URI, the ERS settings and whether Kafka is used, for boot.json"""
+    if opts.opmon_impl == 'cern':
+        info_svc_uri = "influx://188.185.88.195:80/write?db=db1"
+    elif opts.opmon_impl == 'pocket':
+        info_svc_uri = "influx://" + opts.pocket_url + ":31002/write?db=influxdb"
+    else:
+        info_svc_uri = "file://info_${APP_NAME}_${APP_PORT}.json"
+
+
+    ers_settings=dict()
+
+    if opts.ers_impl == 'cern':
+        use_kafka = True
+        ers_settings["INFO"] =    "erstrace,throttle,lstdout,erskafka(dqmbroadcast:9092)"
+        ers_settings["WARNING"] = "erstrace,throttle,lstdout,erskafka(dqmbroadcast:9092)"
+        ers_settings["ERROR"] =   "erstrace,throttle,lstdout,erskafka(dqmbroadcast:9092)"
+        ers_settings["FATAL"] =   "erstrace,lstdout,erskafka(dqmbroadcast:9092)"
+    elif opts.ers_impl == 'pocket':
+        use_kafka = True
+        ers_settings["INFO"] =    "erstrace,throttle,lstdout,erskafka(" + opts.pocket_url + ":30092)"
+        ers_settings["WARNING"] = "erstrace,throttle,lstdout,erskafka(" + opts.pocket_url + ":30092)"
+        ers_settings["ERROR"] =   "erstrace,throttle,lstdout,erskafka(" + opts.pocket_url + ":30092)"
+        ers_settings["FATAL"] =   "erstrace,lstdout,erskafka(" + opts.pocket_url + ":30092)"
+    else:
+        use_kafka = False
+        ers_settings["INFO"] =    "erstrace,throttle,lstdout"
+        ers_settings["WARNING"] = "erstrace,throttle,lstdout"
+        ers_settings["ERROR"] =   "erstrace,throttle,lstdout"
+        ers_settings["FATAL"] =   "erstrace,lstdout"
+
+    return info_svc_uri, ers_settings, use_kafka
+
+def build_system(opts, log=None, timer=None):
+    """
+    Build the System described by `opts` (an MDAppOptions), with all its
+    apps, connections and network endpoints. `log`, if given, is called
+    like console.log with progress messages; `timer` is a StageTimer.
+    """
+    opts.check()
+    if log is None:
+        log = _no_log
+    if timer is None:
+        from ..profiling import StageTimer
+        timer = StageTimer()
+
+    nwmgr, System, AppConnection = timer.timed(load_system_types)()
+
+    with timer.stage("import generators"):
+        log("Loading dataflow config generator")
+        from .dataflow_gen import get_dataflow_app
+        if opts.enable_dqm:
+            log("Loading dqm config generator")
+            from .dqm_gen import get_dqm_app
+        log("Loading readout config generator")
+        from .readout_gen import get_readout_app
+        log("Loading trigger config generator")
+        from .trigger_gen import get_trigger_app
+        log("Loading DFO config generator")
+        from .dfo_gen import get_dfo_app
+        log("Loading hsi config generator")
+        from .hsi_gen import get_hsi_app
+        log("Loading fake hsi config generator")
+        from .fake_hsi_gen import get_fake_hsi_app
+        log("Loading timing partition controller config generator")
+        from .tprtc_gen import get_tprtc_app
+        from .app_pool import build_apps
+
+    # The readout, dqm and dataflow generators are timed by build_apps()
+    get_trigger_app = timer.timed(get_trigger_app)
+    get_dfo_app = timer.timed(get_dfo_app)
+    get_hsi_app = timer.timed(get_hsi_app)
+    get_fake_hsi_app = timer.timed(get_fake_hsi_app)
+    get_tprtc_app = timer.timed(get_tprtc_app)
+
+    log(f"Generating configs for hosts trigger={opts.host_trigger} DFO={opts.host_dfo} dataflow={opts.host_df} readout={opts.host_ru} hsi={opts.host_hsi} dqm={opts.host_ru}")
+
+    the_system = System(opts.partition_name, first_port=opts.port_global)
+   
+    total_number_of_data_producers = 0
+
+    if opts.use_ssp:
+        total_number_of_data_producers = opts.number_of_data_producers * len(opts.host_ru)
+        log(f"Will setup {opts.number_of_data_producers} SSP channels per host, for a total of {total_number_of_data_producers}")
+    else:
+        total_number_of_data_producers = opts.number_of_data_producers * len(opts.host_ru)
+        log(f"Will setup {opts.number_of_data_producers} TPC channels per host, for a total of {total_number_of_data_producers}")
+
+    if opts.token_count > 0:
+        trigemu_token_count = opts.token_count
+    else:
+        trigemu_token_count = 0
+
+    if opts.frontend_type == 'wib' or opts.frontend_type == 'wib2':
+        system_type = 'TPC'
+    elif opts.frontend_type == 'pacman':
+        system_type = 'NDLArTPC'
+    else:
+        system_type = 'PDS'
+
+    dqm_kafka_address = "dqmbroadcast:9092" if opts.dqm_impl == 'cern' else opts.pocket_url + ":30092" if opts.dqm_impl == 'pocket' else ''
+
+    if opts.control_hsi_hw or opts.control_timing_partition:
+        the_system.network_endpoints.append(nwmgr.Connection(name=f"{opts.global_partition_name}.timing_cmds",  topics=[], address="tcp://{"+opts.host_global+"}:"+f"{opts.port_global}"))
+
+    topology = build_topology(opts.host_ru, opts.region_id, opts.number_of_data_producers)
+    ru_cards = opts.felix_cards if opts.use_felix else {}
+
+    ru_app_names=[f"ruflx{idx}" if opts.use_felix else f"ruemu{idx}" for idx in range(len(opts.host_ru))]
+    dqm_app_names = [f"dqm{idx}" for idx in range(len(opts.host_ru))]
+    
+    for hostidx,ru_host in enumerate(ru_app_names):
+        if opts.enable_dqm:
+            the_system.network_endpoints.append(nwmgr.Connection(name=f"{opts.partition_name}.fragx_dqm_{hostidx}", topics=[], address=f"tcp://{{host_{ru_host}}}:{the_system.next_unassigned_port()}"))
+
+        the_system.network_endpoints.append(nwmgr.Connection(name=f"{opts.partition_name}.datareq_{hostidx}", topics=[], address=f"tcp://{{host_{ru_host}}}:{the_system.next_unassigned_port()}"))
+
+        # Should end up something like 'network_endpoints[timesync_0]:
+        # "tcp://{host_ru0}:12347"'
+        the_system.network_endpoints.append(nwmgr.Connection(name=f"{opts.partition_name}.timesync_{hostidx}", topics=["Timesync"], address=f"tcp://{{host_{ru_host}}}:{the_system.next_unassigned_port()}"))
+
+    if opts.use_hsi_hw:
+        the_system.apps["hsi"] = get_hsi_app(
+            RUN_NUMBER = opts.run_number,
+            CLOCK_SPEED_HZ = CLOCK_SPEED_HZ,
+            TRIGGER_RATE_HZ = opts.trigger_rate_hz,
+            CONTROL_HSI_HARDWARE=opts.control_hsi_hw,
+            CONNECTIONS_FILE=opts.hsi_hw_connections_file,
+            READOUT_PERIOD_US = opts.hsi_readout_period,
+            HSI_DEVICE_NAME = opts.hsi_device_name,
+            HSI_ENDPOINT_ADDRESS = opts.hsi_endpoint_address,
+            HSI_ENDPOINT_PARTITION = opts.hsi_endpoint_partition,
+            HSI_RE_MASK=opts.hsi_re_mask,
+            HSI_FE_MASK=opts.hsi_fe_mask,
+            HSI_INV_MASK=opts.hsi_inv_mask,
+            HSI_SOURCE=opts.hsi_source,
+            PARTITION=opts.partition_name,
+            GLOBAL_PARTITION=opts.global_partition_name,
+            HOST=opts.host_hsi,
+            DEBUG=opts.debug)
+    else:
+        the_system.apps["hsi"] = get_fake_hsi_app(
+            RUN_NUMBER = opts.run_number,
+            CLOCK_SPEED_HZ = CLOCK_SPEED_HZ,
+            DATA_RATE_SLOWDOWN_FACTOR = opts.data_rate_slowdown_factor,
+            TRIGGER_RATE_HZ = opts.trigger_rate_hz,
+            HSI_DEVICE_ID = opts.hsi_device_id,
+            MEAN_SIGNAL_MULTIPLICITY = opts.mean_hsi_signal_multiplicity,
+            SIGNAL_EMULATION_MODE = opts.hsi_signal_emulation_mode,
+            ENABLED_SIGNALS =  opts.enabled_hsi_signals,
+            PARTITION=opts.partition_name,
+            HOST=opts.host_hsi,
+            DEBUG=opts.debug)
+    
+    if opts.control_hsi_hw and opts.use_hsi_hw:
+        the_system.app_connections[f"hsi.timing_cmds"] = AppConnection(nwmgr_connection=f"{opts.global_partition_name}.timing_cmds",
+                                                                            msg_type="dunedaq::timinglibs::timingcmd::TimingHwCmd",
+                                                                            msg_module_name="TimingHwCmdNQ",
+                                                                            topics=[],
+                                                                            receivers=[])
+
+        # the_system.apps["hsi"] = util.App(modulegraph=mgraph_hsi, host=host_hsi)
+    if opts.debug: log("hsi cmd data:", the_system.apps["hsi"])
+
+    if opts.control_timing_partition:
+        the_system.apps["tprtc"] = get_tprtc_app(
+            MASTER_DEVICE_NAME=opts.timing_partition_master_device_name,
+            TIMING_PARTITION=opts.timing_partition_id,
+            TRIGGER_MASK=opts.timing_partition_trigger_mask,
+            RATE_CONTROL_ENABLED=opts.timing_partition_rate_control_enabled,
+            SPILL_GATE_ENABLED=opts.timing_partition_spill_gate_enabled,
+            PARTITION=opts.partition_name,
+            GLOBAL_PARTITION=opts.global_partition_name,
+            HOST=opts.host_tprtc,
+            DEBUG=opts.debug)
+        the_system.app_connections[f"tprtc.timing_cmds"] = AppConnection(nwmgr_connection=f"{opts.global_partition_name}.timing_cmds",
+                                                                            msg_type="dunedaq::timinglibs::timingcmd::TimingHwCmd",
+                                                                            msg_module_name="TimingHwCmdNQ",
+                                                                            topics=[],
+                                                                            receivers=[])
+
+    the_system.apps['trigger'] = get_trigger_app(
+        SOFTWARE_TPG_ENABLED = opts.enable_software_tpg,
+        TOPOLOGY = topology,
+        ACTIVITY_PLUGIN = opts.trigger_activity_plugin,
+        ACTIVITY_CONFIG = eval(opts.trigger_activity_config),
+        CANDIDATE_PLUGIN = opts.trigger_candidate_plugin,
+        CANDIDATE_CONFIG = eval(opts.trigger_candidate_config),
+        SYSTEM_TYPE = system_type,
+        TTCM_S1=opts.ttcm_s1,
+        TTCM_S2=opts.ttcm_s2,
+        TRIGGER_WINDOW_BEFORE_TICKS = opts.trigger_window_before_ticks,
+        TRIGGER_WINDOW_AFTER_TICKS = opts.trigger_window_after_ticks,
+        PARTITION=opts.partition_name,
+        HOST=opts.host_trigger,
+        DEBUG=opts.debug)
+
+    the_system.apps['dfo'] = get_dfo_app(
+        DF_COUNT = len(opts.host_df),
+        TOKEN_COUNT = trigemu_token_count,
+        PARTITION=opts.partition_name,
+        HOST=opts.host_dfo,
+        DEBUG=opts.debug)
+
+    # log("trigger cmd data:", cmd_data_trigger)
+
+    #-------------------------------------------------------------------
+    # Readout apps
+    
+    # Set up the nwmgr endpoints for TPSets
+    if opts.enable_software_tpg:
+        for apa_idx,ru_app_name in enumerate(ru_app_names):
+            for link in topology[apa_idx].links:
+                the_system.network_endpoints.append(nwmgr.Connection(name=f"{opts.partition_name}.tpsets_apa{apa_idx}_link{link}", topics=["TPSets"], address = f"tcp://{{host_{ru_app_name}}}:{the_system.next_unassigned_port()}"))
+
+
+    # The readout, dqm and dataflow apps are independent of each other
+    # until the fragment producers get connected, so they can be built
+    # in parallel (with --jobs). app_specs keeps the order in which
+    # they are added to the system
+    app_specs = []
+    for i,host in enumerate(opts.host_ru):
+        ru_name = ru_app_names[i]
+        app_specs.append((ru_name, get_readout_app, dict(
+            PARTITION=opts.partition_name,
+            TOPOLOGY = topology,
+            EMULATOR_MODE = opts.emulator_mode,
+            DATA_RATE_SLOWDOWN_FACTOR = opts.data_rate_slowdown_factor,
+            DATA_FILE = opts.data_file,
+            FLX_INPUT = opts.use_felix,
+            SSP_INPUT = opts.use_ssp,
+            CLOCK_SPEED_HZ = CLOCK_SPEED_HZ,
+            RUIDX = i,
+            RAW_RECORDING_ENABLED = opts.enable_raw_recording,
+            RAW_RECORDING_OUTPUT_DIR = opts.raw_recording_output_dir,
+            FRONTEND_TYPE = opts.frontend_type,
+            SYSTEM_TYPE = system_type,
+            SOFTWARE_TPG_ENABLED = opts.enable_software_tpg,
+            TPG_CHANNEL_MAP = opts.tpg_channel_map,
+            USE_FAKE_DATA_PRODUCERS = opts.use_fake_data_producers,
+            HOST=host,
+            LATENCY_BUFFER_SIZE=opts.latency_buffer_size,
+            FELIX_LAYOUT=opts.felix_layout(),
+            FELIX_CARDS=ru_cards.get(i, {}),
+            DEBUG=opts.debug)))
+
+        if opts.enable_dqm:
+            dqm_name = dqm_app_names[i]
+            app_specs.append((dqm_name, get_dqm_app, dict(
+                TOPOLOGY = topology,
+                RU_NAME=ru_name,
+                EMULATOR_MODE = opts.emulator_mode,
+                DATA_RATE_SLOWDOWN_FACTOR = opts.data_rate_slowdown_factor,
+                RUN_NUMBER = opts.run_number,
+                DATA_FILE = opts.data_file,
+                CLOCK_SPEED_HZ = CLOCK_SPEED_HZ,
+                RUIDX = i,
+                SYSTEM_TYPE = system_type,
+                DQM_ENABLED=opts.enable_dqm,
+                DQM_KAFKA_ADDRESS=dqm_kafka_address,
+                DQM_CMAP=opts.dqm_cmap,
+                DQM_RAWDISPLAY_PARAMS=opts.dqm_rawdisplay_params,
+                DQM_MEANRMS_PARAMS=opts.dqm_meanrms_params,
+                DQM_FOURIER_PARAMS=opts.dqm_fourier_params,
+                DQM_FOURIERSUM_PARAMS=opts.dqm_fouriersum_params,
+                PARTITION=opts.partition_name,
+                HOST=host,
+                DEBUG=opts.debug)))
+
+    df_app_names = []
+    for i,host in enumerate(opts.host_df):
+        app_name = f'dataflow{i}'
+        df_app_names.append(app_name)
+        app_specs.append((app_name, get_dataflow_app, dict(
+            TOPOLOGY = topology,
+            HOSTIDX = i,
+            RUN_NUMBER = opts.run_number,
+            OUTPUT_PATH = opts.output_path,
+            SYSTEM_TYPE = system_type,
+            SOFTWARE_TPG_ENABLED = opts.enable_software_tpg,
+            TPSET_WRITING_ENABLED = opts.enable_tpset_writing,
+            PARTITION=opts.partition_name,
+            OPERATIONAL_ENVIRONMENT = opts.op_env,
+            TPC_REGION_NAME_PREFIX = opts.tpc_region_name_prefix,
+            MAX_FILE_SIZE = opts.max_file_size,
+            HOST=host,
+            DEBUG=opts.debug)))
+
+    if opts.jobs > 1:
+        # Load the schemas once here rather than in every worker
+        from ..schema_registry import registry
+        for generator in dict.fromkeys(spec[1] for spec in app_specs):
+            registry.preload(generator.__module__)
+        log(f"Building {len(app_specs)} readout, dqm and dataflow apps with {opts.jobs} processes")
+
+    with timer.stage("build_apps"):
+        built_apps = build_apps(app_specs, opts.jobs, timer)
+    for app_name, app in built_apps:
+        the_system.apps[app_name] = app
+        if opts.debug and not app_name.startswith("dataflow"):
+            log(f"{app_name} app: {app}")
+
+    for name,app in the_system.apps.items():
+        if app.name=="__app":
+            app.name=name
+
+    # TODO PAR 2021-12-11 Fix up the indexing here. There's one output
+    # endpoint per link in the ru apps (maybe there should just be one
+    # per app?), and all the TPSets from one RU go to the same TA
+    # input in the trigger app
+    if opts.enable_software_tpg:
+        for ruidx,ru_app_name in enumerate(ru_app_names):
+            ru = topology[ruidx]
+            apa_idx = ru.region_id
+            for link, global_link in enumerate(ru.links):
+                # PL 2022-02-02: global_link is needed here to have non-overlapping app connections if len(ru)>1 with the same region_id
+                # Adding the ru number here too, in case we have many region_ids
+                the_system.app_connections.update(
+                    {
+                        f"{ru_app_name}.tpsets_ru{ruidx}_link{global_link}":
+                        AppConnection(nwmgr_connection=f"{opts.partition_name}.tpsets_apa{apa_idx}_link{global_link}",
+                                      msg_type="dunedaq::trigger::TPSet",
+                                      msg_module_name="TPSetNQ",
+                                      topics=["TPSets"],
+                                      receivers=[f"trigger.tpsets_into_buffer_ru{ruidx}_link{link}",
+                                                 f"trigger.tpsets_into_chain_apa{apa_idx}"])
+                    })
+
+
+
+    for i,df_app_name in enumerate(df_app_names):
+        the_system.app_connections[f"dfo.trigger_decisions{i}"] = AppConnection(nwmgr_connection=f"{opts.partition_name}.trigdec_{i}",
+                                                                                    msg_type="dunedaq::dfmessages::TriggerDecision",
+                                                                                    msg_module_name="TriggerDecisionNQ",
+                                                                                    topics=[],
+                                                                                    receivers=[f"{df_app_name}.trigger_decisions"])
+    
+    the_system.app_connections["hsi.hsievents"] = AppConnection(nwmgr_connection=f"{opts.partition_name}.hsievents",
+                                                                topics=[],
+                                                                use_nwqa=False,
+                                                                receivers=["trigger.hsievents"])
+
+    the_system.app_connections["trigger.td_to_dfo"] = AppConnection(nwmgr_connection=f"{opts.partition_name}.td_mlt_to_dfo",
+                                                                topics=[],
+                                                                use_nwqa=False,
+                                                                receivers=["dfo.td_to_dfo"])
+
+    the_system.app_connections["dfo.df_busy_signal"] = AppConnection(nwmgr_connection=f"{opts.partition_name}.df_busy_signal",
+                                                                  topics=[],
+                                                                  use_nwqa=False,
+                                                                  receivers=["trigger.df_busy_signal"])
+ 
+    # TODO: How to do this more automatically?
+    the_system.network_endpoints.append(nwmgr.Connection(name=f"{the_system.partition_name}.triginh",
+                                                         topics=[],
+                                                         address=f"tcp://{{host_dfo}}:{the_system.next_unassigned_port()}"))
+                                                                            
+
+    from appfwk.conf_utils import connect_all_fragment_producers, add_network, set_mlt_links
+    connect_all_fragment_producers = timer.timed(connect_all_fragment_producers)
+    add_network = timer.timed(add_network)
+    set_mlt_links = timer.timed(set_mlt_links)
+    if opts.debug:
+        the_system.export("system_no_frag_prod_connection.dot")
+    connect_all_fragment_producers(the_system, verbose=opts.debug)
+    
+    # log("After connecting fragment producers, trigger mgraph:", the_system.apps['trigger'].modulegraph)
+    # log("After connecting fragment producers, the_system.app_connections:", the_system.app_connections)
+
+    set_mlt_links(the_system, "trigger", verbose=opts.debug)
+    mlt_links=the_system.apps["trigger"].modulegraph.get_module("mlt").conf.links
+    if opts.debug:
+        log(f"After set_mlt_links, mlt_links is {mlt_links}")
+    add_network("trigger", the_system, verbose=opts.debug)
+    add_network("dfo", the_system, verbose=opts.debug)
+
+    # # log("After adding network, trigger mgraph:", the_system.apps['trigger'].modulegraph)
+    add_network("hsi", the_system, verbose=opts.debug)
+    if opts.control_timing_partition:
+        add_network("tprtc", the_system, verbose=opts.debug)
+    for ru_app_name in ru_app_names:
+        add_network(ru_app_name, the_system, verbose=opts.debug)
+
+    for df_app_name in df_app_names:
+        add_network(df_app_name, the_system, verbose=opts.debug)
+    if opts.debug:
+        the_system.export("system.dot")
+
+    return the_system
+
+def write_config(the_system, opts, json_dir, update=False, json_format=None, timer=None, stream=False, extra_files=None):
+    """
+    Write the configuration of `the_system` to `json_dir`: the command
+    data of each app, the top-level command files and boot.json. Unless
+    `update` is set, `json_dir` must not exist. The files are written in
+    `json_format`, a config_writer.JsonFormat (indented JSON by default).
+    `extra_files` ({filename: data}) are written along, as JSON, e.g.
+    placement.json. Returns a config_writer.ConfigDelta.
+
+    With `stream`, the command data of the apps is rendered and written
+    one app at a time, and each app is removed from the_system.apps once
+    it is written, so that the memory use doesn't grow with the number of
+    apps; the_system can't be used afterwards.
+    """
+    from appfwk.conf_utils import make_app_command_data, make_system_command_datas, generate_boot
+    from ..config_writer import ConfigWriter, PRETTY, iter_command_files, render_command_files
+    if json_format is None:
+        json_format = PRETTY
+    if timer is None:
+        from ..profiling import StageTimer
+        timer = StageTimer()
+    make_app_command_data = timer.timed(make_app_command_data)
+    make_system_command_datas = timer.timed(make_system_command_datas)
+    generate_boot = timer.timed(generate_boot)
+
+    def get_command_data(name):
+        return make_app_command_data(the_system, the_system.apps[name], verbose=opts.debug)
+
+    def make_system_files():
+        system_command_datas = make_system_command_datas(the_system)
+        # Override the default boot.json with the one from minidaqapp
+        info_svc_uri, ers_settings, use_kafka = boot_settings(opts)
+        system_command_datas['boot'] = generate_boot(the_system.apps, partition_name=opts.partition_name, ers_settings=ers_settings,
+                                                     info_svc_uri=info_svc_uri, disable_trace=opts.disable_trace, use_kafka=use_kafka)
+        return system_command_datas
+
+    if stream:
+        # The top-level files and boot.json need all the apps, so they are made first
+        system_command_datas = make_system_files()
+        writer = ConfigWriter(json_dir, update=update, json_format=json_format)
+        with timer.stage("render and write app files"):
+            for name, command_files in iter_command_files(list(the_system.apps.keys()), get_command_data, opts.jobs, json_format):
+                writer.write_app_contents(name, command_files)
+                del the_system.apps[name]
+        with timer.stage("write files"):
+            writer.write_system(system_command_datas)
+            for filename, data in (extra_files or {}).items():
+                writer.write_file(filename, data)
+            return writer.finish()
+
+    # Render the per-app command data to JSON, in parallel with opts.jobs
+    with timer.stage("render_command_files"):
+        app_command_files = render_command_files(the_system.apps.keys(), get_command_data, opts.jobs, json_format)
+
+    system_command_datas = make_system_files()
+
+    with timer.stage("write files"):
+        writer = ConfigWriter(json_dir, update=update, json_format=json_format)
+        for name, command_files in app_command_files:
+            writer.write_app_contents(name, command_files)
+        writer.write_system(system_command_datas)
+        for filename, data in (extra_files or {}).items():
+            writer.write_file(filename, data)
+        return writer.finish()
@@ -1,27 +1,13 @@
-# Set moo schema search path
-from dunedaq.env import get_moo_model_path
-import moo.io
-moo.io.default_load_path = get_moo_model_path()
-
 # Load configuration types
 import moo.otypes
+from ..schema_registry import schema_types
 
-moo.otypes.load_types('trigger/triggeractivitymaker.jsonnet')
-moo.otypes.load_types('trigger/triggercandidatemaker.jsonnet')
-moo.otypes.load_types('trigger/triggerzipper.jsonnet')
-moo.otypes.load_types('trigger/moduleleveltrigger.jsonnet')
-moo.otypes.load_types('trigger/fakedataflow.jsonnet')
-moo.otypes.load_types('trigger/timingtriggercandidatemaker.jsonnet')
-moo.otypes.load_types('trigger/tpsetbuffercreator.jsonnet')
-
-# Import new types
-import dunedaq.trigger.triggeractivitymaker as tam
-import dunedaq.trigger.triggercandidatemaker as tcm
-import dunedaq.trigger.triggerzipper as tzip
-import dunedaq.trigger.moduleleveltrigger as mlt
-import dunedaq.trigger.fakedataflow as fdf
-import dunedaq.trigger.timingtriggercandidatemaker as ttcm
-import dunedaq.trigger.tpsetbuffercreator as buf
+tam = schema_types('trigger/triggeractivitymaker.jsonnet', __name__)
+tcm = schema_types('trigger/triggercandidatemaker.jsonnet', __name__)
+tzip = schema_types('trigger/triggerzipper.jsonnet', __name__)
+mlt = schema_types('trigger/moduleleveltrigger.jsonnet', __name__)
+ttcm = schema_types('trigger/timingtriggercandidatemaker.jsonnet', __name__)
+buf = schema_types('trigger/tpsetbuffercreator.jsonnet', __name__)
 
 from appfwk.app import App, ModuleGraph
 from appfwk.daqmodule import DAQModule
@@ -49,7 +35,7 @@ def make_moo_record(conf_dict,name,path='temptypes'):
 
 #===============================================================================
 def get_trigger_app(SOFTWARE_TPG_ENABLED: bool = False,
-                    RU_CONFIG: list = [],
+                    TOPOLOGY = None,
 
                     ACTIVITY_PLUGIN: str = 'TriggerActivityMakerPrescalePlugin',
                     ACTIVITY_CONFIG: dict = dict(prescale=10000),
@@ -85,18 +71,13 @@ def get_trigger_app(SOFTWARE_TPG_ENABLED: bool = False,
                               conf = config_tcm)]
         
         region_ids = set()
-        for ru in range(len(RU_CONFIG)):
+        for ru in TOPOLOGY:
             ## 1 zipper/TAM per region id
-            region_id = RU_CONFIG[ru]["region_id"]
-            skip=False
-            if region_id in region_ids: skip=True
+            region_id = ru.region_id
 
-            if not skip: # we only add Zipper/TAM is that region_id wasn't seen before (in a very clunky way)
+            if region_id not in region_ids: # we only add Zipper/TAM with the first RU of each region_id
                 region_ids.add(region_id)
-                cardinality = 0
-                for RU in RU_CONFIG:
-                    if RU['region_id'] == region_id:
-                        cardinality += RU['channel_count']
+                cardinality = TOPOLOGY.region_link_count(region_id)
                 modules += [DAQModule(name = f'zip_{region_id}',
                                       plugin = 'TPZipper',
                                               connections = {# 'input' are App.network_endpoints, from RU
@@ -118,14 +99,14 @@ def get_trigger_app(SOFTWARE_TPG_ENABLED: bool = False,
                                                       buffer_time=625000,  # 10ms in 62.5 MHz ticks
                                                       activity_maker_config=temptypes.ActivityConf(**ACTIVITY_CONFIG)))]
 
-            for idy in range(RU_CONFIG[ru]["channel_count"]):
+            for idy, element in enumerate(ru.links):
                 # 1 buffer per TPG channel
-                modules += [DAQModule(name = f'buf_ru{ru}_link{idy}',
+                modules += [DAQModule(name = f'buf_ru{ru.index}_link{idy}',
                                       plugin = 'TPSetBufferCreator',
                                       connections = {},#'tpset_source': Connection(f"tpset_q_for_buf{ru}_{idy}"),#already in request_receiver
                                       #'data_request_source': Connection(f"data_request_q{ru}_{idy}"), #ditto
                                       # 'fragment_sink': Connection('qton_fragments.fragment_q')},
-                                   conf = buf.Conf(tpset_buffer_size=10000, region=RU_CONFIG[ru]["region_id"], element=idy + RU_CONFIG[ru]["start_channel"]))]
+                                   conf = buf.Conf(tpset_buffer_size=10000, region=ru.region_id, element=element))]
 
     modules += [DAQModule(name = 'ttcm',
                           plugin = 'TimingTriggerCandidateMaker',
@@ -158,17 +139,18 @@ def get_trigger_app(SOFTWARE_TPG_ENABLED: bool = False,
     mgraph.add_endpoint("td_to_dfo", None, Direction.OUT)
     mgraph.add_endpoint("df_busy_signal", None, Direction.IN)
     if SOFTWARE_TPG_ENABLED:
-        for ruidx, ru_config in enumerate(RU_CONFIG):
+        for ru in TOPOLOGY:
+            ruidx = ru.index
             # 1 zipper input per region_id
             # PL 2022-02-02: Maybe need to check that we don't create twice the same endpoint?
-            mgraph.add_endpoint(f"tpsets_into_chain_apa{ru_config['region_id']}", f"zip_{ru_config['region_id']}.input", Direction.IN)
+            mgraph.add_endpoint(f"tpsets_into_chain_apa{ru.region_id}", f"zip_{ru.region_id}.input", Direction.IN)
 
-            for link_idx in range(ru_config["channel_count"]):
+            for link_idx, global_link in enumerate(ru.links):
                 # 1 buffer per link
                 buf_name=f'buf_ru{ruidx}_link{link_idx}'
-                global_link = link_idx+ru_config['start_channel'] # for the benefit of correct fragment geoid
+                # global_link is the element within the region, for the benefit of correct fragment geoid
                 mgraph.add_endpoint(f"tpsets_into_buffer_ru{ruidx}_link{link_idx}", f"{buf_name}.tpset_source", Direction.IN)
-                mgraph.add_fragment_producer(region=ru_config['region_id'], element=global_link, system="DataSelection",
+                mgraph.add_fragment_producer(region=ru.region_id, element=global_link, system="DataSelection",
                                              requests_in=f"{buf_name}.data_request_source",
                                              fragments_out=f"{buf_name}.fragment_sink")
 
@@ -0,0 +1,250 @@
+"""
+Placement of the apps of a newconf partition on the hosts of an inventory.
+
+    python -m minidaqapp.newconf.mdapp_multiru_gen --host-inventory hosts.json --plan-placement \\
+        --host-ru - --host-ru - --host-df - JSON_DIR
+
+With --plan-placement, the generator keeps the number of RUs and dataflow
+apps given by --host-ru and --host-df, but the hosts of the readout,
+DQM, dataflow, trigger, DFO, HSI (and timing partition controller) apps
+are chosen by plan_placement(), and the --host-* values are ignored.
+
+Each app gets an estimate of the cores, memory and network bandwidth it
+needs, from the options (number of links, frontend type, latency buffer
+size, software TPG...). These are nominal figures meant to balance the
+apps across hosts, not to account for every byte. The apps are then
+placed one at a time, the heaviest first, on the host where the most
+loaded of its resources (cores, memory or NIC) ends up the least loaded.
+On top of that:
+
+  - with --use-felix, an RU only goes to a host that still has free
+    FELIX cards (the first RU on a host reads card 0, the second card 1...,
+    or the next --felix-cards-per-ru cards)
+  - the dataflow apps only go to hosts with disks, if the inventory lists any
+  - a DQM app runs on the host of its RU, which it reads from
+
+The plan, with the reason for each choice, is printed and written to
+placement.json in the configuration directory.
+"""
+
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Tuple
+
+from .inventory import GIB
+from .topology import build_topology
+
+CLOCK_SPEED_HZ = 50000000
+
+# Nominal size (bytes) and rate (Hz, without slowdown) of the latency
+# buffer elements of one link, by frontend type
+FRONTEND_ELEMENTS = {
+    'wib':       (5568, CLOCK_SPEED_HZ / (25 * 12)),  # superchunks of 12 WIB frames
+    'wib2':      (5664, CLOCK_SPEED_HZ / (25 * 12)),  # superchunks of 12 WIB2 frames
+    'pds_queue': (7008, 100000.),                     # superchunks of 12 DAPHNE frames
+    'pds_list':  (7008, 100000.),
+    'pacman':    (816, 10000.),
+    'ssp':       (5568, 10000.),
+}
+
+# Capacity of the queues between the card readers and the DataLinkHandlers
+LINK_QUEUE_CAPACITY = 100000
+FELIX_DMA_MEMORY_GB = 4
+
+@dataclass
+class AppLoad:
+    """The resources an app is expected to use"""
+    name: str
+    cores: float
+    # GiB, like the memory_gb of the inventory
+    memory_gb: float
+    network_gbps: float
+    # Number of links, for the readout apps
+    links: int = 0
+
+def link_throughput_gbps(opts):
+    """Nominal data rate of one link, in Gb/s"""
+    element_bytes, rate_hz = FRONTEND_ELEMENTS[opts.frontend_type]
+    return element_bytes * rate_hz / opts.data_rate_slowdown_factor * 8 / 1e9
+
+def estimate_loads(opts):
+    """
+    {app name: AppLoad} for the apps of the partition described by
+    `opts` (an MDAppOptions), with the DQM apps folded into their RU
+    """
+    element_bytes, _ = FRONTEND_ELEMENTS[opts.frontend_type]
+    link_gbps = link_throughput_gbps(opts)
+    links = opts.number_of_data_producers
+    readout_window_s = (opts.trigger_window_before_ticks + opts.trigger_window_after_ticks) / CLOCK_SPEED_HZ
+    # Fragment data sent by one link to the dataflow apps
+    fragment_gbps = opts.trigger_rate_hz * readout_window_s * link_gbps
+
+    layout = opts.felix_layout()
+    topology = build_topology(opts.host_ru, opts.region_id, links)
+    loads = {}
+    for idx in range(len(opts.host_ru)):
+        name = f"ruflx{idx}" if opts.use_felix else f"ruemu{idx}"
+        card_readers = len(layout.readers(topology[idx])) if opts.use_felix else 1
+        cores = card_readers + 1.2 * links
+        memory = links * (opts.latency_buffer_size + LINK_QUEUE_CAPACITY) * element_bytes / GIB
+        network = links * fragment_gbps
+        if opts.use_felix:
+            memory += card_readers * FELIX_DMA_MEMORY_GB
+        if opts.enable_software_tpg:
+            cores += links
+            # TPSets to the trigger
+            network += 0.01 * links * link_gbps
+        if opts.enable_dqm:
+            cores += 1 + 0.1 * links
+            memory += 2
+        loads[name] = AppLoad(name, cores, memory, network, links)
+
+    df_count = len(opts.host_df)
+    total_links = links * len(opts.host_ru)
+    for idx in range(df_count):
+        network = total_links * fragment_gbps / df_count
+        loads[f"dataflow{idx}"] = AppLoad(f"dataflow{idx}", 2 + network / 10, 2, network)
+
+    loads["trigger"] = AppLoad("trigger", 1 + (0.1 * total_links if opts.enable_software_tpg else 0), 1,
+                               0.01 * total_links * link_gbps if opts.enable_software_tpg else 0.)
+    loads["dfo"] = AppLoad("dfo", 0.5, 0.5, 0.)
+    loads["hsi"] = AppLoad("hsi", 0.5, 0.5, 0.)
+    if opts.control_timing_partition:
+        loads["tprtc"] = AppLoad("tprtc", 0.5, 0.5, 0.)
+    return loads
+
+@dataclass
+class HostUsage:
+    cores: float = 0.
+    memory_gb: float = 0.
+    network_gbps: float = 0.
+    apps: List[str] = field(default_factory=list)
+
+    def fractions(self, host, load=None):
+        """(cores, memory, network) used on `host`, as fractions of its capacity, with `load` added if given"""
+        cores, memory, network = self.cores, self.memory_gb, self.network_gbps
+        if load is not None:
+            cores, memory, network = cores + load.cores, memory + load.memory_gb, network + load.network_gbps
+        return cores / host.cores, memory / host.memory_gb, network / host.nic_gbps
+
+@dataclass
+class PlacementPlan:
+    # {app name: host}
+    apps: Dict[str, str]
+    # [(app, host, AppLoad, reason)], in the order the apps were placed
+    justification: List[Tuple[str, str, AppLoad, str]]
+    usage: Dict[str, HostUsage]
+    warnings: List[str]
+
+    def apply(self, opts):
+        """`opts` with the --host-* options of the plan"""
+        ru_names = [f"ruflx{idx}" if opts.use_felix else f"ruemu{idx}" for idx in range(len(opts.host_ru))]
+        changes = dict(host_ru=tuple(self.apps[name] for name in ru_names),
+                       host_df=tuple(self.apps[f"dataflow{idx}"] for idx in range(len(opts.host_df))),
+                       host_trigger=self.apps["trigger"],
+                       host_dfo=self.apps["dfo"],
+                       host_hsi=self.apps["hsi"])
+        if "tprtc" in self.apps:
+            changes["host_tprtc"] = self.apps["tprtc"]
+        return replace(opts, **changes)
+
+    def command_line(self, opts):
+        """The --host-* options that give the same placement without the planner"""
+        planned = self.apply(opts)
+        options = [f"--host-ru {host}" for host in planned.host_ru] + [f"--host-df {host}" for host in planned.host_df]
+        options += [f"--host-trigger {planned.host_trigger}", f"--host-dfo {planned.host_dfo}", f"--host-hsi {planned.host_hsi}"]
+        if "tprtc" in self.apps:
+            options.append(f"--host-tprtc {planned.host_tprtc}")
+        return " ".join(options)
+
+    def as_dict(self, inventory):
+        """The plan as plain data, for placement.json"""
+        return {
+            "app_hosts": dict(sorted(self.apps.items())),
+            "hosts": {name: {"apps": usage.apps,
+                             "cores": round(usage.cores, 1), "cores_available": inventory[name].cores,
+                             "memory_gb": round(usage.memory_gb, 1), "memory_gb_available": inventory[name].memory_gb,
+                             "network_gbps": round(usage.network_gbps, 2), "network_gbps_available": inventory[name].nic_gbps}
+                      for name, usage in sorted(self.usage.items())},
+            "justification": [{"app": app, "host": host, "cores": round(load.cores, 1), "memory_gb": round(load.memory_gb, 1),
+                               "network_gbps": round(load.network_gbps, 2), "reason": reason}
+                              for app, host, load, reason in self.justification],
+            "warnings": self.warnings,
+        }
+
+    def format_table(self, inventory):
+        lines = [f"{'app':<12} {'host':<24} {'cores':>6} {'mem GiB':>8} {'net Gb/s':>9}  reason"]
+        for app, host, load, reason in self.justification:
+            lines.append(f"{app:<12} {host:<24} {load.cores:>6.1f} {load.memory_gb:>8.1f} {load.network_gbps:>9.2f}  {reason}")
+        lines.append("")
+        lines.append(f"{'host':<24} {'cores':>13} {'mem GiB':>15} {'net Gb/s':>15}  apps")
+        for name, usage in sorted(self.usage.items()):
+            host = inventory[name]
+            lines.append(f"{name:<24} {usage.cores:>6.1f}/{host.cores:<6} {usage.memory_gb:>7.1f}/{host.memory_gb:<7.0f} "
+                         f"{usage.network_gbps:>7.2f}/{host.nic_gbps:<7.0f}  {' '.join(usage.apps)}")
+        return "\n".join(lines)
+
+def plan_placement(opts, inventory):
+    """
+    Place the apps of the partition described by `opts` (an
+    MDAppOptions) on the hosts of `inventory` (a HostInventory). Returns
+    a PlacementPlan; raises ValueError if the constraints can't be met.
+    """
+    loads = estimate_loads(opts)
+    hosts = list(inventory)
+    usage = {host.name: HostUsage() for host in hosts}
+    disk_hosts = [host for host in hosts if host.disks]
+    placed = {}
+    justification = []
+    warnings = []
+
+    def heaviest_share(load):
+        # The share of an average host the app needs, on its most demanding resource
+        return max(load.cores / (sum(h.cores for h in hosts) / len(hosts)),
+                   load.memory_gb / (sum(h.memory_gb for h in hosts) / len(hosts)),
+                   load.network_gbps / (sum(h.nic_gbps for h in hosts) / len(hosts)))
+
+    def felix_card_ids(host):
+        # The cards the next FELIX RU placed on the host would read
+        ru_position = sum(1 for app in usage[host.name].apps if app.startswith("ruflx"))
+        return range(ru_position * opts.felix_cards_per_ru, (ru_position + 1) * opts.felix_cards_per_ru)
+
+    # The readout apps first, since they are the most constrained, then by decreasing size
+    order = sorted(loads.values(), key=lambda load: (not load.name.startswith("ru"), -heaviest_share(load)))
+    for load in order:
+        candidates = hosts
+        constraint = None
+        if load.name.startswith("ruflx"):
+            candidates = [host for host in hosts if all(host.felix_card(card_id) is not None for card_id in felix_card_ids(host))]
+            if not candidates:
+                raise ValueError(f"No host in the inventory has a free FELIX card for {load.name}")
+        elif load.name.startswith("dataflow") and disk_hosts:
+            candidates = disk_hosts
+            constraint = "has disks"
+
+        def score(host):
+            return max(usage[host.name].fractions(host, load))
+        best = min(candidates, key=score)
+        host_usage = usage[best.name]
+        if load.name.startswith("ruflx"):
+            constraint = "reads FELIX " + ", ".join(f"card {card_id} (NUMA node {best.felix_card(card_id).numa_node})" for card_id in felix_card_ids(best))
+        cores, memory, network = host_usage.fractions(best, load)
+        reason = f"least loaded after placement: cores {cores:.0%}, memory {memory:.0%}, NIC {network:.0%}"
+        if constraint:
+            reason = f"{constraint}; {reason}"
+        if max(cores, memory, network) > 1:
+            warnings.append(f"{load.name} overcommits {best.name}: cores {cores:.0%}, memory {memory:.0%}, NIC {network:.0%}")
+            reason += " (over capacity)"
+
+        host_usage.cores += load.cores
+        host_usage.memory_gb += load.memory_gb
+        host_usage.network_gbps += load.network_gbps
+        host_usage.apps.append(load.name)
+        placed[load.name] = best.name
+        justification.append((load.name, best.name, load, reason))
+        if opts.enable_dqm and load.name.startswith("ru"):
+            dqm_name = f"dqm{load.name[len('ruemu'):]}"
+            placed[dqm_name] = best.name
+            host_usage.apps.append(dqm_name)
+            justification.append((dqm_name, best.name, AppLoad(dqm_name, 0., 0., 0.), f"runs with {load.name} (counted in its load)"))
+
+    return PlacementPlan(placed, justification, {name: u for name, u in usage.items() if u.apps}, warnings)
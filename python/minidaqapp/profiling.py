@@ -0,0 +1,144 @@
+"""
+Per-stage timing of a generator run, for --profile.
+
+    timer = StageTimer(enabled=profile, pstats_file=..., tracemalloc_file=...)
+    timer.start()
+    with timer.stage("write files"):
+        ...
+    get_trigger_app = timer.timed(get_trigger_app)
+    ...
+    timer.finish()
+    console.log(timer.format_report())
+
+Stages can be nested: each one is reported with its total time and its
+self time, i.e. without the time spent in the stages nested in it, so
+the self times add up to the time covered by the stages. Schema loading
+is a stage of its own (the schema registry reports it to the timer), so
+a generator that triggers the load of a schema isn't charged for it.
+
+When the timer isn't enabled, stage() and timed() cost next to nothing.
+Stages that run in forked worker processes (with --jobs) are not seen.
+"""
+
+import cProfile
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+class StageStats:
+    """Accumulated timings of one stage"""
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total = 0.
+        self.self_time = 0.
+        self.max = 0.
+
+class StageTimer:
+    def __init__(self, enabled=False, pstats_file=None, tracemalloc_file=None):
+        self.enabled = enabled or bool(pstats_file) or bool(tracemalloc_file)
+        self.pstats_file = pstats_file
+        self.tracemalloc_file = tracemalloc_file
+        self._stats = {}
+        # Time spent in nested stages, one entry per currently open stage
+        self._children = []
+        self._profile = None
+        self._start = None
+        self.wall = 0.
+        self.peak_memory = None
+
+    def start(self):
+        """Start the clock, and the cProfile and tracemalloc collection if requested"""
+        if not self.enabled:
+            return
+        from .schema_registry import registry
+        registry.timer = self
+        if self.tracemalloc_file:
+            tracemalloc.start()
+        if self.pstats_file:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        """Context manager timing one execution of the stage `name`"""
+        if not self.enabled:
+            return nullcontext()
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name):
+        self._children.append(0.)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = StageStats(name)
+            stats.calls += 1
+            stats.total += elapsed
+            stats.self_time += elapsed - children
+            stats.max = max(stats.max, elapsed)
+
+    def timed(self, function, name=None):
+        """
+        Return `function` wrapped so that each call is a stage, named
+        after the function and its module (e.g. 'conf_utils.add_network')
+        """
+        if not self.enabled:
+            return function
+        if name is None:
+            module = function.__module__.rsplit('.', 1)[-1]
+            name = function.__qualname__ if module == '__main__' else f"{module}.{function.__qualname__}"
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with self._stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def finish(self):
+        """Stop the clock and write the pstats and tracemalloc files, if requested"""
+        if not self.enabled or self._start is None:
+            return
+        self.wall = time.perf_counter() - self._start
+        self._start = None
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.pstats_file)
+            self._profile = None
+        if self.tracemalloc_file:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.take_snapshot().dump(self.tracemalloc_file)
+            tracemalloc.stop()
+        from .schema_registry import registry
+        registry.timer = None
+
+    def report(self):
+        """Return the StageStats of every stage, by decreasing self time"""
+        return sorted(self._stats.values(), key=lambda s: s.self_time, reverse=True)
+
+    def summary(self):
+        """The timings so far as plain data: {"elapsed_ms": ..., "stages": {name: {"calls", "self_ms", "total_ms"}}}"""
+        elapsed = time.perf_counter() - self._start if self._start is not None else self.wall
+        return {"elapsed_ms": round(elapsed*1000, 1),
+                "stages": {stats.name: {"calls": stats.calls, "self_ms": round(stats.self_time*1000, 1), "total_ms": round(stats.total*1000, 1)}
+                           for stats in self.report()}}
+
+    def format_report(self):
+        lines = [f"{'stage':<50} {'calls':>6} {'self ms':>10} {'total ms':>10} {'max ms':>10}"]
+        covered = 0.
+        for stats in self.report():
+            covered += stats.self_time
+            lines.append(f"{stats.name:<50} {stats.calls:>6} {stats.self_time*1000:>10.1f} {stats.total*1000:>10.1f} {stats.max*1000:>10.1f}")
+        lines.append(f"{covered*1000:.1f} ms in the stages above, out of {self.wall*1000:.1f} ms")
+        if self.pstats_file:
+            lines.append(f"cProfile statistics written to {self.pstats_file} (python -m pstats {self.pstats_file})")
+        if self.tracemalloc_file:
+            lines.append(f"Peak traced memory {self.peak_memory/1e6:.1f} MB, tracemalloc snapshot written to {self.tracemalloc_file}")
+        return "\n".join(lines)
@@ -0,0 +1,132 @@
+"""
+On-disk cache of evaluated moo schemas.
+
+moo.otypes.load_types() spends nearly all of its time evaluating the
+jsonnet schema files. What comes out of that evaluation is plain JSON,
+so we keep it in a cache directory, keyed by the moo model path and by
+the content of the schema file and of every file it imports. A warm
+load reads the JSON back and makes the types without running jsonnet
+at all.
+
+The cache lives in $MINIDAQAPP_SCHEMA_CACHE if that is set, otherwise
+in $XDG_CACHE_HOME/minidaqapp/moo_schemas (~/.cache/... by default).
+Setting MINIDAQAPP_SCHEMA_CACHE to an empty string disables it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from dunedaq.env import get_moo_model_path
+import moo.io
+import moo.otypes
+
+# Bump this whenever the layout of the cache entries changes
+CACHE_FORMAT_VERSION = 1
+
+CACHE_DIR_ENV = "MINIDAQAPP_SCHEMA_CACHE"
+
+_import_re = re.compile(r'''\bimport(?:str|bin)?\s*(['"])(.+?)\1''')
+
+def cache_dir():
+    """Return the schema cache directory, or None if caching is disabled"""
+    if CACHE_DIR_ENV in os.environ:
+        return os.environ[CACHE_DIR_ENV] or None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "minidaqapp", "moo_schemas")
+
+def _search_path():
+    path = moo.io.default_load_path or get_moo_model_path()
+    if isinstance(path, str):
+        path = path.split(":")
+    return [str(p) for p in path]
+
+def _resolve(filename, search_path, importer_dir=None):
+    # jsonnet looks next to the importing file first, then along the library path
+    candidates = [importer_dir] if importer_dir else []
+    for directory in candidates + search_path:
+        candidate = os.path.join(directory, filename)
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+def schema_key(filename, search_path=None):
+    """
+    Compute the cache key for a schema file: a hash over the search path
+    and the content of the schema and everything it (transitively)
+    imports. Returns None if the schema file can't be found, in which
+    case the caller should fall back to a plain load.
+    """
+    if search_path is None:
+        search_path = _search_path()
+    top = _resolve(filename, search_path)
+    if top is None:
+        return None
+
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_FORMAT_VERSION}\0{filename}\0".encode())
+    digest.update("\0".join(search_path).encode())
+
+    seen = set()
+    pending = [top]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        with open(current, 'rb') as f:
+            content = f.read()
+        digest.update(b"\0" + current.encode() + b"\0" + hashlib.sha256(content).digest())
+        for match in _import_re.finditer(content.decode(errors="replace")):
+            dep = _resolve(match.group(2), search_path, os.path.dirname(current))
+            if dep is not None:
+                pending.append(dep)
+    return digest.hexdigest()
+
+def _read_entry(path, filename):
+    try:
+        with open(path, 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("version") != CACHE_FORMAT_VERSION or entry.get("filename") != filename:
+        return None
+    return entry["schema"]
+
+def _write_entry(directory, path, filename, schema):
+    # Write to a temporary file and rename it into place, so that
+    # concurrent generator runs never see a half-written entry
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"version": CACHE_FORMAT_VERSION, "filename": filename, "schema": schema}, f)
+        os.replace(tmp, path)
+    except OSError:
+        # A read-only or full cache directory is not an error, we just
+        # lose the speedup
+        pass
+
+def load_schema(filename):
+    """
+    Return the evaluated schema (a list of type descriptions) for a
+    schema file, from the cache if possible
+    """
+    directory = cache_dir()
+    search_path = _search_path()
+    key = schema_key(filename, search_path) if directory else None
+    if key is None:
+        return moo.io.load(filename, search_path)
+
+    path = os.path.join(directory, key + ".json")
+    schema = _read_entry(path, filename)
+    if schema is None:
+        schema = moo.io.load(filename, search_path)
+        _write_entry(directory, path, filename, schema)
+    return schema
+
+def load_types(filename):
+    """Drop-in replacement for moo.otypes.load_types() that goes through the cache"""
+    return [moo.otypes.make_type(**one) for one in load_schema(filename)]
@@ -0,0 +1,136 @@
+"""
+Single place where the generators get their moo schema types from.
+
+Each generator module declares the schemas it uses:
+
+    from ..schema_registry import schema_types
+    rconf = schema_types('readoutlibs/readoutconfig.jsonnet', __name__)
+
+and then uses `rconf` exactly like `import dunedaq.readoutlibs.readoutconfig
+as rconf`. The schema is only loaded (through the on-disk schema cache)
+the first time one of its types is accessed, and it is loaded once per
+process however many generators ask for it.
+
+Every load is timed and charged to the generator that triggered it, so
+that `registry.report()` tells which generator pays for which schema.
+"""
+
+import importlib
+import time
+from contextlib import nullcontext
+
+from dunedaq.env import get_moo_model_path
+import moo.io
+
+from .schema_cache import load_types
+
+# appfwk loads its own schemas when it is imported, so the search path
+# has to be in place before any generator module gets that far
+moo.io.default_load_path = get_moo_model_path()
+
+def module_name(filename):
+    """'readoutlibs/readoutconfig.jsonnet' -> 'dunedaq.readoutlibs.readoutconfig'"""
+    if filename.endswith('.jsonnet'):
+        filename = filename[:-len('.jsonnet')]
+    return 'dunedaq.' + filename.replace('/', '.')
+
+class SchemaRecord:
+    """Bookkeeping for one schema file"""
+    def __init__(self, filename):
+        self.filename = filename
+        self.module_name = module_name(filename)
+        self.module = None
+        self.load_seconds = 0.
+        self.loaded_by = None
+        self.requesters = []
+
+class SchemaTypes:
+    """
+    Stand-in for a dunedaq.<package>.<schema> types module, which loads
+    the schema on first attribute access
+    """
+    def __init__(self, registry, filename, requester):
+        self._registry = registry
+        self._filename = filename
+        self._requester = requester
+        self._module = None
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._module is None:
+            self._module = self._registry.load(self._filename, self._requester)
+        return getattr(self._module, name)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<schema types {self._filename} ({state})>"
+
+class SchemaRegistry:
+    def __init__(self):
+        self._records = {}
+        self._load_order = []
+        # A profiling.StageTimer, set while a generator runs with --profile
+        self.timer = None
+
+    def _record(self, filename, requester):
+        record = self._records.get(filename)
+        if record is None:
+            record = self._records[filename] = SchemaRecord(filename)
+        if requester is not None and requester not in record.requesters:
+            record.requesters.append(requester)
+        return record
+
+    def types(self, filename, requester=None):
+        """Declare that `requester` uses `filename`, and return its (lazy) types module"""
+        self._record(filename, requester)
+        return SchemaTypes(self, filename, requester)
+
+    def load(self, filename, requester=None):
+        """Load `filename` now, if that hasn't happened yet, and return its types module"""
+        record = self._record(filename, requester)
+        if record.module is None:
+            with self.timer.stage("schema loading") if self.timer else nullcontext():
+                start = time.perf_counter()
+                load_types(filename)
+                record.module = importlib.import_module(record.module_name)
+                record.load_seconds = time.perf_counter() - start
+            record.loaded_by = requester
+            self._load_order.append(filename)
+        return record.module
+
+    def preload(self, requester):
+        """
+        Load every schema that `requester` declared. Used before forking
+        worker processes, so that the schemas are loaded only once and
+        the types of the objects the workers send back exist in the parent.
+        """
+        for record in list(self._records.values()):
+            if requester in record.requesters:
+                self.load(record.filename, requester)
+
+    def report(self):
+        """
+        Return one row per schema, in the order they were loaded:
+        (filename, seconds, generator that paid for the load, all generators using it).
+        Schemas that were declared but never needed come last with no time.
+        """
+        loaded = [self._records[f] for f in self._load_order]
+        unused = [r for r in self._records.values() if r.module is None]
+        return [(r.filename, r.load_seconds, r.loaded_by, list(r.requesters)) for r in loaded + unused]
+
+    def format_report(self):
+        lines = []
+        total = 0.
+        for filename, seconds, loaded_by, requesters in self.report():
+            total += seconds
+            paid = f"{seconds*1000:7.1f} ms  {loaded_by}" if loaded_by else "   not loaded"
+            lines.append(f"{filename:<50} {paid}  (used by {', '.join(requesters)})")
+        lines.append(f"{len(self._load_order)} schemas loaded in {total*1000:.1f} ms")
+        return "\n".join(lines)
+
+registry = SchemaRegistry()
+
+def schema_types(filename, requester=None):
+    """Shorthand for registry.types()"""
+    return registry.types(filename, requester)
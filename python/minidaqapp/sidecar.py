@@ -0,0 +1,126 @@
+"""
+msgpack sidecars of the app command data files.
+
+With --msgpack-sidecar, the generators write next to each
+data/{app}_{command}.json a data/{app}_{command}.msgpack holding the same
+data, which is about twice as fast to parse as the JSON. The sidecar
+is a msgpack map
+
+    {"version": 1, "json_sha256": <sha256 of the JSON file>, "data": <the command data>}
+
+so a reader can tell whether the JSON file was modified (or regenerated)
+after the sidecar was written, in which case the JSON file wins:
+
+    from minidaqapp.sidecar import load_command_data
+    data = load_command_data("JSON_DIR/data/ruemu0_conf.json")
+
+loads the sidecar when there is an up-to-date one and msgpack is
+installed, and the JSON file otherwise. To check all the sidecars of a
+configuration:
+
+    python -m minidaqapp.sidecar check JSON_DIR
+"""
+
+import gzip
+import hashlib
+import json
+from os.path import exists, join
+
+import click
+from rich.console import Console
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+console = Console()
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+SIDECAR_SUFFIX = '.msgpack'
+SIDECAR_VERSION = 1
+
+def sidecar_path(json_path):
+    """The path of the sidecar of the .json or .json.gz file `json_path`"""
+    for suffix in ('.json.gz', '.json'):
+        if json_path.endswith(suffix):
+            return json_path[:-len(suffix)] + SIDECAR_SUFFIX
+    raise ValueError(f"{json_path} is not a .json or .json.gz file")
+
+def make_sidecar(data, json_content):
+    """The content of the sidecar of the JSON file `json_content` (bytes), which holds `data` (plain data)"""
+    return msgpack.packb({"version": SIDECAR_VERSION,
+                          "json_sha256": hashlib.sha256(json_content).hexdigest(),
+                          "data": data}, use_bin_type=True)
+
+def read_sidecar(content):
+    """Return (sha256 of the JSON file, data) from the content of a sidecar"""
+    sidecar = msgpack.unpackb(content, raw=False, strict_map_key=False)
+    if sidecar.get("version") != SIDECAR_VERSION:
+        raise ValueError(f"Unsupported sidecar version {sidecar.get('version')} (expected {SIDECAR_VERSION})")
+    return sidecar["json_sha256"], sidecar["data"]
+
+def _load_json(json_path, content):
+    return json.loads(gzip.decompress(content) if json_path.endswith('.gz') else content)
+
+def load_command_data(json_path):
+    """
+    Return the data of the JSON file `json_path`, from its sidecar if it
+    has one that matches the file
+    """
+    with open(json_path, 'rb') as f:
+        content = f.read()
+    path = sidecar_path(json_path)
+    if msgpack is not None and exists(path):
+        with open(path, 'rb') as f:
+            json_sha256, data = read_sidecar(f.read())
+        if json_sha256 == hashlib.sha256(content).hexdigest():
+            return data
+    return _load_json(json_path, content)
+
+@click.group(context_settings=CONTEXT_SETTINGS)
+def cli():
+    """Check the msgpack sidecars written with --msgpack-sidecar"""
+
+@cli.command()
+@click.argument('json_dir', type=click.Path(exists=True, file_okay=False))
+def check(json_dir):
+    """
+    Check that each sidecar in JSON_DIR matches its JSON file, both its
+    checksum and its content
+    """
+    if msgpack is None:
+        raise click.UsageError("The msgpack module is needed to read the sidecars")
+    from .config_writer import read_manifest
+    manifest = read_manifest(json_dir) or {}
+    stale = []
+    checked = 0
+    for filename in sorted(manifest):
+        if not filename.endswith(SIDECAR_SUFFIX):
+            continue
+        json_filename = next((filename[:-len(SIDECAR_SUFFIX)] + suffix for suffix in ('.json', '.json.gz')
+                              if filename[:-len(SIDECAR_SUFFIX)] + suffix in manifest), None)
+        if json_filename is None:
+            stale.append(f"{filename}: no JSON file")
+            continue
+        with open(join(json_dir, json_filename), 'rb') as f:
+            content = f.read()
+        with open(join(json_dir, filename), 'rb') as f:
+            json_sha256, data = read_sidecar(f.read())
+        if json_sha256 != hashlib.sha256(content).hexdigest():
+            stale.append(f"{filename}: {json_filename} was modified")
+        elif data != _load_json(json_filename, content):
+            stale.append(f"{filename}: content differs from {json_filename}")
+        checked += 1
+    for line in stale:
+        console.print(line)
+    if stale:
+        raise click.ClickException(f"{len(stale)} of the sidecars in {json_dir} don't match their JSON file")
+    console.log(f"{checked} sidecars checked in {json_dir}")
+
+if __name__ == '__main__':
+    try:
+        cli(show_default=True, standalone_mode=True)
+    except Exception as e:
+        console.print_exception()
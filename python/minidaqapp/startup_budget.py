@@ -0,0 +1,97 @@
+"""
+Check the start-up cost of the generators' help and validation paths.
+
+Printing the help or rejecting an inconsistent set of options must not
+load any moo schema or appfwk code. This runs each of those paths in a
+fresh interpreter, measures the wall time, checks that no moo, appfwk
+or dunedaq module got imported and that the path did what it should
+(exit code 0 and the usage for the help, exit code 2 and the expected
+error for the rest), and fails if any check is violated.
+
+    python -m minidaqapp.startup_budget [--budget-ms 500] [--repeat 3]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+# Runs the entry point as __main__ and reports, on exit, which heavy
+# modules ended up being imported
+_PROBE = """
+import atexit, runpy, sys
+def _report():
+    heavy = sorted(m for m in sys.modules if m.split('.')[0] in ('moo', 'appfwk', 'dunedaq'))
+    sys.stderr.write('\\n@@heavy@@' + ','.join(heavy) + '\\n')
+atexit.register(_report)
+module = sys.argv[1]
+sys.argv = [module] + sys.argv[2:]
+runpy.run_module(module, run_name='__main__', alter_sys=True)
+"""
+
+def startup_cases(scratch_dir):
+    """[(label, module, args, expected exit code, text expected in the output)]"""
+    # A directory that doesn't exist, so that only the option checks can fail
+    json_dir = os.path.join(scratch_dir, "never_created")
+    tpset_error = "TPSet writing can only be used when software TPG is enabled"
+    return [
+        ("nanorc help",        "minidaqapp.nanorc.mdapp_multiru_gen",  ["-h"], 0, "Usage:"),
+        ("newconf help",       "minidaqapp.newconf.mdapp_multiru_gen", ["-h"], 0, "Usage:"),
+        ("global help",        "minidaqapp.newconf.global_gen",        ["-h"], 0, "Usage:"),
+        ("nanorc bad option",  "minidaqapp.nanorc.mdapp_multiru_gen",  ["--no-such-option", json_dir], 2, "no such option"),
+        ("newconf bad option", "minidaqapp.newconf.mdapp_multiru_gen", ["--no-such-option", json_dir], 2, "no such option"),
+        ("nanorc validation",  "minidaqapp.nanorc.mdapp_multiru_gen",  ["--enable-tpset-writing", json_dir], 2, tpset_error),
+        ("newconf validation", "minidaqapp.newconf.mdapp_multiru_gen", ["--enable-tpset-writing", json_dir], 2, tpset_error),
+    ]
+
+def time_case(module, args, repeat, exit_code=0, expected=""):
+    """
+    Return the best wall time in seconds over `repeat` runs, the heavy
+    modules imported and what went wrong, if the run didn't exit with
+    `exit_code` or print `expected` (case-insensitive), or None
+    """
+    best = None
+    heavy = []
+    problem = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", _PROBE, module] + args,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        for line in result.stderr.splitlines():
+            if line.startswith("@@heavy@@"):
+                heavy = [m for m in line[len("@@heavy@@"):].split(",") if m]
+        if result.returncode != exit_code:
+            problem = f"exit code {result.returncode}, expected {exit_code}"
+        elif expected.lower() not in (result.stdout + result.stderr).lower():
+            problem = f"no {expected!r} in the output"
+    return best, heavy, problem
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('--budget-ms', default=500, help="Maximum allowed wall time for each help/validation path, in milliseconds")
+@click.option('--repeat', default=3, help="Number of runs per path; the best one is compared to the budget")
+def cli(budget_ms, repeat):
+    failures = 0
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for label, module, args, exit_code, expected in startup_cases(scratch_dir):
+            elapsed, heavy, problem = time_case(module, args, repeat, exit_code, expected)
+            status = "ok"
+            if problem:
+                status = f"FAIL: {problem}"
+                failures += 1
+            elif heavy:
+                status = "FAIL: imported " + ", ".join(heavy[:5]) + (" ..." if len(heavy) > 5 else "")
+                failures += 1
+            elif elapsed * 1000 > budget_ms:
+                status = f"FAIL: over budget of {budget_ms} ms"
+                failures += 1
+            print(f"{label:<20} {elapsed*1000:8.1f} ms  {status}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,170 @@
+"""
+Readout topology shared by all the generators.
+
+The readout units (RUs), the regions they belong to and the links they
+read out are worked out once, in cli(), and handed to every generator
+as a Topology. It answers the questions the generators used to answer
+by rescanning the list of RU dicts (how many links in this region, how
+many in total) with lookups, so generating a far-detector-sized system
+stays linear in the number of links.
+"""
+
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+class ReadoutUnit(NamedTuple):
+    index: int          # position in --host-ru, i.e. the RUIDX of the app
+    host: str
+    card_id: int        # 0 for the first RU on a host, 1 for the second, ...
+    region_id: int
+    start_channel: int  # first link number, counted within the region
+    channel_count: int
+    global_offset: int  # first link number, counted over all RUs
+
+    @property
+    def links(self):
+        """Link (element) numbers of this RU, within its region"""
+        return range(self.start_channel, self.start_channel + self.channel_count)
+
+class FelixReader(NamedTuple):
+    name: str           # flxcard_0, flxcard_1, ... within the RU
+    card_id: int
+    logical_unit: int
+    links: Tuple[int, ...]  # link (element) numbers, within the region
+
+# Links of a logical unit when --felix-links-per-unit isn't given
+DEFAULT_LINKS_PER_UNIT = 5
+
+@dataclass(frozen=True)
+class FelixLayout:
+    """
+    How the links of an RU are spread over its FELIX cards: each RU reads
+    `cards_per_ru` cards (RU n of a host reads cards n*cards_per_ru...),
+    each with `logical_units` logical units of up to `links_per_unit`
+    links. By default each logical unit is filled in turn, in the order
+    of the card fibres; with `balance`, the links are spread evenly over
+    all the logical units (DMA engines) of the RU's cards.
+
+    Without `links_per_unit` the units are filled DEFAULT_LINKS_PER_UNIT
+    links at a time and the last one takes the links beyond, as the
+    generators always did, so there is no limit on the links of an RU
+    """
+    cards_per_ru: int = 1
+    logical_units: int = 2
+    links_per_unit: Optional[int] = None
+    balance: bool = False
+
+    @property
+    def capacity(self):
+        """Number of links an RU can read, None if there is no limit"""
+        if self.links_per_unit is None:
+            return None
+        return self.cards_per_ru * self.logical_units * self.links_per_unit
+
+    @property
+    def per_unit(self):
+        """Links a logical unit is filled with"""
+        return DEFAULT_LINKS_PER_UNIT if self.links_per_unit is None else self.links_per_unit
+
+    def card_ids(self, ru):
+        """Ids of the cards the RU reads"""
+        return range(ru.card_id * self.cards_per_ru, (ru.card_id + 1) * self.cards_per_ru)
+
+    def check(self, channel_count):
+        """Raise ValueError if an RU can't read `channel_count` links"""
+        if min(self.cards_per_ru, self.logical_units, self.per_unit) < 1:
+            raise ValueError("The FELIX cards per RU, logical units per card and links per logical unit should be at least 1")
+        if self.capacity is not None and channel_count > self.capacity:
+            units = self.cards_per_ru * self.logical_units
+            raise ValueError(f"An RU with {channel_count} links can't be read by {self.cards_per_ru} FELIX card(s) of "
+                             f"{self.logical_units} logical units of up to {self.links_per_unit} links: raise "
+                             f"--felix-cards-per-ru, --felix-logical-units or --felix-links-per-unit "
+                             f"(e.g. --felix-links-per-unit {-(-channel_count // units)})")
+
+    def readers(self, ru):
+        """[FelixReader] of the card readers of `ru`, one per logical unit that has links"""
+        units = [(card_id, unit) for card_id in self.card_ids(ru) for unit in range(self.logical_units)]
+        if self.balance:
+            sizes = [ru.channel_count // len(units) + (i < ru.channel_count % len(units)) for i in range(len(units))]
+        else:
+            per_unit = self.per_unit
+            sizes = [max(0, min(per_unit, ru.channel_count - i * per_unit)) for i in range(len(units))]
+            if self.links_per_unit is None:
+                sizes[-1] += max(0, ru.channel_count - len(units) * per_unit)
+        readers = []
+        first = ru.start_channel
+        for (card_id, unit), size in zip(units, sizes):
+            if size:
+                readers.append(FelixReader(f"flxcard_{len(readers)}", card_id, unit, tuple(range(first, first + size))))
+                first += size
+        return readers
+
+class Link(NamedTuple):
+    ru: ReadoutUnit
+    local_index: int    # 0 .. ru.channel_count-1
+    element: int        # ru.start_channel + local_index
+
+@dataclass(frozen=True)
+class Topology:
+    readout_units: Tuple[ReadoutUnit, ...]
+    # Every link of every RU, in RU order
+    links: Tuple[Link, ...]
+    # Regions in the order they first appear in --region-id
+    regions: Tuple[int, ...]
+    total_link_count: int
+    _region_link_counts: Mapping[int, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        counts = {}
+        for ru in self.readout_units:
+            counts[ru.region_id] = counts.get(ru.region_id, 0) + ru.channel_count
+        object.__setattr__(self, '_region_link_counts', MappingProxyType(counts))
+
+    def __len__(self):
+        return len(self.readout_units)
+
+    def __getitem__(self, ruidx):
+        return self.readout_units[ruidx]
+
+    def __iter__(self):
+        return iter(self.readout_units)
+
+    def region_link_count(self, region_id):
+        """Number of links, over all RUs, in the given region"""
+        return self._region_link_counts.get(region_id, 0)
+
+def build_topology(host_ru, region_id, number_of_data_producers):
+    """
+    Build the Topology for the given --host-ru, --region-id (either once,
+    or once per RU) and number of links per RU
+    """
+    if len(region_id) != 1 and len(region_id) != len(host_ru):
+        raise ValueError("region_id should be given either once or once for each RU")
+
+    readout_units = []
+    links = []
+    region_link_counts = {}
+    rus_by_host = {}
+    global_offset = 0
+    for ruidx, host in enumerate(host_ru):
+        region = region_id[ruidx] if len(region_id) != 1 else region_id[0]
+        card_id = rus_by_host.get(host, 0)
+        ru = ReadoutUnit(index=ruidx,
+                         host=host,
+                         card_id=card_id,
+                         region_id=region,
+                         start_channel=region_link_counts.get(region, 0),
+                         channel_count=number_of_data_producers,
+                         global_offset=global_offset)
+        rus_by_host[host] = card_id + 1
+        readout_units.append(ru)
+        for local_index, element in enumerate(ru.links):
+            links.append(Link(ru, local_index, element))
+        region_link_counts[region] = region_link_counts.get(region, 0) + ru.channel_count
+        global_offset += ru.channel_count
+
+    return Topology(readout_units=tuple(readout_units),
+                    links=tuple(links),
+                    regions=tuple(region_link_counts),
+                    total_link_count=global_offset)
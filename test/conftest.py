@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import minidaqapp from this checkout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "python"))
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from minidaqapp.affinity import check_affinity, format_cpu_list, numa_cores, plan_affinity
+from minidaqapp.inventory import Host, HostInventory, parse_cpu_list
+from minidaqapp.newconf.system_builder import MDAppOptions
+
+def plan(*apps):
+    """An affinity plan from (app, host, parent, {thread: cpus})"""
+    return {"daq_application": {f"--name {app}": {"parent": parent, "threads": threads} for app, _, parent, threads in apps},
+            "hosts": {app: host for app, host, _, _ in apps}}
+
+def test_cpu_lists():
+    assert parse_cpu_list("0,3-5, 8") == [0, 3, 4, 5, 8]
+    assert format_cpu_list([5, 3, 4, 0, 8, 4]) == "0,3-5,8"
+
+def test_a_clean_plan():
+    assert check_affinity(plan(("ru0", "a", "1", {"consumer-0": "2", "consumer-1": "3"}),
+                               ("ru1", "a", "4", {"consumer-0": "5"}),
+                               ("ru2", "b", "1", {"consumer-0": "2"}))) == []
+
+def test_overlap_between_apps_of_a_host():
+    problems = check_affinity(plan(("ru0", "a", "1", {"consumer-0": "2"}),
+                                   ("ru1", "a", "3", {"consumer-0": "2"})))
+    assert problems == ["a: core 2 overlaps between ru0, ru1 (ru0 consumer-0, ru1 consumer-0)"]
+
+def test_oversubscribed_cores():
+    problems = check_affinity(plan(("ru0", "a", "1-2", {"consumer-0": "2", "consumer-1": "3", "consumer-2": "3"})))
+    assert problems == ["a: core 2 is oversubscribed in ru0 (parent, consumer-0)",
+                        "a: core 3 is oversubscribed in ru0 (consumer-1, consumer-2)"]
+
+def test_cores_beyond_the_host():
+    inventory = HostInventory({"a": Host("a", cores=8, memory_gb=16)})
+    assert check_affinity(plan(("ru0", "a", "1", {"consumer-0": "8"})), inventory) == [
+        "a: ru0 consumer-0 is pinned to core 8, but the host has 8 cores"]
+
+def test_numa_cores_split_evenly_by_default():
+    host = Host("a", cores=16, memory_gb=16, numa_nodes=2)
+    assert numa_cores(host, 0) == list(range(1, 8))
+    assert numa_cores(host, 1) == list(range(8, 16))
+
+def test_numa_cores_from_the_inventory():
+    host = Host("a", cores=16, memory_gb=16, numa_nodes=2, numa_cpus=("0-3,8-11", "4-7,12-15"))
+    assert numa_cores(host, 0) == [1, 2, 3, 8, 9, 10, 11]
+    assert numa_cores(host, 1) == [4, 5, 6, 7, 12, 13, 14, 15]
+
+def test_plans_follow_the_numa_node_of_the_cards(tmp_path):
+    path = tmp_path / "hosts.json"
+    path.write_text(json.dumps({"hosts": {"a": {"cores": 16, "memory_gb": 64, "numa_nodes": 2, "numa_cpus": ["0-3,8-11", "4-7,12-15"],
+                                                "felix_cards": [{"card_id": 0, "numa_node": 1}, {"card_id": 1, "numa_node": 0}]}}}))
+    inventory = HostInventory.load(str(path))
+    opts = MDAppOptions(use_felix=True, host_ru=("a", "a"), number_of_data_producers=2, host_inventory=str(path))
+    affinity, warnings = plan_affinity(opts, inventory, opts.felix_cards)
+    assert warnings == []
+    assert affinity["hosts"] == {"ruflx0": "a", "ruflx1": "a"}
+    # ruflx0 reads card 0, on node 1, and ruflx1 card 1, on node 0, whose cores aren't contiguous
+    assert affinity["daq_application"]["--name ruflx0"] == {"parent": "4", "threads": {"cardreader-0-0": "5", "consumer-0": "6", "consumer-1": "7"}}
+    assert affinity["daq_application"]["--name ruflx1"] == {"parent": "1", "threads": {"cardreader-1-0": "2", "consumer-2": "3", "consumer-3": "8"}}
+    assert check_affinity(affinity, inventory) == []
+
+def test_unknown_hosts_are_an_error():
+    inventory = HostInventory({"a": Host("a", cores=16, memory_gb=64)})
+    with pytest.raises(ValueError, match="not in the inventory"):
+        plan_affinity(MDAppOptions(host_ru=("b",)), inventory, {})
+
+@pytest.mark.parametrize("numa_cpus, error", [
+    (["0-7"], "2 NUMA nodes but 1 numa_cpus"),
+    (["0-7", "8-16"], "beyond its 16"),
+    (["0-8", "8-15"], "overlaps another node"),
+    (["0-7", "x"], "Invalid cpu list"),
+])
+def test_numa_cpus_are_checked(tmp_path, numa_cpus, error):
+    path = tmp_path / "hosts.json"
+    path.write_text(json.dumps({"hosts": {"a": {"cores": 16, "memory_gb": 64, "numa_nodes": 2, "numa_cpus": numa_cpus}}}))
+    with pytest.raises(ValueError, match=error):
+        HostInventory.load(str(path))
@@ -0,0 +1,41 @@
+import hashlib
+
+from minidaqapp.conf_templates import expand_conf, is_templated, make_templated
+from minidaqapp.config_writer import read_manifest, rewrite_file, write_manifest
+
+def conf(links):
+    modules = [{"match": f"datahandler_{link}",
+                "data": {"latencybufferconf": {"element_id": link, "latency_buffer_size": 100},
+                         "requesthandlerconf": {"output_file": f"output_{link}.out", "pop_limit_pct": 0.5}}}
+               for link in range(links)]
+    return {"modules": modules + [{"match": "fake_source", "data": {"link_count": links}}]}
+
+def test_templated_conf_expands_back():
+    data = conf(3)
+    templated = make_templated(data)
+    assert is_templated(templated)
+    assert templated["templates"]["datahandler"] == {"latencybufferconf": {"latency_buffer_size": 100},
+                                                      "requesthandlerconf": {"pop_limit_pct": 0.5}}
+    assert templated["modules"][1]["data"] == {"template": "datahandler",
+                                               "overrides": {"latencybufferconf": {"element_id": 1},
+                                                             "requesthandlerconf": {"output_file": "output_1.out"}}}
+    assert expand_conf(templated) == data
+
+def test_single_modules_are_not_templated():
+    data = conf(1)
+    assert make_templated(data) == data
+    assert expand_conf(data) is data
+
+def test_templating_twice_changes_nothing():
+    templated = make_templated(conf(4))
+    assert make_templated(templated) is templated
+
+def test_rewrite_file_updates_the_manifest(tmp_path):
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "a_conf.json").write_bytes(b"{}")
+    manifest = {"data/a_conf.json": hashlib.sha256(b"{}").hexdigest()}
+    rewrite_file(str(tmp_path), "data/a_conf.json", b"[]", manifest)
+    write_manifest(str(tmp_path), manifest, atomic=True)
+    assert (tmp_path / "data" / "a_conf.json").read_bytes() == b"[]"
+    assert read_manifest(str(tmp_path)) == {"data/a_conf.json": hashlib.sha256(b"[]").hexdigest()}
+    assert [path.name for path in (tmp_path / "data").iterdir()] == ["a_conf.json"]
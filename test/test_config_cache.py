@@ -0,0 +1,51 @@
+import os
+import time
+
+from minidaqapp.config_cache import ENTRY_FILE, ConfigCache
+
+def make_config(path, size):
+    os.makedirs(path)
+    with open(os.path.join(path, "boot.json"), "wb") as f:
+        f.write(b"x" * size)
+    return str(path)
+
+def store(cache, tmp_path, key, size, days_ago):
+    cache.store(key, make_config(tmp_path / f"config_{key}", size), "newconf", {"n": key})
+    used = time.time() - days_ago * 86400
+    os.utime(os.path.join(cache.path, key, ENTRY_FILE), (used, used))
+
+def test_fetch_after_store(tmp_path):
+    cache = ConfigCache(str(tmp_path / "cache"), max_mb=10, max_days=30)
+    store(cache, tmp_path, "k1", 100, 0)
+    assert cache.fetch("k1", str(tmp_path / "out"))
+    assert os.path.getsize(tmp_path / "out" / "boot.json") == 100
+    assert not cache.fetch("k2", str(tmp_path / "out2"))
+
+def test_evict_unused_entries(tmp_path):
+    cache = ConfigCache(str(tmp_path / "cache"), max_mb=10, max_days=30)
+    store(cache, tmp_path, "old", 100, 40)
+    assert cache.evict() == ["old"]
+    store(cache, tmp_path, "new", 100, 1)
+    store(cache, tmp_path, "older", 100, 40)
+    # Each store evicts the entries that are due
+    store(cache, tmp_path, "newest", 100, 0)
+    assert [key for key, _, _ in cache.entries()] == ["new", "newest"]
+
+def test_evict_least_recently_used_to_fit(tmp_path):
+    cache = ConfigCache(str(tmp_path / "cache"), max_mb=10, max_days=30)
+    for key, days_ago in (("a", 3), ("b", 1), ("c", 2)):
+        store(cache, tmp_path, key, 400000, days_ago)
+    # 1.2 MB in the cache: c and then a are older than b
+    assert cache.evict(max_mb=0.5) == ["a", "c"]
+    assert [key for key, _, _ in cache.entries()] == ["b"]
+    assert cache.evict(max_mb=0.5) == []
+
+def test_evict_leftovers_of_interrupted_stores(tmp_path):
+    cache = ConfigCache(str(tmp_path / "cache"), max_mb=10, max_days=30)
+    store(cache, tmp_path, "a", 10, 0)
+    stale, fresh = tmp_path / "cache" / ".tmp-stale", tmp_path / "cache" / ".tmp-fresh"
+    stale.mkdir()
+    fresh.mkdir()
+    os.utime(stale, (time.time() - 2 * 86400,) * 2)
+    cache.evict()
+    assert not stale.exists() and fresh.exists()
@@ -0,0 +1,64 @@
+from minidaqapp.mdapp_config_diff import _MISSING, diff_values, format_difference
+
+def test_equal_values_have_no_differences():
+    assert list(diff_values({"a": [1, 2], "b": {"c": 3}}, {"b": {"c": 3}, "a": [1, 2]})) == []
+
+def test_fields_changed_added_and_removed():
+    old = {"a": 1, "b": {"c": 2, "d": 3}}
+    new = {"a": 1, "b": {"c": 4, "e": 5}}
+    assert list(diff_values(old, new)) == [("b.c", 2, 4), ("b.d", 3, _MISSING), ("b.e", _MISSING, 5)]
+
+def test_named_entries_are_matched_by_name():
+    old = [{"match": "m1", "data": {"x": 1}}, {"match": "m2", "data": {"x": 2}}]
+    new = [{"match": "m2", "data": {"x": 3}}, {"match": "m1", "data": {"x": 1}}, {"match": "m3", "data": {"x": 4}}]
+    assert list(diff_values(old, new, "modules")) == [("modules.m2.x", 2, 3), ("modules.m3", _MISSING, {"x": 4})]
+
+def test_null_fields_added_and_removed():
+    assert list(diff_values({"a": 1}, {"a": 1, "b": None})) == [("b", _MISSING, None)]
+    assert list(diff_values({"a": 1, "b": None}, {"a": 1})) == [("b", None, _MISSING)]
+
+def test_fields_changed_to_and_from_null():
+    assert list(diff_values({"a": None}, {"a": 1})) == [("a", None, 1)]
+    assert list(diff_values({"a": 1}, {"a": None})) == [("a", 1, None)]
+
+def test_null_modules_added():
+    # e.g. the stop command of an RU with one more link
+    old = [{"match": "datahandler_0", "data": None}]
+    new = [{"match": "datahandler_0", "data": None}, {"match": "datahandler_1", "data": None}]
+    differences = list(diff_values(old, new, "modules"))
+    assert differences == [("modules.datahandler_1", _MISSING, None)]
+    assert format_difference("ruemu0 stop", *differences[0]) == "ruemu0 stop: + modules.datahandler_1: null"
+
+def test_format_difference():
+    assert format_difference("conf", "a", 1, None) == "conf: a: 1 -> null"
+    assert format_difference("conf", "a", None, _MISSING) == "conf: - a: null"
+    assert format_difference("conf", "", _MISSING, {"a": 1}) == 'conf: + (all): {"a": 1}'
+
+def geoid_entry(element, size=5):
+    return {"geoid": {"system": "TPC", "region": 0, "element": element}, "size": size}
+
+def test_per_link_entries_are_matched_by_geoid():
+    old = [geoid_entry(element) for element in range(3)]
+    new = [geoid_entry(element) for element in (2, 0, 1, 10)]
+    new[1] = geoid_entry(0, size=6)
+    assert list(diff_values(old, new, "map")) == [
+        ("map[system=TPC,region=0,element=0].size", 5, 6),
+        ("map[system=TPC,region=0,element=10]", _MISSING, geoid_entry(10)),
+    ]
+
+def test_geoids_are_sorted_numerically():
+    old = [geoid_entry(element) for element in (1, 2)]
+    new = [geoid_entry(element) for element in (1, 2, 3, 10, 20)]
+    assert [path for path, _, _ in diff_values(old, new, "map")] == [
+        "map[system=TPC,region=0,element=3]", "map[system=TPC,region=0,element=10]", "map[system=TPC,region=0,element=20]"]
+
+def test_unnamed_entries_of_different_lengths_are_a_multiset():
+    old = [{"a": 1}, {"a": 2}, {"a": 2}]
+    new = [{"a": 2}, {"a": 3}, {"a": 1}, {"a": 4}]
+    assert list(diff_values(old, new, "l")) == [("l[]", {"a": 2}, _MISSING), ("l[]", _MISSING, {"a": 3}), ("l[]", _MISSING, {"a": 4})]
+
+def test_lists_of_the_same_length_are_compared_by_position():
+    assert list(diff_values([{"a": 1}, {"a": 2}], [{"a": 1}, {"a": 3}], "l")) == [("l[1].a", 2, 3)]
+
+def test_scalar_lists_are_shown_whole():
+    assert list(diff_values([1, 2], [1, 2, 3], "l")) == [("l", [1, 2], [1, 2, 3])]
@@ -0,0 +1,61 @@
+import pytest
+
+from minidaqapp.inventory import GIB, FelixCard, Host, HostInventory
+from minidaqapp.newconf.system_builder import MDAppOptions
+from minidaqapp.placement import estimate_loads, plan_placement
+
+def inventory(*hosts):
+    return HostInventory({host.name: host for host in hosts})
+
+FELIX_HOST = Host("flx", cores=64, memory_gb=256, numa_nodes=2, nic_gbps=100,
+                  felix_cards=(FelixCard(0, numa_node=0), FelixCard(1, numa_node=1)))
+DISK_HOST = Host("disk", cores=32, memory_gb=128, nic_gbps=25, disks=("/data0",))
+SMALL_HOST = Host("small", cores=16, memory_gb=64)
+
+def test_memory_is_in_gib():
+    opts = MDAppOptions(number_of_data_producers=1, latency_buffer_size=GIB // 5568 - 100000)
+    # One link of WIB superchunks: the latency buffer and the link queue
+    assert estimate_loads(opts)["ruemu0"].memory_gb == pytest.approx(1, rel=1e-3)
+
+def test_felix_rus_go_to_hosts_with_free_cards():
+    opts = MDAppOptions(use_felix=True, host_ru=("-", "-"), host_df=("-",), number_of_data_producers=4)
+    plan = plan_placement(opts, inventory(FELIX_HOST, DISK_HOST, SMALL_HOST))
+    assert plan.apps["ruflx0"] == plan.apps["ruflx1"] == "flx"
+    assert plan.apps["dataflow0"] == "disk"
+    reasons = {app: reason for app, _, _, reason in plan.justification}
+    assert reasons["ruflx0"].startswith("reads FELIX card 0 (NUMA node 0)")
+    assert reasons["ruflx1"].startswith("reads FELIX card 1 (NUMA node 1)")
+
+def test_no_free_felix_card():
+    opts = MDAppOptions(use_felix=True, host_ru=("-", "-", "-"), number_of_data_producers=4)
+    with pytest.raises(ValueError, match="free FELIX card for ruflx"):
+        plan_placement(opts, inventory(FELIX_HOST, DISK_HOST))
+
+def test_two_cards_per_ru():
+    opts = MDAppOptions(use_felix=True, host_ru=("-",), number_of_data_producers=12, felix_cards_per_ru=2)
+    plan = plan_placement(opts, inventory(FELIX_HOST, DISK_HOST))
+    assert plan.apps["ruflx0"] == "flx"
+    with pytest.raises(ValueError, match="free FELIX card"):
+        plan_placement(MDAppOptions(use_felix=True, host_ru=("-", "-"), number_of_data_producers=12, felix_cards_per_ru=2),
+                       inventory(FELIX_HOST, DISK_HOST))
+
+def test_apps_are_spread_by_load():
+    opts = MDAppOptions(host_ru=("-",) * 4, host_df=("-", "-"), number_of_data_producers=5, enable_dqm=True)
+    plan = plan_placement(opts, inventory(Host("a", cores=64, memory_gb=256), Host("b", cores=64, memory_gb=256)))
+    assert sorted(plan.apps[f"ruemu{idx}"] for idx in range(4)) == ["a", "a", "b", "b"]
+    # The DQM apps run with their RU
+    assert all(plan.apps[f"dqm{idx}"] == plan.apps[f"ruemu{idx}"] for idx in range(4))
+    assert not plan.warnings
+
+def test_plan_gives_the_host_options():
+    opts = MDAppOptions(host_ru=("-", "-"), host_df=("-",))
+    plan = plan_placement(opts, inventory(DISK_HOST))
+    planned = plan.apply(opts)
+    assert planned.host_ru == ("disk", "disk") and planned.host_df == ("disk",) and planned.host_trigger == "disk"
+    assert plan.command_line(opts) == "--host-ru disk --host-ru disk --host-df disk --host-trigger disk --host-dfo disk --host-hsi disk"
+
+def test_overcommitted_hosts_are_warned_about():
+    opts = MDAppOptions(host_ru=("-",) * 8, number_of_data_producers=10)
+    plan = plan_placement(opts, inventory(SMALL_HOST))
+    assert plan.warnings
+    assert all("overcommits small" in warning for warning in plan.warnings)
@@ -0,0 +1,76 @@
+import pytest
+
+from minidaqapp.topology import FelixLayout, build_topology
+
+def ru(channel_count, host_ru=("a",), index=0):
+    return build_topology(list(host_ru), [0], channel_count)[index]
+
+def test_default_layout_fills_unit_0_first():
+    readers = FelixLayout().readers(ru(7))
+    assert [(r.name, r.card_id, r.logical_unit, r.links) for r in readers] == [
+        ("flxcard_0", 0, 0, (0, 1, 2, 3, 4)),
+        ("flxcard_1", 0, 1, (5, 6)),
+    ]
+
+def test_fill_leaves_out_empty_units():
+    readers = FelixLayout().readers(ru(3))
+    assert [(r.logical_unit, r.links) for r in readers] == [(0, (0, 1, 2))]
+
+def test_balance_spreads_the_links():
+    readers = FelixLayout(balance=True).readers(ru(7))
+    assert [(r.logical_unit, r.links) for r in readers] == [(0, (0, 1, 2, 3)), (1, (4, 5, 6))]
+
+def test_balance_over_several_cards():
+    readers = FelixLayout(cards_per_ru=2, balance=True).readers(ru(12))
+    assert [(r.card_id, r.logical_unit, len(r.links)) for r in readers] == [(0, 0, 3), (0, 1, 3), (1, 0, 3), (1, 1, 3)]
+    assert [link for r in readers for link in r.links] == list(range(12))
+
+def test_cards_of_the_second_ru_of_a_host():
+    layout = FelixLayout(cards_per_ru=2)
+    second = ru(12, host_ru=("a", "a"), index=1)
+    readers = layout.readers(second)
+    assert list(layout.card_ids(second)) == [2, 3]
+    assert [(r.name, r.card_id, r.logical_unit, len(r.links)) for r in readers] == [
+        ("flxcard_0", 2, 0, 5), ("flxcard_1", 2, 1, 5), ("flxcard_2", 3, 0, 2)]
+    # The links are counted within the region, after those of the first RU
+    assert readers[0].links[0] == 12
+
+def test_capacity_edge():
+    layout = FelixLayout(links_per_unit=5)
+    assert layout.capacity == 10
+    layout.check(10)
+    assert sum(len(r.links) for r in layout.readers(ru(10))) == 10
+    with pytest.raises(ValueError, match="--felix-links-per-unit 6"):
+        layout.check(11)
+
+def test_default_layout_has_no_limit():
+    # The last logical unit takes the links beyond the first 5, as the generators always did (-n 12 --use-felix)
+    layout = FelixLayout()
+    assert layout.capacity is None
+    layout.check(12)
+    assert [(r.name, r.card_id, r.logical_unit, r.links) for r in layout.readers(ru(12))] == [
+        ("flxcard_0", 0, 0, (0, 1, 2, 3, 4)),
+        ("flxcard_1", 0, 1, (5, 6, 7, 8, 9, 10, 11)),
+    ]
+
+def test_default_layout_overflows_the_last_card():
+    readers = FelixLayout(cards_per_ru=2).readers(ru(23))
+    assert [(r.card_id, r.logical_unit, len(r.links)) for r in readers] == [(0, 0, 5), (0, 1, 5), (1, 0, 5), (1, 1, 8)]
+
+def test_wider_units_take_more_links():
+    layout = FelixLayout(links_per_unit=6)
+    layout.check(12)
+    assert [len(r.links) for r in layout.readers(ru(12))] == [6, 6]
+
+def test_check_rejects_empty_layouts():
+    for layout in (FelixLayout(cards_per_ru=0), FelixLayout(logical_units=0), FelixLayout(links_per_unit=0)):
+        with pytest.raises(ValueError, match="at least 1"):
+            layout.check(1)
+
+def test_region_link_counts():
+    topology = build_topology(["a", "a", "b"], [0, 1, 0], 3)
+    assert topology.regions == (0, 1)
+    assert (topology.region_link_count(0), topology.region_link_count(1), topology.region_link_count(2)) == (6, 3, 0)
+    assert [ru.card_id for ru in topology] == [0, 1, 0]
+    with pytest.raises(TypeError):
+        topology._region_link_counts[0] = 1